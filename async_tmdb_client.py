@@ -0,0 +1,277 @@
+import asyncio
+import json
+import math
+import time
+from functools import partial
+import aiohttp
+from config import TMDB_API_KEY, TMDB_CONCURRENCY, TMDB_MAX_RETRIES, TMDB_TIMEOUT
+from logger import ROLLUP, setup_logger
+from tmdb_client import parse_genres, parse_movie_id_page, warn_if_no_director
+from tmdb_records import decode_credits, decode_genres, decode_movie
+from tmdb_cache import endpoint_template
+from tmdb_http import (
+    DECODE_ERRORS,
+    RETRY_STATUSES,
+    TMDB_FETCH_ERRORS,
+    TMDB_FETCH_SECONDS,
+    TMDB_RATE_WAIT_SECONDS,
+    TMDB_REQUEST_SECONDS,
+    TMDB_RESPONSES,
+    backoff_delay,
+    get_client,
+    parse_retry_after,
+)
+
+
+logger = setup_logger(__name__)
+
+
+class AsyncTMDBClient:
+    """
+    Shared aiohttp session with a bounded number of in-flight requests
+
+    Requests draw from the same token bucket as the sync client, so mixing
+    both in one process still respects the TMDB budget. The shared SQLite
+    cache is read and written from worker threads, off the event loop.
+
+    Use as an async context manager:
+
+        async with AsyncTMDBClient(concurrency=16) as client:
+            movie = await fetch_movie_details(client, 550)
+    """
+
+    def __init__(self, concurrency=TMDB_CONCURRENCY, timeout=TMDB_TIMEOUT, max_retries=TMDB_MAX_RETRIES):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        shared = get_client()
+        self.base_url = shared.base_url
+        self.bucket = shared.bucket
+        self.cache = shared.cache
+        self.offline = shared.offline
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def get_json(self, path, params=None, decode=json.loads):
+        """
+        GET a TMDB endpoint and decode the JSON body
+
+        Retries like TMDBHttpClient.get_json(); only bodies that decode are
+        cached.
+
+        Args:
+            path (str): Endpoint path, e.g. '/movie/550'
+            params (dict): Extra query parameters (api_key is added)
+            decode (callable): Turns the raw body into the result, e.g.
+                tmdb_records.decode_movie (default: json.loads)
+
+        Returns:
+            dict: Decoded response, or None if the request failed
+        """
+        endpoint = endpoint_template(path)
+        start = time.perf_counter()
+        data, outcome = await self._get_json(path, params, endpoint, decode)
+        TMDB_FETCH_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, outcome=outcome)
+        return data
+
+    async def _get_json(self, path, params, endpoint, decode):
+        """get_json() body; returns (data, outcome) like TMDBHttpClient._get_json()"""
+        if self.cache is not None:
+            body = await asyncio.to_thread(self.cache.get, path, params, self.offline)
+            if body is not None:
+                try:
+                    return decode(body), 'cache'
+                except DECODE_ERRORS as e:
+                    logger.warning("Ignoring undecodable cached response for %s: %s", path, e)
+        if self.offline:
+            logger.debug("Offline mode: no cached response for %s", path)
+            TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason='offline_miss')
+            return None, 'failed'
+        query = {"api_key": TMDB_API_KEY}
+        if params:
+            query.update(params)
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                wait = self.bucket.reserve()
+                TMDB_RATE_WAIT_SECONDS.observe(wait, endpoint=endpoint)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                retry_after = None
+                sent = time.perf_counter()
+                try:
+                    async with self._session.get(self.base_url + path, params=query) as response:
+                        TMDB_RESPONSES.inc(endpoint=endpoint, status=response.status)
+                        if response.status == 200:
+                            body = await response.read()
+                            TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, endpoint=endpoint)
+                            try:
+                                data = decode(body)
+                            except DECODE_ERRORS as e:
+                                logger.warning("Undecodable response from %s (attempt %d): %s", path, attempt + 1, e)
+                            else:
+                                if self.cache is not None:
+                                    await asyncio.to_thread(self.cache.put, path, params, body)
+                                return data, 'ok'
+                        else:
+                            TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, endpoint=endpoint)
+                            if response.status not in RETRY_STATUSES:
+                                logger.error("Failed to fetch %s. Status code: %s", path, response.status)
+                                TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason=f"status_{response.status}")
+                                return None, 'failed'
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            if response.status == 429:
+                                self.bucket.pause(retry_after if retry_after is not None else 1.0)
+                            logger.warning("Got %s from %s (attempt %d)", response.status, path, attempt + 1)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    TMDB_RESPONSES.inc(endpoint=endpoint, status='error')
+                    logger.warning("Request to %s failed (attempt %d): %s", path, attempt + 1, e)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, retry_after))
+            logger.error("Giving up on %s after %d attempts", path, self.max_retries + 1)
+            TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason='retries_exhausted')
+            return None, 'failed'
+
+
+async def fetch_genres(client):
+    """
+    Async counterpart of tmdb_client.fetch_genres()
+
+    Returns:
+        dict: genre_id -> genre_name, empty if the request failed
+    """
+    logger.info("Fetching genre list from TMDB")
+    genres = await client.get_json("/genre/movie/list", decode=decode_genres)
+    if genres is None:
+        return {}
+    genre_dict = parse_genres(genres)
+    logger.info("Successfully fetched %d genres", len(genre_dict))
+    return genre_dict
+
+
+async def fetch_popular_movies(client, count=20):
+    """
+    Async counterpart of tmdb_client.fetch_popular_movies(); pages are
+    fetched concurrently through fetch_as_completed()
+
+    Returns:
+        list: Movie IDs in popularity order
+    """
+    logger.info("Fetching %d popular movie IDs", count)
+    pages_needed = math.ceil(count / 20)
+    if pages_needed > 500:
+        logger.warning("TMDB serves at most 500 popular pages; returning 10000 of the %d IDs requested "
+                       "(use discovery.py or a daily ID export for more)", count)
+        pages_needed = 500
+    pages = {}
+    async for page, data in fetch_as_completed(client, _fetch_popular_page, range(1, pages_needed + 1)):
+        if data is not None:
+            pages[page] = data
+    movie_ids = []
+    for page in sorted(pages):
+        movie_ids.extend(parse_movie_id_page(pages[page]))
+    movie_ids = movie_ids[:count]
+    logger.info("Successfully fetched %d movie IDs", len(movie_ids))
+    return movie_ids
+
+
+async def _fetch_popular_page(client, page):
+    return await client.get_json("/movie/popular", {"page": page})
+
+
+async def fetch_movie_details(client, movie_id):
+    """
+    Async counterpart of tmdb_client.fetch_movie_details()
+
+    Returns:
+        Movie: Movie data formatted for Neo4j insertion, or None if failed
+    """
+    logger.info("Fetching details for movie ID %s", movie_id, extra=ROLLUP)
+    movie = await client.get_json(f"/movie/{movie_id}", decode=decode_movie)
+    if movie is None:
+        return None
+    logger.info("Successfully fetched details for '%s'", movie['title'], extra=ROLLUP)
+    return movie
+
+
+async def fetch_movie_credits(client, movie_id, max_cast=10):
+    """
+    Async counterpart of tmdb_client.fetch_movie_credits()
+
+    Returns:
+        dict with 'cast' and 'directors' lists, or None if failed
+    """
+    logger.info("Fetching credits for movie ID %s", movie_id, extra=ROLLUP)
+    decoded = await client.get_json(f"/movie/{movie_id}/credits", decode=partial(decode_credits, max_cast=max_cast))
+    if decoded is None:
+        return None
+    cast, directors = decoded
+    warn_if_no_director(directors, movie_id)
+    return {'cast': cast, 'directors': directors}
+
+
+async def fetch_movie_full(client, movie_id, max_cast=10):
+    """
+    Async counterpart of tmdb_client.fetch_movie_full()
+
+    Returns:
+        Movie: Movie details plus 'cast' and 'directors', or None if failed
+    """
+    logger.info("Fetching details and credits for movie ID %s", movie_id, extra=ROLLUP)
+    movie = await client.get_json(f"/movie/{movie_id}", {"append_to_response": "credits"},
+                                  decode=partial(decode_movie, max_cast=max_cast))
+    if movie is None:
+        return None
+    warn_if_no_director(movie.get('directors', []), movie_id)
+    logger.info("Successfully fetched details and credits for '%s'", movie['title'], extra=ROLLUP)
+    return movie
+
+
+async def fetch_as_completed(client, fetch, ids, **kwargs):
+    """
+    Run fetch(client, id, **kwargs) for every ID and yield results as they finish
+
+    At most 2 * client.concurrency calls are scheduled at once, so memory
+    stays bounded however long the ID iterable is.
+
+    Args:
+        client (AsyncTMDBClient): Open client
+        fetch: One of the async fetch_* functions taking (client, id, ...)
+        ids: Iterable of TMDB IDs
+        **kwargs: Extra keyword arguments passed to fetch
+
+    Yields:
+        tuple: (id, result) in completion order; result is None on failure,
+        including when fetch raised
+    """
+    async def run(item_id):
+        try:
+            return item_id, await fetch(client, item_id, **kwargs)
+        except Exception as e:
+            logger.error("Unexpected error fetching %s: %s", item_id, e)
+            return item_id, None
+
+    window = client.concurrency * 2
+    pending = set()
+    for item_id in ids:
+        pending.add(asyncio.ensure_future(run(item_id)))
+        if len(pending) >= window:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
@@ -0,0 +1,450 @@
+"""
+Reproducible ingest benchmarks against a local TMDB stand-in
+
+Scenarios:
+    fetch       - fetch_movie_full() throughput and latency through the
+                  shared rate-limited client, against fake_tmdb
+    transform   - decode_movie() (response body to records) and
+                  build_movie_graph() cost per movie, no I/O
+    write       - write_graph_batch() throughput against an in-process fake
+                  driver, or a scratch Neo4j with --neo4j-uri
+    tx_write    - GraphWriter throughput: one managed transaction per movie,
+                  --write-workers parallel sessions (use --statement-latency
+                  to see the scaling against the fake driver)
+    end_to_end  - IngestPipeline movies/second, fake TMDB to fake or real Neo4j
+
+The write scenarios MERGE synthetic movies under tmdb_ids 1..count (and
+people from fake_tmdb's pool), so --neo4j-uri must point at a throwaway
+instance: the configured NEO4J_URI is refused.
+
+Results are printed (and optionally written) as JSON. --baseline compares
+against an earlier results file and exits non-zero when a tracked metric
+regresses by more than --tolerance.
+
+Usage:
+    python -m benchmark --count 2000 --out data/bench.json
+    python -m benchmark --scenarios fetch end_to_end --latency 0.05 --throttle-rate 0.02
+    python -m benchmark --baseline data/bench.json --tolerance 0.15
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import NEO4J_BATCH_SIZE, NEO4J_URI
+from fake_tmdb import FakeTMDB
+from fingerprint import Fingerprints, set_fingerprints
+from graph_writer import GraphWriter
+from ingest import IngestPipeline
+from logger import setup_logger
+from metrics import REGISTRY, summary as metrics_summary
+from neo4j_client import get_driver, skipped_write_count, write_graph_batch
+from tmdb_client import fetch_movie_full, parse_genres, parse_movie_full
+from tmdb_http import TMDBHttpClient, set_client
+from tmdb_records import FAST_DECODE, decode_movie
+from transform import build_movie_graph, dedupe_nodes, empty_graph, merge_graphs
+
+
+logger = setup_logger(__name__)
+
+SCENARIOS = ('fetch', 'transform', 'write', 'tx_write', 'end_to_end')
+
+# metric path -> True if higher is better; compared by --baseline
+TRACKED_METRICS = {
+    'fetch.movies_per_second': True,
+    'fetch.latency_ms.p99': False,
+    'transform.us_per_movie.total': False,
+    'write.movies_per_second': True,
+    'tx_write.movies_per_second': True,
+    'end_to_end.movies_per_second': True,
+}
+
+# Per-movie INFO logging would dominate the timings
+QUIET_LOGGERS = ('tmdb_client', 'tmdb_records', 'tmdb_http', 'neo4j_client', 'graph_writer', 'transform', 'ingest', 'fake_tmdb')
+
+
+class _Result(list):
+    def consume(self):
+        return None
+
+
+class InMemorySession:
+    """Stand-in for a Neo4j session that counts statements, rows and transactions"""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        rows = len((parameters or {}).get('rows', ()))
+        with self.driver.lock:
+            self.driver.statements += 1
+            self.driver.rows += rows
+        if self.driver.statement_latency:
+            time.sleep(self.driver.statement_latency)
+        return _Result()
+
+    def execute_write(self, work, *args, **kwargs):
+        with self.driver.lock:
+            self.driver.transactions += 1
+        return work(self, *args, **kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InMemoryDriver:
+    """
+    Stand-in for a Neo4j driver, to measure client-side write overhead
+
+    Args:
+        statement_latency (float): Seconds each statement takes, to mimic a
+            server round trip
+    """
+
+    def __init__(self, statement_latency=0.0):
+        self.statement_latency = statement_latency
+        self.statements = 0
+        self.rows = 0
+        self.transactions = 0
+        self.lock = threading.Lock()
+
+    def session(self, **kwargs):
+        return InMemorySession(self)
+
+    def close(self):
+        pass
+
+
+def percentiles(samples):
+    """
+    Returns:
+        dict: p50, p95, p99 and max of the samples (0 for an empty list)
+    """
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 3)}
+
+
+def _client_for(fake, rate):
+    """A cache-less client aimed at the fake server, installed as the shared client"""
+    client = TMDBHttpClient(rate=rate, burst=max(1, int(rate)), base_url=fake.base_url, cache=None, offline=False)
+    set_client(client)
+    return client
+
+
+def bench_fetch(fake, count, workers, rate, max_cast=10):
+    """
+    Returns:
+        dict: movies_per_second, latency_ms percentiles, failures, requests and 429s served
+    """
+    client = _client_for(fake, rate)
+    before = fake.stats()
+    latencies = []
+
+    def timed_fetch(movie_id):
+        start = time.perf_counter()
+        movie = fetch_movie_full(movie_id, max_cast)
+        latencies.append((time.perf_counter() - start) * 1000)
+        return movie
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        movies = list(pool.map(timed_fetch, range(1, count + 1)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    after = fake.stats()
+    return {
+        'movies': count,
+        'workers': workers,
+        'rate_limit': rate,
+        'elapsed_seconds': round(elapsed, 3),
+        'movies_per_second': round(count / elapsed, 2),
+        'latency_ms': percentiles(latencies),
+        'failures': sum(movie is None for movie in movies),
+        'requests': after['requests'] - before['requests'],
+        'throttled': after['throttled'] - before['throttled'],
+    }
+
+
+def _raw_movies(fake, count):
+    """Encoded /movie/{id}?append_to_response=credits bodies, without HTTP"""
+    return [json.dumps(fake.respond(f"/movie/{movie_id}", {'append_to_response': 'credits'})[1]).encode()
+            for movie_id in range(1, count + 1)]
+
+
+def bench_transform(fake, count, max_cast=10):
+    """
+    Returns:
+        dict: Mean microseconds per movie for decode (body to records),
+        build and total; fast_decode tells whether msgspec was used
+    """
+    bodies = _raw_movies(fake, count)
+    genre_names = parse_genres(fake.respond('/genre/movie/list', {})[1])
+
+    start = time.perf_counter()
+    movies = [decode_movie(body, max_cast) for body in bodies]
+    decode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for movie in movies:
+        build_movie_graph(movie, genre_names)
+    build_time = time.perf_counter() - start
+
+    per_movie = {
+        'decode': decode_time / count * 1e6,
+        'build': build_time / count * 1e6,
+    }
+    per_movie['total'] = sum(per_movie.values())
+    return {
+        'movies': count,
+        'fast_decode': FAST_DECODE,
+        'bytes_per_movie': sum(len(body) for body in bodies) // count,
+        'us_per_movie': {name: round(value, 2) for name, value in per_movie.items()},
+    }
+
+
+def _graph_batches(fake, count, batch_size, max_cast=10):
+    genre_names = parse_genres(fake.respond('/genre/movie/list', {})[1])
+    batches = []
+    for start in range(1, count + 1, batch_size):
+        batch = empty_graph()
+        for movie_id in range(start, min(start + batch_size, count + 1)):
+            data = fake.respond(f"/movie/{movie_id}", {'append_to_response': 'credits'})[1]
+            merge_graphs(batch, build_movie_graph(parse_movie_full(data, max_cast), genre_names))
+        batches.append(dedupe_nodes(batch))
+    return batches
+
+
+def bench_write(fake, driver, count, batch_size, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Returns:
+        dict: movies_per_second, rows_per_second and statements issued
+    """
+    batches = _graph_batches(fake, count, batch_size)
+    rows = sum(len(batch[key]) for batch in batches for key in batch)
+    failed = 0
+    start = time.perf_counter()
+    with driver.session() as session:
+        for batch in batches:
+            results = write_graph_batch(session, batch, chunk_size)
+            failed += results['movies'].count(False)
+    elapsed = time.perf_counter() - start
+    result = {
+        'movies': count,
+        'batch_size': batch_size,
+        'rows': rows,
+        'elapsed_seconds': round(elapsed, 3),
+        'movies_per_second': round(count / elapsed, 2),
+        'rows_per_second': round(rows / elapsed, 2),
+        'failed_movies': failed,
+        'skipped_rows': skipped_write_count(),
+    }
+    if isinstance(driver, InMemoryDriver):
+        result['statements'] = driver.statements
+    return result
+
+
+def bench_tx_write(fake, driver, count, batch_size, workers, movies_per_tx=1, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Returns:
+        dict: movies_per_second, rows_per_second and transactions committed
+    """
+    batches = _graph_batches(fake, count, batch_size)
+    rows = sum(len(batch[key]) for batch in batches for key in batch)
+    writer = GraphWriter(driver, workers=workers, movies_per_tx=movies_per_tx, chunk_size=chunk_size)
+    statements = getattr(driver, 'statements', 0)
+    transactions = getattr(driver, 'transactions', 0)
+    failed = 0
+    start = time.perf_counter()
+    for batch in batches:
+        failed += writer.write(batch)['movies'].count(False)
+    elapsed = time.perf_counter() - start
+    result = {
+        'movies': count,
+        'batch_size': batch_size,
+        'workers': workers,
+        'movies_per_tx': movies_per_tx,
+        'rows': rows,
+        'elapsed_seconds': round(elapsed, 3),
+        'movies_per_second': round(count / elapsed, 2),
+        'rows_per_second': round(rows / elapsed, 2),
+        'failed_movies': failed,
+        'skipped_rows': skipped_write_count(),
+    }
+    if isinstance(driver, InMemoryDriver):
+        result['statements'] = driver.statements - statements
+        result['transactions'] = driver.transactions - transactions
+    return result
+
+
+def bench_end_to_end(fake, driver, count, rate, fetch_workers, write_workers, batch_size):
+    """
+    Returns:
+        dict: IngestPipeline summary (includes movies_per_second)
+    """
+    client = _client_for(fake, rate)
+    try:
+        pipeline = IngestPipeline(
+            range(1, count + 1),
+            driver,
+            fetch_workers=fetch_workers,
+            write_workers=write_workers,
+            batch_size=batch_size,
+            bootstrap_schema=not isinstance(driver, InMemoryDriver),
+        )
+        return pipeline.run()
+    finally:
+        client.close()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _metric(results, path):
+    value = results.get('scenarios', {})
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compare tracked metrics against a baseline results file
+
+    Args:
+        results (dict): Output of run_benchmarks()
+        baseline (dict): Earlier output of run_benchmarks()
+        tolerance (float): Allowed relative slowdown before flagging
+
+    Returns:
+        list: Dicts describing each regressed metric (empty if none)
+    """
+    regressions = []
+    for path, higher_is_better in TRACKED_METRICS.items():
+        current, previous = _metric(results, path), _metric(baseline, path)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append({'metric': path, 'baseline': previous, 'current': current, 'change': round(change, 3)})
+    return regressions
+
+
+def run_benchmarks(args):
+    """
+    Run the selected scenarios
+
+    Returns:
+        dict: Environment, settings and per-scenario results
+    """
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('out', 'baseline')},
+        'scenarios': {},
+    }
+    fake = FakeTMDB(latency=args.latency, jitter=args.jitter, throttle_rate=args.throttle_rate,
+                    catalog_size=max(args.count, 1), seed=args.seed).start()
+    driver = get_driver(args.neo4j_uri) if args.neo4j_uri else InMemoryDriver(args.statement_latency)
+    previous_fingerprints = set_fingerprints(None)
+    try:
+        for scenario in args.scenarios:
+            logger.info("Running %s benchmark", scenario)
+            REGISTRY.clear()
+            # In-run identity cache only: a persisted store would turn repeat runs into no-ops
+            set_fingerprints(Fingerprints())
+            if scenario == 'fetch':
+                outcome = bench_fetch(fake, args.count, args.fetch_workers, args.rate)
+            elif scenario == 'transform':
+                outcome = bench_transform(fake, args.count)
+            elif scenario == 'write':
+                outcome = bench_write(fake, driver, args.count, args.batch_size)
+            elif scenario == 'tx_write':
+                outcome = bench_tx_write(fake, driver, args.count, args.batch_size, args.write_workers,
+                                         args.movies_per_tx)
+            else:
+                outcome = bench_end_to_end(fake, driver, args.count, args.rate, args.fetch_workers,
+                                           args.write_workers, args.batch_size)
+            outcome['metrics'] = metrics_summary()
+            results['scenarios'][scenario] = outcome
+    finally:
+        set_fingerprints(previous_fingerprints)
+        fake.stop()
+        driver.close()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch, transform and write stages of the ingest")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--count', type=int, default=1000, help="movies per scenario")
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--write-workers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--movies-per-tx', type=int, default=1, help="movies per transaction in tx_write")
+    parser.add_argument('--rate', type=float, default=1000.0, help="client rate limit (requests/second)")
+    parser.add_argument('--latency', type=float, default=0.01, help="fake TMDB latency per response (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of fake TMDB responses that are 429")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--neo4j-uri', help="write to this scratch Neo4j instead of the in-process fake; synthetic "
+                        "movies overwrite tmdb_ids 1..count, so the configured NEO4J_URI is refused")
+    parser.add_argument('--statement-latency', type=float, default=0.0,
+                        help="seconds per statement for the in-process fake driver")
+    parser.add_argument('--out', help="also write results JSON to this file")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative regression")
+    parser.add_argument('--verbose', action='store_true', help="keep per-movie INFO logging on")
+    args = parser.parse_args(argv)
+    if args.neo4j_uri and NEO4J_URI and args.neo4j_uri.rstrip('/') == NEO4J_URI.rstrip('/'):
+        parser.error("--neo4j-uri is the configured NEO4J_URI; benchmark writes would overwrite real movies")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    results = run_benchmarks(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['regressions'] = compare(results, json.load(f), args.tolerance)
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    if results.get('regressions'):
+        logger.error("%d benchmark metrics regressed beyond %.0f%%", len(results['regressions']), args.tolerance * 100)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
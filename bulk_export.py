@@ -0,0 +1,254 @@
+"""
+Export fetched movies as neo4j-admin import CSVs
+
+For initial loads, writing CSVs and running `neo4j-admin database import`
+is far faster than transactional MERGEs. Nodes are deduplicated with compact
+ID bitmaps and rows are streamed into rolling part files, so memory stays
+bounded and large exports can be split across processes with --shard.
+
+Usage:
+    python -m bulk_export --count 100000 --out data/import
+    neo4j-admin database import full --multiline-fields=true --nodes=Movie=data/import/movies_header.csv,data/import/movies_part.* ...
+"""
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from id_set import IdBitmap
+from logger import setup_logger
+from tmdb_client import fetch_genres, fetch_movie_full, iter_popular_movie_ids
+from tmdb_export_ids import iter_export_ids
+from transform import build_movie_graph
+
+
+logger = setup_logger(__name__)
+
+# file prefix -> header row
+# Node files use an unnamed :ID column so every ID space can be typed
+# independently; the real key is stored as a typed property alongside it.
+CSV_FILES = {
+    'movies': [':ID(Movie)', 'tmdb_id:long', 'title', 'release_year:int', 'rating:float', 'budget:long',
+               'revenue:long', 'overview', 'poster_url', ':LABEL'],
+    'people': [':ID(Person)', 'tmdb_id:long', 'name', 'profile_url', ':LABEL'],
+    'genres': [':ID(Genre)', 'name', ':LABEL'],
+    'studios': [':ID(Studio)', 'id:long', 'name', ':LABEL'],
+    'acted_in': [':START_ID(Person)', ':END_ID(Movie)', 'character', 'order:int', ':TYPE'],
+    'directed': [':START_ID(Person)', ':END_ID(Movie)', ':TYPE'],
+    'in_genre': [':START_ID(Movie)', ':END_ID(Genre)', 'is_primary:boolean', ':TYPE'],
+    'produced_by': [':START_ID(Movie)', ':END_ID(Studio)', ':TYPE'],
+}
+
+
+def _value(value):
+    return '' if value is None else value
+
+
+class _RollingCsv:
+    """CSV writer that starts a new part file every rows_per_file rows"""
+
+    def __init__(self, out_dir, prefix, header, rows_per_file, shard_tag):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.rows_per_file = rows_per_file
+        self.shard_tag = shard_tag
+        self.rows = 0
+        self.part = 0
+        self._file = None
+        self._writer = None
+        with open(os.path.join(out_dir, f'{prefix}_header.csv'), 'w', newline='') as f:
+            csv.writer(f).writerow(header)
+
+    def writerow(self, row):
+        if self._file is None or self.rows % self.rows_per_file == 0:
+            self._roll()
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def _roll(self):
+        if self._file is not None:
+            self._file.close()
+            self.part += 1
+        path = os.path.join(self.out_dir, f'{self.prefix}_part{self.shard_tag}{self.part:04d}.csv')
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class BulkCsvExporter:
+    """
+    Stream movie dicts into deduplicated neo4j-admin node and relationship CSVs
+
+    Args:
+        out_dir (str): Output directory (created if missing)
+        genre_names (dict): genre_id -> genre_name from fetch_genres()
+        rows_per_file (int): Rows per part file before rolling over
+        shard_tag (str): Inserted into part file names so several exporters
+            can write into the same directory without clashing
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, out_dir, genre_names, rows_per_file=1_000_000, shard_tag=''):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.genre_names = genre_names
+        self._writers = {
+            prefix: _RollingCsv(out_dir, prefix, header, rows_per_file, shard_tag)
+            for prefix, header in CSV_FILES.items()
+        }
+        self._movies = IdBitmap()
+        self._people = IdBitmap()
+        self._studios = IdBitmap()
+        self._genres = set()  # ~20 names, no need for anything compact
+        self.skipped_movies = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_movie(self, movie):
+        """
+        Add one movie and its cast, directors, genres and studios
+
+        Args:
+            movie (dict): fetch_movie_full() output, or fetch_movie_details()
+                updated with fetch_movie_credits()
+
+        Returns:
+            bool: False if the movie was already exported
+        """
+        if not self._movies.add(movie['tmdb_id']):
+            self.skipped_movies += 1
+            return False
+        graph = build_movie_graph(movie, self.genre_names)
+        w = self._writers
+        for m in graph['movies']:
+            w['movies'].writerow([
+                m['tmdb_id'], m['tmdb_id'], _value(m['title']), _value(m['release_year']), _value(m['rating']),
+                m['budget'] or 0, m['revenue'] or 0, _value(m['overview']), _value(m['poster_url']), 'Movie',
+            ])
+        for person in graph['people']:
+            if self._people.add(person['tmdb_id']):
+                w['people'].writerow([person['tmdb_id'], person['tmdb_id'], _value(person['name']),
+                                      _value(person['profile_url']), 'Person'])
+        for genre in graph['genres']:
+            if genre['name'] not in self._genres:
+                self._genres.add(genre['name'])
+                w['genres'].writerow([genre['name'], genre['name'], 'Genre'])
+        for studio in graph['studios']:
+            if self._studios.add(studio['id']):
+                w['studios'].writerow([studio['id'], studio['id'], _value(studio['name']), 'Studio'])
+
+        # MERGE would collapse repeated edges within a movie; neo4j-admin won't
+        seen_actors = set()
+        for person_id, movie_id, character, order in graph['acted_in']:
+            if person_id not in seen_actors:
+                seen_actors.add(person_id)
+                w['acted_in'].writerow([person_id, movie_id, _value(character), _value(order), 'ACTED_IN'])
+        for person_id, movie_id in set(graph['directed']):
+            w['directed'].writerow([person_id, movie_id, 'DIRECTED'])
+        for movie_id, genre_name, is_primary in graph['in_genre']:
+            w['in_genre'].writerow([movie_id, genre_name, 'true' if is_primary else 'false', 'IN_GENRE'])
+        for studio_id, movie_id in set(graph['produced_by']):
+            w['produced_by'].writerow([movie_id, studio_id, 'PRODUCED_BY'])
+        return True
+
+    def row_counts(self):
+        """
+        Returns:
+            dict: file prefix -> data rows written
+        """
+        return {prefix: writer.rows for prefix, writer in self._writers.items()}
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+def import_command(out_dir, database='neo4j'):
+    """
+    Build the neo4j-admin command that loads an export directory
+
+    Overviews, names and characters can contain line breaks; csv quotes
+    those fields, and --multiline-fields lets the importer read them.
+
+    Returns:
+        str: Shell command line
+    """
+    def files(prefix):
+        return f"{os.path.join(out_dir, prefix + '_header.csv')},{os.path.join(out_dir, prefix + '_part.*')}"
+
+    return ' '.join([
+        'neo4j-admin database import full', database,
+        '--skip-duplicate-nodes=true',
+        '--multiline-fields=true',
+        f"--nodes=Movie={files('movies')}",
+        f"--nodes=Person={files('people')}",
+        f"--nodes=Genre={files('genres')}",
+        f"--nodes=Studio={files('studios')}",
+        f"--relationships=ACTED_IN={files('acted_in')}",
+        f"--relationships=DIRECTED={files('directed')}",
+        f"--relationships=IN_GENRE={files('in_genre')}",
+        f"--relationships=PRODUCED_BY={files('produced_by')}",
+    ])
+
+
+def _fetch_in_chunks(movie_ids, fetch_workers, max_cast, chunk=200):
+    """Fetch movies concurrently without materializing the whole ID list"""
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        batch = []
+        for movie_id in movie_ids:
+            batch.append(movie_id)
+            if len(batch) >= chunk:
+                yield from pool.map(lambda i: fetch_movie_full(i, max_cast), batch)
+                batch = []
+        if batch:
+            yield from pool.map(lambda i: fetch_movie_full(i, max_cast), batch)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export TMDB movies as neo4j-admin import CSVs")
+    parser.add_argument('--count', type=int,
+                        help="number of movies to export (default: 1000 popular movies, or every ID in --id-file)")
+    parser.add_argument('--id-file', help="read IDs from a TMDB daily export (.json.gz) instead of /movie/popular")
+    parser.add_argument('--min-popularity', type=float, default=0.0, help="popularity floor for --id-file")
+    parser.add_argument('--out', default='data/import')
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--max-cast', type=int, default=10)
+    parser.add_argument('--rows-per-file', type=int, default=1_000_000)
+    parser.add_argument('--shard', default='0/1',
+                        help="INDEX/COUNT: only export movies with tmdb_id %% COUNT == INDEX")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    shard_index, shard_count = (int(part) for part in args.shard.split('/'))
+    shard_tag = f'{shard_index:03d}_' if shard_count > 1 else ''
+    if args.id_file:
+        source = iter_export_ids(args.id_file, args.min_popularity, limit=args.count)
+    else:
+        source = iter_popular_movie_ids(args.count if args.count is not None else 1000)
+    movie_ids = (i for i in source if i % shard_count == shard_index)
+    failed = 0
+    with BulkCsvExporter(args.out, fetch_genres(), args.rows_per_file, shard_tag) as exporter:
+        for movie in _fetch_in_chunks(movie_ids, args.fetch_workers, args.max_cast):
+            if movie is None:
+                failed += 1
+                continue
+            exporter.add_movie(movie)
+        counts = exporter.row_counts()
+    logger.info("Exported %s movies (%s failed to fetch) to %s", counts['movies'], failed, args.out)
+    for prefix, rows in counts.items():
+        print(f"{prefix:>12}: {rows}")
+    print("\nLoad with:\n" + import_command(args.out))
+    return counts
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,35 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "500"))
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
-TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
\ No newline at end of file
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")  # point at fake_tmdb for benchmarks
+TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+TMDB_CONCURRENCY = int(os.getenv("TMDB_CONCURRENCY", "8"))
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))  # requests per second
+TMDB_RATE_BURST = int(os.getenv("TMDB_RATE_BURST", "20"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "10"))  # seconds
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "5"))
+TMDB_POOL_SIZE = int(os.getenv("TMDB_POOL_SIZE", "16"))
+
+TMDB_CACHE_ENABLED = os.getenv("TMDB_CACHE_ENABLED", "1") == "1"
+TMDB_CACHE_PATH = os.getenv("TMDB_CACHE_PATH", "data/tmdb_cache.sqlite")
+TMDB_CACHE_MAX_MB = int(os.getenv("TMDB_CACHE_MAX_MB", "2048"))
+TMDB_OFFLINE = os.getenv("TMDB_OFFLINE", "0") == "1"  # serve from cache only, never hit the network
+
+RECOMMEND_CACHE_ENTRIES = int(os.getenv("RECOMMEND_CACHE_ENTRIES", "50000"))
+RECOMMEND_CACHE_ROWS = int(os.getenv("RECOMMEND_CACHE_ROWS", "1000000"))  # result rows across all entries
+RECOMMEND_CACHE_TTL = float(os.getenv("RECOMMEND_CACHE_TTL", "900"))  # seconds
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" (human-readable) or "json" (one object per line)
+LOG_ASYNC = os.getenv("LOG_ASYNC", "0") == "1"  # hand records to a background thread for formatting and I/O
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")  # lowest level recorded; DEBUG calls are free above it
+LOG_ROLLUP_INTERVAL = float(os.getenv("LOG_ROLLUP_INTERVAL", "0"))  # seconds; 0 logs every per-entity line
+LOG_ROLLUP_SAMPLE = int(os.getenv("LOG_ROLLUP_SAMPLE", "1"))  # per-entity lines passed through per interval
+
+FINGERPRINT_ENABLED = os.getenv("FINGERPRINT_ENABLED", "1") == "1"  # skip Neo4j writes of unchanged rows
+FINGERPRINT_PATH = os.getenv("FINGERPRINT_PATH", "data/fingerprints.sqlite")
+
+SHARD_QUEUE_PATH = os.getenv("SHARD_QUEUE_PATH", "data/shard_queue.sqlite")  # put on shared storage for multi-node runs
+SHARD_LEASE_SECONDS = float(os.getenv("SHARD_LEASE_SECONDS", "120"))  # leases of a silent worker are reclaimed after this
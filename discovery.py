@@ -0,0 +1,208 @@
+"""
+Full-catalog movie ID discovery through /discover/movie
+
+TMDB serves at most 500 pages (10,000 results) per query, so the catalog is
+split into release-date slices small enough to stay under that cap: one
+slice per year, halved recursively while a slice still overflows, and split
+by genre as a last resort for single days (plus one slice for that day's
+movies without a genre). Pages of every slice are fetched concurrently
+through the shared rate-limited client and IDs are deduplicated in a
+compact bitmap.
+
+Movies without a primary release date match no date slice, and
+/discover/movie can't select them, so they are never returned here; take
+them from the TMDB daily ID export (tmdb_export_ids.py), which lists every
+movie.
+
+Usage:
+    python -m discovery --out data/discovered_ids.json.gz --workers 16
+    python -m ingest --id-file data/discovered_ids.json.gz --count 1000000
+"""
+import argparse
+import gzip
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from id_set import IdBitmap
+from logger import setup_logger
+from tmdb_client import fetch_genres, parse_movie_id_page
+from tmdb_http import get_client
+
+
+logger = setup_logger(__name__)
+
+MAX_PAGES = 500  # TMDB refuses page numbers above this
+FIRST_YEAR = 1874  # earliest release years on TMDB
+
+# without_genres: '|'-separated genre IDs to exclude (the slice of movies with no genre)
+Slice = namedtuple('Slice', 'start end genre without_genres', defaults=(None,))
+
+
+def slice_label(slice_):
+    label = f"{slice_.start.isoformat()}..{slice_.end.isoformat()}"
+    if slice_.genre is not None:
+        label += f" genre={slice_.genre}"
+    if slice_.without_genres is not None:
+        label += " genre=none"
+    return label
+
+
+def _fetch_page(slice_, page, include_adult=False):
+    params = {
+        'primary_release_date.gte': slice_.start.isoformat(),
+        'primary_release_date.lte': slice_.end.isoformat(),
+        'include_adult': 'true' if include_adult else 'false',
+        'include_video': 'false',
+        # Every movie of a single-day slice ties on release date, which would
+        # leave page boundaries to the server's whim; the title rarely ties
+        'sort_by': 'original_title.asc',
+        'page': page,
+    }
+    if slice_.genre is not None:
+        params['with_genres'] = slice_.genre
+    if slice_.without_genres is not None:
+        params['without_genres'] = slice_.without_genres
+    return get_client().get_json('/discover/movie', params)
+
+
+def split_slice(slice_, genre_ids):
+    """
+    Split an overflowing slice into smaller ones
+
+    Multi-day slices are halved by date; a single day is split by genre,
+    plus a slice for its movies with none of those genres.
+
+    Returns:
+        list: Smaller slices (empty if the slice can't be split further)
+    """
+    days = (slice_.end - slice_.start).days
+    if days > 0:
+        middle = slice_.start + timedelta(days=days // 2)
+        return [slice_._replace(end=middle), slice_._replace(start=middle + timedelta(days=1))]
+    if slice_.genre is None and slice_.without_genres is None:
+        return [Slice(slice_.start, slice_.end, genre_id) for genre_id in genre_ids] + [
+            Slice(slice_.start, slice_.end, None, '|'.join(str(genre_id) for genre_id in genre_ids))
+        ]
+    return []
+
+
+def year_slices(first_year=FIRST_YEAR, last_year=None):
+    """
+    Returns:
+        list: One Slice per calendar year, up to next year (announced titles)
+    """
+    last_year = last_year or date.today().year + 1
+    return [Slice(date(year, 1, 1), date(year, 12, 31), None) for year in range(first_year, last_year + 1)]
+
+
+def discover_movie_ids(slices=None, workers=16, include_adult=False):
+    """
+    Enumerate movie IDs across date slices, fetching pages concurrently
+
+    Args:
+        slices (list): Starting slices (default: one per year)
+        workers (int): Concurrent page fetches
+        include_adult (bool): Include adult titles
+
+    Returns:
+        tuple: (IdBitmap of unique IDs, dict of slice label -> report) where
+        each report has 'results' (TMDB total), 'pages', 'ids' and 'new'
+        (IDs not already seen in an earlier slice)
+    """
+    seen = IdBitmap()
+    report = {}
+    genre_ids = None
+    pending = list(slices or year_slices())
+
+    def record(slice_, data):
+        entry = report[slice_label(slice_)]
+        entry['pages'] += 1
+        for movie_id in parse_movie_id_page(data):
+            entry['ids'] += 1
+            if seen.add(movie_id):
+                entry['new'] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Phase 1: probe page 1 of every slice, splitting the ones over the cap
+        ready = []
+        while pending:
+            futures = {pool.submit(_fetch_page, s, 1, include_adult): s for s in pending}
+            pending = []
+            for future in as_completed(futures):
+                slice_ = futures[future]
+                data = future.result()
+                if data is None:
+                    logger.error("Failed to probe slice %s", slice_label(slice_))
+                    continue
+                if data.get('total_pages', 0) > MAX_PAGES:
+                    if genre_ids is None:
+                        genre_ids = sorted(fetch_genres())
+                    parts = split_slice(slice_, genre_ids)
+                    if parts:
+                        pending.extend(parts)
+                        continue
+                    logger.warning("Slice %s exceeds %s pages and can't be split; truncating",
+                                   slice_label(slice_), MAX_PAGES)
+                report[slice_label(slice_)] = {'results': data.get('total_results', 0), 'pages': 0, 'ids': 0, 'new': 0}
+                record(slice_, data)
+                ready.append((slice_, min(data.get('total_pages', 1), MAX_PAGES)))
+
+        # Phase 2: remaining pages of every slice
+        futures = {
+            pool.submit(_fetch_page, slice_, page, include_adult): slice_
+            for slice_, total_pages in ready
+            for page in range(2, total_pages + 1)
+        }
+        for future in as_completed(futures):
+            data = future.result()
+            if data is None:
+                logger.error("Failed to fetch a page of slice %s", slice_label(futures[future]))
+                continue
+            record(futures[future], data)
+
+    logger.info("Discovered %s unique movie IDs across %s slices", len(seen), len(report))
+    return seen, report
+
+
+def write_id_file(ids, path):
+    """
+    Write IDs as gzipped JSON lines readable by tmdb_export_ids.iter_export_ids
+
+    Returns:
+        int: Number of IDs written
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for movie_id in ids:
+            f.write(json.dumps({'id': movie_id}) + '\n')
+            count += 1
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Enumerate the TMDB movie catalog via /discover/movie")
+    parser.add_argument('--out', default='data/discovered_ids.json.gz')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--first-year', type=int, default=FIRST_YEAR)
+    parser.add_argument('--last-year', type=int)
+    parser.add_argument('--include-adult', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ids, report = discover_movie_ids(
+        year_slices(args.first_year, args.last_year), workers=args.workers, include_adult=args.include_adult
+    )
+    for label, entry in sorted(report.items()):
+        print(f"{label:>36}: {entry['ids']:>6} ids ({entry['new']} new, {entry['results']} reported)")
+    written = write_id_file(ids, args.out)
+    print(f"\nWrote {written} unique IDs to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the TMDB endpoints tmdb_client uses, for benchmarks
+
+Serves recorded responses from fixtures/tmdb over HTTP with configurable
+latency and injected 429s. /movie/{id} for an ID without its own fixture
+is synthesised from a recorded movie: the ID is swapped and cast/crew IDs
+are drawn from a fixed-size pool, so a large catalog shares people the way
+real data does. List endpoints (/movie/popular, /discover/movie,
+/movie/changes) page through IDs 1..catalog_size.
+
+Usage:
+    python -m fake_tmdb serve --port 8765 --latency 0.02 --throttle-rate 0.01
+    TMDB_BASE_URL=http://127.0.0.1:8765/3 python -m ingest --count 1000
+
+    python -m fake_tmdb record --movies 550 680 13   # refresh fixtures from the live API
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'tmdb')
+PAGE_SIZE = 20
+MAX_PAGE = 500
+
+_MOVIE_PATH = re.compile(r"^/movie/(\d+)(/credits)?$")
+_MOVIE_FIXTURE = re.compile(r"^movie_\d+\.json$")
+
+
+def fixture_name(path):
+    """'/movie/550' -> 'movie_550.json'"""
+    return path.strip('/').replace('/', '_') + '.json'
+
+
+class FakeTMDB:
+    """
+    Threaded HTTP server answering like api.themoviedb.org/3
+
+    Args:
+        fixture_dir (str): Directory of recorded responses (see fixture_name())
+        latency (float): Seconds added to every response
+        jitter (float): Extra uniform random latency, in seconds
+        throttle_rate (float): Fraction of requests answered with 429
+        retry_after (float): Retry-After value sent with each 429
+        catalog_size (int): Number of movie IDs list endpoints page through
+        people_pool (int): Distinct person IDs used for synthesised credits
+        seed (int): Seed for latency jitter and 429 injection
+        port (int): Port to bind (0 picks a free one)
+    """
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.0, throttle_rate=0.0, retry_after=0.0,
+                 catalog_size=10000, people_pool=50000, seed=0, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.catalog_size = catalog_size
+        self.people_pool = people_pool
+        self.fixtures = {}
+        for path in glob.glob(os.path.join(fixture_dir, '*.json')):
+            with open(path) as f:
+                self.fixtures[os.path.basename(path)] = json.load(f)
+        self.templates = [data for name, data in sorted(self.fixtures.items()) if _MOVIE_FIXTURE.match(name)]
+        if not self.templates:
+            raise ValueError(f"No movie_<id>.json fixtures in {fixture_dir}")
+        self.requests = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Value for TMDB_BASE_URL / TMDBHttpClient(base_url=...)"""
+        return f"http://127.0.0.1:{self._server.server_address[1]}/3"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-tmdb', daemon=True)
+        self._thread.start()
+        logger.info("Fake TMDB listening on %s", self.base_url)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'throttled': self.throttled}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _handle(self, request):
+        with self._lock:
+            self.requests += 1
+            throttle = self._rng.random() < self.throttle_rate
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if throttle:
+                self.throttled += 1
+        if delay:
+            time.sleep(delay)
+        if throttle:
+            self._send(request, 429, {'status_code': 25, 'status_message': 'Your request count is over the allowed limit.'},
+                       {'Retry-After': f"{self.retry_after:g}"})
+            return
+        url = urlsplit(request.path)
+        path = url.path[len('/3'):] if url.path.startswith('/3/') else url.path
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, body = self.respond(path, params)
+        self._send(request, status, body)
+
+    @staticmethod
+    def _send(request, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json;charset=utf-8')
+        request.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def respond(self, path, params):
+        """
+        Build the response for a request path
+
+        Returns:
+            tuple: (HTTP status, decoded JSON body)
+        """
+        if path == '/genre/movie/list':
+            return 200, self.fixtures['genre_movie_list.json']
+        if path in ('/movie/popular', '/discover/movie', '/movie/changes'):
+            return self._id_page(path, int(params.get('page', 1)))
+        match = _MOVIE_PATH.match(path)
+        if match:
+            movie = self._movie(int(match.group(1)))
+            if match.group(2):
+                return 200, dict(movie['credits'], id=movie['id'])
+            if 'credits' not in params.get('append_to_response', '').split(','):
+                movie = {key: value for key, value in movie.items() if key != 'credits'}
+            return 200, movie
+        return 404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+
+    def _id_page(self, path, page):
+        total_pages = math.ceil(self.catalog_size / PAGE_SIZE)
+        if page < 1 or page > MAX_PAGE:
+            return 400, {'status_code': 22, 'status_message': 'Invalid page: Pages start at 1 and max at 500.'}
+        first = (page - 1) * PAGE_SIZE + 1
+        ids = range(first, min(first + PAGE_SIZE, self.catalog_size + 1))
+        if path == '/movie/changes':
+            results = [{'id': movie_id, 'adult': False} for movie_id in ids]
+        else:
+            results = [{'id': movie_id, 'title': f"Movie {movie_id}", 'popularity': 1000.0 / movie_id} for movie_id in ids]
+        return 200, {'page': page, 'results': results, 'total_pages': total_pages, 'total_results': self.catalog_size}
+
+    def _movie(self, movie_id):
+        recorded = self.fixtures.get(fixture_name(f"/movie/{movie_id}"))
+        if recorded is not None:
+            return recorded
+        template = self.templates[movie_id % len(self.templates)]
+        rng = random.Random(movie_id)
+        movie = dict(template, id=movie_id, title=f"{template.get('title')} #{movie_id}")
+        credits = template.get('credits', {'cast': [], 'crew': []})
+        movie['credits'] = {
+            'cast': [dict(person, id=rng.randrange(1, self.people_pool)) for person in credits['cast']],
+            'crew': [dict(person, id=rng.randrange(1, self.people_pool)) for person in credits['crew']],
+        }
+        return movie
+
+
+def record_fixtures(movie_ids, out_dir=FIXTURE_DIR):
+    """
+    Save live TMDB responses as fixtures (needs TMDB_API_KEY and network)
+
+    Returns:
+        list: Fixture files written
+    """
+    from tmdb_http import get_client
+
+    os.makedirs(out_dir, exist_ok=True)
+    targets = [('/genre/movie/list', None)]
+    targets += [(f"/movie/{movie_id}", {'append_to_response': 'credits'}) for movie_id in movie_ids]
+    written = []
+    for path, params in targets:
+        data = get_client().get_json(path, params)
+        if data is None:
+            logger.error("Could not record %s", path)
+            continue
+        target = os.path.join(out_dir, fixture_name(path))
+        with open(target, 'w') as f:
+            json.dump(data, f)
+        written.append(target)
+    logger.info("Recorded %s fixtures into %s", len(written), out_dir)
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local TMDB stand-in for benchmarks")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    serve.add_argument('--jitter', type=float, default=0.0)
+    serve.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered with 429")
+    serve.add_argument('--retry-after', type=float, default=0.0)
+    serve.add_argument('--catalog-size', type=int, default=10000)
+    record = sub.add_parser('record')
+    record.add_argument('--movies', type=int, nargs='+', required=True)
+    record.add_argument('--out', default=FIXTURE_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'record':
+        record_fixtures(args.movies, args.out)
+        return
+    fake = FakeTMDB(latency=args.latency, jitter=args.jitter, throttle_rate=args.throttle_rate,
+                    retry_after=args.retry_after, catalog_size=args.catalog_size, port=args.port)
+    fake.start()
+    print(f"export TMDB_BASE_URL={fake.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Content fingerprints for skipping writes that would change nothing
+
+Each node row a neo4j_client writer is about to send is hashed (blake2b
+over its canonical JSON). Before writing, the hash is compared with:
+
+    1. the in-run identity cache: what this process already wrote, so the
+       same actor or studio appearing in many movies is written once
+    2. the fingerprint store: a local SQLite mirror of what earlier runs
+       wrote, so re-ingesting an unchanged movie costs no database round trip
+
+Movie and Person nodes also carry the hash as a content_hash property, so
+their part of the store can be rebuilt from the graph (python -m
+fingerprint sync); sync drops every other fingerprint of the graph, whose
+rows are then written once more. The store is namespaced by NEO4J_URI, so
+a wiped or restored database keeps its old fingerprints: ingest calls
+verify_against_graph() at startup, which clears the store when the graph
+no longer holds the movies it records (`python -m fingerprint verify` runs
+the same check).
+
+Usage:
+    python -m fingerprint stats
+    python -m fingerprint sync     # replace the store with Movie/Person hashes from Neo4j
+    python -m fingerprint verify   # clear the store if the graph was wiped or restored
+    python -m fingerprint clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import FINGERPRINT_ENABLED, FINGERPRINT_PATH, NEO4J_URI
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+# Node labels whose hash is also stored on the node as content_hash
+HASHED_PROPERTY_LABELS = ('Movie', 'Person')
+
+SYNC_QUERY = """
+MATCH (n:{label})
+WHERE n.content_hash IS NOT NULL AND n.tmdb_id > $after
+RETURN n.tmdb_id AS key, n.content_hash AS hash
+ORDER BY n.tmdb_id
+LIMIT $limit
+"""
+
+MOVIE_COUNT_QUERY = "MATCH (m:Movie) RETURN count(m) AS movies"
+
+MOVIE_HASHES_QUERY = """
+UNWIND $ids AS id
+MATCH (m:Movie {tmdb_id: id})
+RETURN m.tmdb_id AS key, m.content_hash AS hash
+"""
+
+
+def content_hash(values):
+    """
+    Stable 64-bit hash of a row's property values
+
+    Only two versions of the same entity are ever compared, so 64 bits make
+    a missed change practically impossible.
+
+    Args:
+        values (dict): Property name -> value, as sent to Neo4j
+
+    Returns:
+        str: 16 hex characters
+    """
+    encoded = json.dumps(values, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Durable (kind, key) -> content hash map backed by SQLite
+
+    kind is a node label or 'movie_edges'. Rows are namespaced by graph so
+    one file can serve several databases. Safe to share between threads.
+    """
+
+    def __init__(self, path=FINGERPRINT_PATH, graph=NEO4J_URI):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.graph = graph or ''
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                graph TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (graph, kind, key)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def get_many(self, kind, keys):
+        """
+        Returns:
+            dict: str(key) -> stored hash, for the keys that have one
+        """
+        found = {}
+        keys = [str(key) for key in keys]
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, hash FROM fingerprints WHERE graph = ? AND kind = ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    [self.graph, kind] + chunk,
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, kind, items):
+        """
+        Args:
+            kind (str): Node label or 'movie_edges'
+            items (list): (key, hash) pairs
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO fingerprints (graph, kind, key, hash, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(graph, kind, key) DO UPDATE SET hash = excluded.hash, updated_at = excluded.updated_at",
+                [(self.graph, kind, str(key), value, now) for key, value in items],
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Forget every fingerprint of this graph"""
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprints WHERE graph = ?", (self.graph,))
+            self._conn.commit()
+
+    def recent(self, kind, limit):
+        """
+        Returns:
+            list: (key, hash) pairs of the most recently written fingerprints
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, hash FROM fingerprints WHERE graph = ? AND kind = ? ORDER BY updated_at DESC LIMIT ?",
+                (self.graph, kind, limit),
+            ).fetchall()
+
+    def counts(self):
+        """
+        Returns:
+            dict: kind -> number of stored fingerprints for this graph
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*) FROM fingerprints WHERE graph = ? GROUP BY kind", (self.graph,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Fingerprints:
+    """
+    In-run identity cache in front of an optional FingerprintStore
+
+    Hashes found in the store are copied into the run cache, so each key
+    costs at most one SQLite lookup per run. Safe to share between threads.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def unchanged(self, kind, items):
+        """
+        Check which rows already have the given hash
+
+        Args:
+            kind (str): Node label or 'movie_edges'
+            items (list): (key, hash) pairs
+
+        Returns:
+            list: One reason per item: 'seen' (written earlier this run),
+            'unchanged' (matches the store) or None (must be written)
+        """
+        reasons = [None] * len(items)
+        missing = []
+        with self._lock:
+            for i, (key, value) in enumerate(items):
+                if self._seen.get((kind, key)) == value:
+                    reasons[i] = 'seen'
+                else:
+                    missing.append(i)
+        if missing and self.store is not None:
+            stored = self.store.get_many(kind, [items[i][0] for i in missing])
+            hits = []
+            for i in missing:
+                key, value = items[i]
+                if stored.get(str(key)) == value:
+                    reasons[i] = 'unchanged'
+                    hits.append((key, value))
+            with self._lock:
+                for key, value in hits:
+                    self._seen[(kind, key)] = value
+        return reasons
+
+    def record(self, kind, items):
+        """
+        Remember hashes of rows that were just written
+
+        Args:
+            kind (str): Node label or 'movie_edges'
+            items (list): (key, hash) pairs
+        """
+        if not items:
+            return
+        with self._lock:
+            for key, value in items:
+                self._seen[(kind, key)] = value
+        if self.store is not None:
+            self.store.put_many(kind, items)
+
+    def clear(self):
+        """Forget the run cache and, if attached, the store"""
+        with self._lock:
+            self._seen.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+_fingerprints = None
+_configured = False
+_fingerprints_lock = threading.Lock()
+
+
+def get_fingerprints():
+    """
+    Return the process-wide Fingerprints, creating it on first use
+
+    Returns:
+        Fingerprints: Shared instance, or None when FINGERPRINT_ENABLED is off
+    """
+    global _fingerprints, _configured
+    if not _configured:
+        with _fingerprints_lock:
+            if not _configured:
+                _fingerprints = Fingerprints(FingerprintStore()) if FINGERPRINT_ENABLED else None
+                _configured = True
+    return _fingerprints
+
+
+def set_fingerprints(fingerprints):
+    """
+    Replace the process-wide Fingerprints
+
+    Args:
+        fingerprints (Fingerprints): Instance the writers should use, or
+            None to write every row
+
+    Returns:
+        Fingerprints: The previous instance (None if none was created)
+    """
+    global _fingerprints, _configured
+    with _fingerprints_lock:
+        previous, _fingerprints = _fingerprints, fingerprints
+        _configured = True
+    return previous
+
+
+def sync_from_graph(driver, store, page_size=10000):
+    """
+    Replace the store's contents with the Movie and Person hashes in the graph
+
+    Every fingerprint of the store's graph is dropped first: Genre, Studio
+    and movie_edges hashes cannot be read back from the graph, and stale
+    ones would skip writes the graph never received.
+
+    Args:
+        driver: Neo4j driver
+        store (FingerprintStore): Store to refill
+        page_size (int): Nodes read per query
+
+    Returns:
+        dict: label -> fingerprints loaded
+    """
+    store.clear()
+    loaded = {}
+    with driver.session() as session:
+        for label in HASHED_PROPERTY_LABELS:
+            loaded[label] = 0
+            after = -1
+            while True:
+                rows = [(record['key'], record['hash'])
+                        for record in session.run(SYNC_QUERY.format(label=label), {'after': after, 'limit': page_size})]
+                if not rows:
+                    break
+                store.put_many(label, rows)
+                loaded[label] += len(rows)
+                after = rows[-1][0]
+            logger.info("Loaded %d %s fingerprints from the graph", loaded[label], label)
+    return loaded
+
+
+def verify_against_graph(driver, fingerprints, sample_size=100):
+    """
+    Clear the fingerprints if the graph no longer holds what they record
+
+    After a wipe or restore the store would skip writes of rows the graph
+    lost. The store is stale if the graph has fewer Movie nodes than it has
+    Movie fingerprints, or if any of the sample_size most recently written
+    movies is missing or carries a different content_hash.
+
+    Args:
+        driver: Neo4j driver
+        fingerprints (Fingerprints): Instance to check; one without a store
+            is left alone
+        sample_size (int): Recent Movie fingerprints compared with the graph
+
+    Returns:
+        bool: True if the store was stale and has been cleared
+    """
+    store = fingerprints.store
+    if store is None:
+        return False
+    stored = store.counts().get('Movie', 0)
+    if not stored:
+        return False
+    sample = dict(store.recent('Movie', sample_size))
+    with driver.session() as session:
+        movies = session.run(MOVIE_COUNT_QUERY).single()['movies']
+        in_graph = {str(record['key']): record['hash']
+                    for record in session.run(MOVIE_HASHES_QUERY, {'ids': [int(key) for key in sample]})}
+    missing = sum(in_graph.get(key) != value for key, value in sample.items())
+    if movies >= stored and not missing:
+        return False
+    logger.warning("Fingerprint store is stale (%d Movie fingerprints, %d movies in the graph, "
+                   "%d of %d recent movies missing or changed); clearing it", stored, movies, missing, len(sample))
+    fingerprints.clear()
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the write-skipping fingerprint store")
+    parser.add_argument('command', choices=('stats', 'sync', 'verify', 'clear'))
+    parser.add_argument('--path', default=FINGERPRINT_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = FingerprintStore(args.path)
+    try:
+        if args.command == 'clear':
+            store.clear()
+            print(f"Cleared fingerprints for {store.graph or '(no NEO4J_URI)'}")
+        elif args.command in ('sync', 'verify'):
+            from neo4j_client import get_driver  # imported here: neo4j_client itself uses this module
+            driver = get_driver()
+            try:
+                if args.command == 'sync':
+                    sync_from_graph(driver, store)
+                elif not verify_against_graph(driver, Fingerprints(store)):
+                    print("Fingerprint store matches the graph")
+            finally:
+                driver.close()
+        print(json.dumps(store.counts(), indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
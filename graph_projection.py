@@ -0,0 +1,284 @@
+"""
+In-memory CSR projection of the Movies graph for recommendation queries
+
+Nodes of each label get dense integer IDs (their position in a sorted key
+array, so tmdb_id <-> dense ID lookups are a binary search, not a dict).
+Every relationship type is stored twice as CSR adjacency arrays, forward and
+reverse, with int32 column indices and an optional float32 weight, so memory
+is a fixed number of bytes per edge.
+
+Usage:
+    projection = load_projection(get_driver())
+    projection.save('data/projection.npz')
+    cast = projection.neighbors('ACTED_IN', 550, reverse=True)
+"""
+from array import array
+import time
+import numpy as np
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+# label -> key property
+NODE_KEYS = {
+    'Movie': 'tmdb_id',
+    'Person': 'tmdb_id',
+    'Genre': 'name',
+    'Studio': 'id',
+}
+
+# relationship type -> (source label, target label, weight expression or None)
+RELATIONSHIPS = {
+    'ACTED_IN': ('Person', 'Movie', 'coalesce(r.order, 999)'),
+    'DIRECTED': ('Person', 'Movie', None),
+    'IN_GENRE': ('Movie', 'Genre', 'CASE WHEN r.is_primary THEN 1.0 ELSE 0.0 END'),
+    'PRODUCED_BY': ('Movie', 'Studio', None),
+}
+
+
+class CSR:
+    """
+    Compressed sparse row adjacency: row i's neighbours are
+    indices[indptr[i]:indptr[i + 1]], with matching weights in data
+    """
+
+    __slots__ = ('indptr', 'indices', 'data')
+
+    def __init__(self, indptr, indices, data=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_edges(cls, rows, cols, n_rows, data=None):
+        """
+        Build a CSR from parallel row/column arrays of dense IDs
+
+        Args:
+            rows (np.ndarray): Source dense IDs
+            cols (np.ndarray): Target dense IDs
+            n_rows (int): Number of source nodes
+            data (np.ndarray): Optional per-edge weights
+
+        Returns:
+            CSR
+        """
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        indices = cols[order].astype(np.int32)
+        weights = data[order].astype(np.float32) if data is not None else None
+        return cls(indptr, indices, weights)
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def row_data(self, i):
+        return self.data[self.indptr[i]:self.indptr[i + 1]]
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + (self.data.nbytes if self.data is not None else 0)
+
+
+class GraphProjection:
+    """
+    Dense-ID node tables plus forward and reverse CSR per relationship type
+
+    Attributes:
+        keys (dict): label -> sorted np.ndarray of node keys (tmdb_id, name, id)
+        forward (dict): relationship type -> CSR from source to target label
+        reverse (dict): relationship type -> CSR from target to source label
+    """
+
+    def __init__(self, keys, forward, reverse):
+        self.keys = keys
+        self.forward = forward
+        self.reverse = reverse
+
+    def node_count(self, label):
+        return len(self.keys[label])
+
+    def to_dense(self, label, key):
+        """
+        Map a node key (or array of keys) to dense IDs
+
+        Returns:
+            int or np.ndarray: Dense ID(s), -1 where the key is unknown
+        """
+        table = self.keys[label]
+        scalar = np.ndim(key) == 0
+        keys = np.atleast_1d(np.asarray(key))
+        if table.dtype.kind == 'i':
+            keys = keys.astype(np.int64)
+        if len(table) == 0:
+            dense = np.full(len(keys), -1, dtype=np.int64)
+        else:
+            pos = np.minimum(np.searchsorted(table, keys), len(table) - 1)
+            dense = np.where(table[pos] == keys, pos, -1)
+        return int(dense[0]) if scalar else dense
+
+    def to_key(self, label, dense):
+        """Map dense ID(s) back to node keys"""
+        return self.keys[label][dense]
+
+    def neighbors(self, rel_type, key, reverse=False):
+        """
+        Keys of nodes connected to a node through one relationship type
+
+        Args:
+            rel_type (str): e.g. 'ACTED_IN'
+            key: Key of the node (tmdb_id, genre name or studio id)
+            reverse (bool): Follow the relationship backwards (e.g. the cast
+                of a movie is neighbors('ACTED_IN', movie_id, reverse=True))
+
+        Returns:
+            np.ndarray: Neighbour keys (empty if the node is unknown)
+        """
+        source, target, _ = RELATIONSHIPS[rel_type]
+        from_label, to_label = (target, source) if reverse else (source, target)
+        csr = self.reverse[rel_type] if reverse else self.forward[rel_type]
+        dense = self.to_dense(from_label, key)
+        if dense < 0:
+            return self.keys[to_label][:0]
+        return self.keys[to_label][csr.row(dense)]
+
+    def co_occurring_movies(self, movie_id, rel_type):
+        """
+        Movies sharing at least one neighbour with a movie through rel_type
+
+        For example rel_type='ACTED_IN' counts shared cast members and
+        'IN_GENRE' counts shared genres.
+
+        Args:
+            movie_id (int): tmdb_id of the seed movie
+            rel_type (str): Relationship type touching Movie
+
+        Returns:
+            tuple: (movie tmdb_ids, shared-neighbour counts), most shared first,
+            excluding the seed movie
+        """
+        source, target, _ = RELATIONSHIPS[rel_type]
+        movie_is_source = source == 'Movie'
+        to_entity = self.forward[rel_type] if movie_is_source else self.reverse[rel_type]
+        to_movie = self.reverse[rel_type] if movie_is_source else self.forward[rel_type]
+        dense = self.to_dense('Movie', movie_id)
+        if dense < 0:
+            empty = self.keys['Movie'][:0]
+            return empty, np.zeros(0, dtype=np.int64)
+        entities = to_entity.row(dense)
+        if len(entities) == 0:
+            empty = self.keys['Movie'][:0]
+            return empty, np.zeros(0, dtype=np.int64)
+        movies = np.concatenate([to_movie.row(e) for e in entities])
+        movies = movies[movies != dense]
+        unique, counts = np.unique(movies, return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return self.keys['Movie'][unique[order]], counts[order]
+
+    @property
+    def nbytes(self):
+        total = sum(keys.nbytes for keys in self.keys.values())
+        total += sum(csr.nbytes for csr in self.forward.values())
+        total += sum(csr.nbytes for csr in self.reverse.values())
+        return total
+
+    def save(self, path):
+        """Write the projection to a single .npz file"""
+        arrays = {}
+        for label, keys in self.keys.items():
+            arrays[f'keys/{label}'] = keys
+        for direction, table in (('forward', self.forward), ('reverse', self.reverse)):
+            for rel_type, csr in table.items():
+                arrays[f'{direction}/{rel_type}/indptr'] = csr.indptr
+                arrays[f'{direction}/{rel_type}/indices'] = csr.indices
+                if csr.data is not None:
+                    arrays[f'{direction}/{rel_type}/data'] = csr.data
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Read a projection written by save()"""
+        with np.load(path) as archive:
+            keys = {label: archive[f'keys/{label}'] for label in NODE_KEYS}
+            tables = {}
+            for direction in ('forward', 'reverse'):
+                tables[direction] = {}
+                for rel_type in RELATIONSHIPS:
+                    data_name = f'{direction}/{rel_type}/data'
+                    tables[direction][rel_type] = CSR(
+                        archive[f'{direction}/{rel_type}/indptr'],
+                        archive[f'{direction}/{rel_type}/indices'],
+                        archive[data_name] if data_name in archive.files else None,
+                    )
+        return cls(keys, tables['forward'], tables['reverse'])
+
+
+def _as_keys(buffer):
+    """Turn an array('q') of int keys or a list of string keys into a NumPy array"""
+    if isinstance(buffer, array):
+        return np.frombuffer(buffer, dtype=np.int64) if len(buffer) else np.zeros(0, dtype=np.int64)
+    return np.array(buffer, dtype=str)
+
+
+def _load_keys(session, label):
+    key = NODE_KEYS[label]
+    result = session.run(f"MATCH (n:{label}) WHERE n.{key} IS NOT NULL RETURN n.{key} AS key")
+    buffer = [] if key == 'name' else array('q')
+    for record in result:
+        buffer.append(record['key'])
+    return np.unique(_as_keys(buffer))
+
+
+def _load_edges(session, projection_keys, rel_type):
+    source, target, weight = RELATIONSHIPS[rel_type]
+    src_key, dst_key = NODE_KEYS[source], NODE_KEYS[target]
+    weight_expr = weight if weight else '1.0'
+    query = (f"MATCH (s:{source})-[r:{rel_type}]->(t:{target}) "
+             f"RETURN s.{src_key} AS src, t.{dst_key} AS dst, {weight_expr} AS w")
+    # Genre keys are strings, everything else is an int64 key
+    src_buffer = [] if src_key == 'name' else array('q')
+    dst_buffer = [] if dst_key == 'name' else array('q')
+    weights = array('f')
+    for record in session.run(query):
+        src_buffer.append(record['src'])
+        dst_buffer.append(record['dst'])
+        weights.append(record['w'])
+    src = projection_keys.to_dense(source, _as_keys(src_buffer))
+    dst = projection_keys.to_dense(target, _as_keys(dst_buffer))
+    valid = (src >= 0) & (dst >= 0)
+    data = np.array(weights, dtype=np.float32)[valid] if weight else None
+    src, dst = src[valid], dst[valid]
+    forward = CSR.from_edges(src, dst, projection_keys.node_count(source), data)
+    reverse = CSR.from_edges(dst, src, projection_keys.node_count(target), data)
+    return forward, reverse
+
+
+def load_projection(driver, fetch_size=10000):
+    """
+    Stream all nodes and relationships out of Neo4j into a GraphProjection
+
+    Records are pulled in batches of fetch_size and appended to typed arrays
+    (never one Python dict per node), then sorted into CSR form.
+
+    Args:
+        driver: Neo4j driver
+        fetch_size (int): Records per network fetch
+
+    Returns:
+        GraphProjection
+    """
+    start = time.monotonic()
+    with driver.session(fetch_size=fetch_size) as session:
+        keys = {label: _load_keys(session, label) for label in NODE_KEYS}
+        projection = GraphProjection(keys, {}, {})
+        for rel_type in RELATIONSHIPS:
+            projection.forward[rel_type], projection.reverse[rel_type] = _load_edges(session, projection, rel_type)
+    edges = sum(len(csr.indices) for csr in projection.forward.values())
+    logger.info("Loaded projection: %s nodes, %s edges, %.1f MB in %.1fs",
+                sum(len(k) for k in keys.values()), edges, projection.nbytes / 1e6, time.monotonic() - start)
+    return projection
@@ -0,0 +1,406 @@
+"""
+Transactional graph writes: each movie's subgraph commits or rolls back as a unit
+
+neo4j_client's writers use one auto-commit statement per entity type, so a
+crash can leave a movie half-written. Here a graph batch (see
+transform.empty_graph()) is written in two phases of managed transactions
+(session.execute_write, retried by the driver on transient errors such as
+deadlocks and leader switches):
+
+    1. nodes  - distinct Person, Studio and Genre rows, sorted by key and
+                cut into chunks. No two chunks share a node, so parallel
+                writers never wait on each other.
+    2. movies - one transaction per movie (or per movies_per_tx movies): the
+                Movie node plus every relationship of those movies.
+
+Inside a movie transaction, locks are always taken in the same global order:
+Movie nodes by tmdb_id, then people by tmdb_id, then studios by id, then
+genres by name. Transactions may wait on a shared actor but cannot deadlock.
+The hottest nodes (genres) come last, so their locks are held only until
+the commit that follows. Rows whose content was already written are skipped
+as in neo4j_client (see fingerprint.py).
+
+Usage:
+    from graph_writer import GraphWriter
+    GraphWriter(driver, workers=8).write(graph)
+
+    python -m ingest --count 10000 --transactional --write-workers 8
+"""
+import queue
+import threading
+import time
+from config import NEO4J_BATCH_SIZE
+from fingerprint import content_hash
+from logger import ROLLUP, setup_logger
+from metrics import counter, histogram
+from neo4j_client import (
+    GENRE_BATCH_QUERY,
+    IN_GENRE_BATCH_QUERY,
+    MOVIE_BATCH_QUERY,
+    NEO4J_WRITE_ROWS,
+    PERSON_BATCH_QUERY,
+    PRODUCED_BY_BATCH_QUERY,
+    STUDIO_BATCH_QUERY,
+    already_written,
+    genre_row,
+    movie_row,
+    notify_write,
+    person_row,
+    related_entities,
+    remember_written,
+    skip_unchanged_edges,
+    studio_row,
+)
+
+
+logger = setup_logger(__name__)
+
+# phase is 'nodes' or 'movies'
+NEO4J_TX_SECONDS = histogram('neo4j_tx_seconds', "Managed write transaction latency, retries included", ('phase',))
+NEO4J_TX_RETRIES = counter('neo4j_tx_retries_total', "Extra attempts of managed write transactions", ('phase',))
+NEO4J_TX_FAILED = counter('neo4j_tx_failed_total', "Managed write transactions that gave up", ('phase',))
+
+# ACTED_IN and DIRECTED of one (person, movie) pair in one row, so a
+# transaction visits each person once, in tmdb_id order
+PERSON_EDGES_QUERY = """
+UNWIND $rows AS row
+MATCH (p:Person {tmdb_id: row.person_id})
+MATCH (m:Movie {tmdb_id: row.movie_id})
+FOREACH (_ IN CASE WHEN row.directed THEN [1] ELSE [] END |
+    MERGE (p)-[:DIRECTED]->(m))
+FOREACH (role IN row.roles |
+    MERGE (p)-[r:ACTED_IN]->(m)
+    SET r.character = role.character, r.order = role.order)
+"""
+
+# graph key, label, key field, query, row builder, content_hash stored on the node
+_NODE_KINDS = (
+    ('people', 'Person', 'tmdb_id', PERSON_BATCH_QUERY, person_row, True),
+    ('studios', 'Studio', 'id', STUDIO_BATCH_QUERY, studio_row, False),
+    ('genres', 'Genre', 'name', GENRE_BATCH_QUERY, genre_row, False),
+)
+
+
+def _node_chunks(graph, chunk_size):
+    """
+    Distinct, key-sorted node rows that still need writing, in chunks
+
+    Returns:
+        tuple: (list of chunk dicts, dict label -> set of keys that failed validation)
+    """
+    chunks = []
+    for graph_key, label, key_field, query, build, hashed in _NODE_KINDS:
+        rows = {}
+        for item in graph[graph_key]:
+            row = build(item)
+            if row is not None:
+                rows[row[key_field]] = row  # last row wins, as in transform.dedupe_nodes()
+        ordered = [rows[key] for key in sorted(rows)]
+        hashes = [content_hash(row) for row in ordered]
+        skip = already_written(label, [(row[key_field], fingerprint) for row, fingerprint in zip(ordered, hashes)])
+        pending = []
+        for row, fingerprint, done in zip(ordered, hashes, skip):
+            if not done:
+                if hashed:
+                    row['content_hash'] = fingerprint
+                pending.append((row, fingerprint))
+        for start in range(0, len(pending), chunk_size):
+            part = pending[start:start + chunk_size]
+            chunks.append({
+                'label': label,
+                'query': query,
+                'rows': [row for row, _ in part],
+                'fingerprints': [(row[key_field], fingerprint) for row, fingerprint in part],
+            })
+    return chunks
+
+
+def _edges_by_movie(graph):
+    """Validated edge rows of each movie, keyed by movie tmdb_id"""
+    edges = {}
+
+    def entry(movie_id):
+        if movie_id not in edges:
+            edges[movie_id] = {'people': {}, 'studios': [], 'genres': []}
+        return edges[movie_id]
+
+    for person_id, movie_id, character, order in graph['acted_in']:
+        if not movie_id or not person_id:
+            logger.error("Cannot create ACTED_IN: missing Id (%s -> %s)", person_id, movie_id)
+            continue
+        row = entry(movie_id)['people'].setdefault(
+            person_id, {'person_id': person_id, 'movie_id': movie_id, 'directed': False, 'roles': []})
+        row['roles'].append({'character': character, 'order': order})
+    for person_id, movie_id in graph['directed']:
+        if not movie_id or not person_id:
+            logger.error("Cannot create DIRECTED: missing Id (%s -> %s)", person_id, movie_id)
+            continue
+        row = entry(movie_id)['people'].setdefault(
+            person_id, {'person_id': person_id, 'movie_id': movie_id, 'directed': False, 'roles': []})
+        row['directed'] = True
+    for studio_id, movie_id in graph['produced_by']:
+        if not movie_id or not studio_id:
+            logger.error("Cannot create PRODUCED_BY: missing Id (%s -> %s)", studio_id, movie_id)
+            continue
+        entry(movie_id)['studios'].append({'studio_id': studio_id, 'movie_id': movie_id})
+    for movie_id, genre_name, is_primary in graph['in_genre']:
+        if not movie_id or not genre_name:
+            logger.error("Cannot create IN_GENRE: missing Id (%s -> %s)", movie_id, genre_name)
+            continue
+        entry(movie_id)['genres'].append({'movie_id': movie_id, 'genre_name': genre_name, 'is_primary': is_primary})
+    return edges
+
+
+def _movie_groups(graph, movies_per_tx):
+    """
+    Split the movies of a graph batch into transactions
+
+    Returns:
+        tuple: (list of group dicts, dict of movie tmdb_id -> skip reason or
+        None, list of (movie tmdb_id, hash) for the Movie nodes being written,
+        list of (movie tmdb_id, edge hash) for the edge sets being written)
+    """
+    rows = {}
+    for movie in graph['movies']:
+        row = movie_row(movie)
+        if row is not None:
+            rows[row['tmdb_id']] = row
+    edges = _edges_by_movie(graph)
+    edge_hashes, edges_skipped = skip_unchanged_edges(graph)
+
+    movie_ids = list(rows) + [movie_id for movie_id in edges if movie_id not in rows]
+    hashes = {movie_id: content_hash(row) for movie_id, row in rows.items()}
+    node_items = [(movie_id, hashes[movie_id]) for movie_id in rows]
+    node_skipped = {movie_id for (movie_id, _), done in zip(node_items, already_written('Movie', node_items)) if done}
+
+    pending = []
+    skipped = {}
+    for movie_id in movie_ids:
+        write_node = movie_id in rows and movie_id not in node_skipped
+        write_edges = movie_id in edges and movie_id not in edges_skipped
+        if write_node or write_edges:
+            pending.append((movie_id, write_node, write_edges))
+        else:
+            skipped[movie_id] = edges_skipped.get(movie_id) or 'unchanged'
+
+    groups = []
+    for start in range(0, len(pending), movies_per_tx):
+        part = pending[start:start + movies_per_tx]
+        group = {'movie_ids': [movie_id for movie_id, _, _ in part], 'movies': [], 'people': [],
+                 'studios': [], 'genres': []}
+        for movie_id, write_node, write_edges in part:
+            if write_node:
+                group['movies'].append(dict(rows[movie_id], content_hash=hashes[movie_id]))
+            if write_edges:
+                group['people'].extend(edges[movie_id]['people'].values())
+                group['studios'].extend(edges[movie_id]['studios'])
+                group['genres'].extend(edges[movie_id]['genres'])
+        # The global lock order (see module docstring)
+        group['movies'].sort(key=lambda row: row['tmdb_id'])
+        group['people'].sort(key=lambda row: (row['person_id'], row['movie_id']))
+        group['studios'].sort(key=lambda row: (row['studio_id'], row['movie_id']))
+        group['genres'].sort(key=lambda row: (row['genre_name'], row['movie_id']))
+        groups.append(group)
+
+    written_nodes = [(movie_id, hashes[movie_id]) for movie_id in rows if movie_id not in node_skipped]
+    written_edges = [(movie_id, fingerprint) for movie_id, fingerprint in edge_hashes if movie_id not in edges_skipped]
+    return groups, skipped, written_nodes, written_edges
+
+
+def _write_nodes_tx(tx, chunk):
+    tx.run(chunk['query'], {'rows': chunk['rows']}).consume()
+
+
+def _write_movies_tx(tx, group):
+    for key, query in (('movies', MOVIE_BATCH_QUERY), ('people', PERSON_EDGES_QUERY),
+                       ('studios', PRODUCED_BY_BATCH_QUERY), ('genres', IN_GENRE_BATCH_QUERY)):
+        if group[key]:
+            tx.run(query, {'rows': group[key]}).consume()
+
+
+def _commit(session, phase, work, task):
+    """
+    Run work(tx, task) in one managed transaction
+
+    Returns:
+        bool: True if it committed
+    """
+    attempts = 0
+
+    def counted(tx, task):
+        nonlocal attempts
+        attempts += 1
+        return work(tx, task)
+
+    start = time.perf_counter()
+    try:
+        session.execute_write(counted, task)
+        ok = True
+    except Exception as e:
+        logger.error("Write transaction (%s) failed after %d attempts: %s", phase, attempts, e)
+        NEO4J_TX_FAILED.inc(phase=phase)
+        ok = False
+    NEO4J_TX_SECONDS.observe(time.perf_counter() - start, phase=phase)
+    if attempts > 1:
+        NEO4J_TX_RETRIES.inc(attempts - 1, phase=phase)
+    return ok
+
+
+def _commit_nodes(session, chunk):
+    ok = _commit(session, 'nodes', _write_nodes_tx, chunk)
+    if ok:
+        NEO4J_WRITE_ROWS.inc(len(chunk['rows']), query=chunk['label'])
+        remember_written(chunk['label'], chunk['fingerprints'])
+        logger.info("Committed %d %s nodes in one transaction", len(chunk['rows']), chunk['label'], extra=ROLLUP)
+    return ok
+
+
+def _commit_movies(session, group):
+    ok = _commit(session, 'movies', _write_movies_tx, group)
+    if ok:
+        NEO4J_WRITE_ROWS.inc(len(group['movies']), query='Movie')
+        NEO4J_WRITE_ROWS.inc(len(group['people']), query='Person edges')
+        NEO4J_WRITE_ROWS.inc(len(group['studios']), query='PRODUCED_BY')
+        NEO4J_WRITE_ROWS.inc(len(group['genres']), query='IN_GENRE')
+        logger.info("Committed %d movies in one transaction", len(group['movie_ids']), extra=ROLLUP)
+    return ok
+
+
+class _Plan:
+    """Transactions for one graph batch and the bookkeeping to report on them"""
+
+    def __init__(self, graph, movies_per_tx, chunk_size):
+        if movies_per_tx < 1 or chunk_size < 1:
+            raise ValueError("movies_per_tx and chunk_size must be at least 1")
+        self.graph = graph
+        self.node_chunks = _node_chunks(graph, chunk_size)
+        self.groups, self.skipped, self.movie_hashes, self.edge_hashes = _movie_groups(graph, movies_per_tx)
+        self.related = related_entities(graph)
+
+    def results(self, nodes_ok, groups_ok):
+        """
+        Record fingerprints and notify listeners for what committed
+
+        Returns:
+            dict: Per-row results in the write_graph_batch() layout
+        """
+        failed_nodes = {(chunk['label'], key) for chunk, ok in zip(self.node_chunks, nodes_ok) if not ok
+                        for key, _ in chunk['fingerprints']}
+        committed = set(self.skipped)
+        for group, ok in zip(self.groups, groups_ok):
+            if ok:
+                committed.update(group['movie_ids'])
+
+        graph = self.graph
+        people_ok = [bool(person.get('tmdb_id')) and ('Person', person['tmdb_id']) not in failed_nodes
+                     for person in graph['people']]
+        studios_ok = [bool(studio.get('id')) and ('Studio', studio['id']) not in failed_nodes
+                      for studio in graph['studios']]
+        genres_ok = [bool(genre.get('name')) and ('Genre', genre['name']) not in failed_nodes
+                     for genre in graph['genres']]
+        # A relationship to a node that failed to write matches nothing, so its movie failed too
+        broken = {movie_id for person_id, movie_id, *_ in graph['acted_in'] if ('Person', person_id) in failed_nodes}
+        broken |= {movie_id for person_id, movie_id in graph['directed'] if ('Person', person_id) in failed_nodes}
+        broken |= {movie_id for studio_id, movie_id in graph['produced_by'] if ('Studio', studio_id) in failed_nodes}
+        broken |= {movie_id for movie_id, name, _ in graph['in_genre'] if ('Genre', name) in failed_nodes}
+        done = committed - broken
+
+        remember_written('Movie', [(movie_id, value) for movie_id, value in self.movie_hashes if movie_id in done])
+        remember_written('movie_edges', [(movie_id, value) for movie_id, value in self.edge_hashes if movie_id in done])
+        touched = {('movie', movie_id) for movie_id in done if movie_id not in self.skipped}
+        # A new rating can reorder genre/cast/director results the movie isn't in yet
+        for movie_id, _ in self.movie_hashes:
+            if movie_id in done:
+                touched.update(self.related.get(movie_id, ()))
+        for group, ok in zip(self.groups, groups_ok):
+            if ok:
+                touched.update(('person', row['person_id']) for row in group['people'] if row['movie_id'] in done)
+                touched.update(('studio', row['studio_id']) for row in group['studios'] if row['movie_id'] in done)
+                touched.update(('genre', row['genre_name']) for row in group['genres'] if row['movie_id'] in done)
+        if touched:
+            notify_write(touched)
+
+        return {
+            'movies': [movie.get('tmdb_id') in done for movie in graph['movies']],
+            'people': people_ok,
+            'genres': genres_ok,
+            'studios': studios_ok,
+            'acted_in': [bool(edge[0]) and edge[1] in done for edge in graph['acted_in']],
+            'directed': [bool(edge[0]) and edge[1] in done for edge in graph['directed']],
+            'in_genre': [bool(edge[1]) and edge[0] in done for edge in graph['in_genre']],
+            'produced_by': [bool(edge[0]) and edge[1] in done for edge in graph['produced_by']],
+        }
+
+
+def write_graph_transactional(session, graph, movies_per_tx=1, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Drop-in replacement for write_graph_batch() using managed transactions
+
+    Args:
+        session: Active Neo4j session
+        graph (dict): Graph batch with node and edge lists
+        movies_per_tx (int): Movies committed together per transaction
+        chunk_size (int): Maximum node rows per node transaction
+
+    Returns:
+        dict: Per-row results for each key of the graph batch; a movie and
+        its edges count as written only if its whole subgraph committed
+    """
+    plan = _Plan(graph, movies_per_tx, chunk_size)
+    nodes_ok = [_commit_nodes(session, chunk) for chunk in plan.node_chunks]
+    groups_ok = [_commit_movies(session, group) for group in plan.groups]
+    return plan.results(nodes_ok, groups_ok)
+
+
+class GraphWriter:
+    """
+    Pool of writers, one session each, committing a graph batch in parallel
+
+    Args:
+        driver: Neo4j driver
+        workers (int): Parallel sessions
+        movies_per_tx (int): Movies committed together per transaction
+        chunk_size (int): Maximum node rows per node transaction
+    """
+
+    def __init__(self, driver, workers=4, movies_per_tx=1, chunk_size=NEO4J_BATCH_SIZE):
+        self.driver = driver
+        self.workers = workers
+        self.movies_per_tx = movies_per_tx
+        self.chunk_size = chunk_size
+
+    def write(self, graph):
+        """
+        Write a graph batch: all node chunks, then all movie transactions
+
+        Returns:
+            dict: Per-row results, as write_graph_transactional()
+        """
+        plan = _Plan(graph, self.movies_per_tx, self.chunk_size)
+        nodes_ok = self._run(plan.node_chunks, _commit_nodes)
+        groups_ok = self._run(plan.groups, _commit_movies)
+        return plan.results(nodes_ok, groups_ok)
+
+    def _run(self, tasks, commit):
+        """Hand tasks to the worker sessions; returns one bool per task"""
+        work = queue.SimpleQueue()
+        for i, task in enumerate(tasks):
+            work.put((i, task))
+        results = [False] * len(tasks)
+
+        def worker():
+            with self.driver.session() as session:
+                while True:
+                    try:
+                        i, task = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    results[i] = commit(session, task)
+
+        threads = [threading.Thread(target=worker, name=f'graph-writer-{n}')
+                   for n in range(min(self.workers, len(tasks)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
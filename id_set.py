@@ -0,0 +1,45 @@
+class IdBitmap:
+    """
+    Compact set of non-negative integer IDs backed by a growable bitmap
+
+    TMDB IDs are dense-ish integers below a few million, so one bit per
+    possible ID (about 125 KB per million) is far smaller than a Python set
+    of ints (about 60 bytes per member).
+    """
+
+    def __init__(self, capacity=1 << 20):
+        self._bits = bytearray((capacity + 7) // 8)
+        self._count = 0
+
+    def add(self, item_id):
+        """
+        Add an ID
+
+        Returns:
+            bool: True if the ID was not already present
+        """
+        if item_id < 0:
+            raise ValueError("IdBitmap only holds non-negative IDs")
+        byte, bit = divmod(item_id, 8)
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(max(byte + 1, len(self._bits) * 2) - len(self._bits)))
+        mask = 1 << bit
+        if self._bits[byte] & mask:
+            return False
+        self._bits[byte] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, item_id):
+        byte, bit = divmod(item_id, 8)
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << bit))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for byte_index, value in enumerate(self._bits):
+            if value:
+                for bit in range(8):
+                    if value & (1 << bit):
+                        yield byte_index * 8 + bit
@@ -0,0 +1,145 @@
+"""
+Incremental refresh driven by TMDB's /movie/changes feed
+
+Only movies that changed since the last checkpoint are refetched and
+upserted; everything else costs no HTTP calls and no graph writes.
+
+Usage:
+    python -m incremental_sync                 # since the stored checkpoint
+    python -m incremental_sync --since 2026-01-01 --include-new
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+from ingest import IngestPipeline, print_summary
+from logger import setup_logger
+from neo4j_client import get_driver, get_existing_movie_ids
+from tmdb_client import iter_changed_movie_ids
+from tmdb_http import get_client
+
+
+logger = setup_logger(__name__)
+
+CHECKPOINT_PATH = 'data/sync_checkpoint.json'
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """
+    Returns:
+        datetime.date: Day the last successful sync ran, or None if never
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return date.fromisoformat(json.load(f)['last_sync'])
+
+
+def save_checkpoint(day, path=CHECKPOINT_PATH):
+    """Atomically record the day of a successful sync"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_sync': day.isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+def collect_changed_ids(start_date, end_date, driver, include_new=False, lookup_chunk=1000):
+    """
+    List changed movie IDs worth refreshing
+
+    Args:
+        start_date (datetime.date): First day of the change window
+        end_date (datetime.date): Last day of the change window
+        driver: Neo4j driver
+        include_new (bool): Also return changed movies not yet in the graph
+        lookup_chunk (int): IDs per existence query
+
+    Returns:
+        list: Deduplicated movie IDs, sorted
+    """
+    changed = sorted(set(iter_changed_movie_ids(start_date, end_date)))
+    logger.info("TMDB reports %s changed movies between %s and %s", len(changed), start_date, end_date)
+    if include_new:
+        return changed
+    known = set()
+    with driver.session() as session:
+        for start in range(0, len(changed), lookup_chunk):
+            known |= get_existing_movie_ids(session, changed[start:start + lookup_chunk])
+    logger.info("%s of the changed movies are already in the graph", len(known))
+    return [movie_id for movie_id in changed if movie_id in known]
+
+
+def run_incremental_sync(driver, since=None, include_new=False, checkpoint_path=CHECKPOINT_PATH, **pipeline_options):
+    """
+    Refresh movies changed since the last checkpoint and advance it
+
+    The checkpoint only moves forward when every changed movie was fetched
+    and written, so failures are retried by the next run.
+
+    Args:
+        driver: Neo4j driver
+        since (datetime.date): Override the stored checkpoint
+        include_new (bool): Ingest changed movies that aren't in the graph yet
+        checkpoint_path (str): Where the checkpoint is stored
+        **pipeline_options: Passed to IngestPipeline (worker counts, ...)
+
+    Returns:
+        dict: Pipeline summary plus the change window and ID count
+    """
+    today = date.today()
+    start_date = since or load_checkpoint(checkpoint_path) or today - timedelta(days=1)
+    movie_ids = collect_changed_ids(start_date, today, driver, include_new)
+    summary = {'start_date': start_date.isoformat(), 'end_date': today.isoformat(), 'changed': len(movie_ids)}
+    if not movie_ids:
+        logger.info("No changed movies to refresh")
+        save_checkpoint(today, checkpoint_path)
+        return summary
+
+    # The response cache would otherwise serve the pre-change payloads
+    cache = get_client().cache
+    if cache is not None:
+        for movie_id in movie_ids:
+            cache.invalidate(f"/movie/{movie_id}")
+            cache.invalidate(f"/movie/{movie_id}/credits")
+
+    summary.update(IngestPipeline(movie_ids, driver, **pipeline_options).run())
+    if summary['fetch_failed'] or summary['transform_failed'] or summary['write_failed']:
+        logger.warning("Some movies failed; keeping the old checkpoint so they are retried")
+    else:
+        save_checkpoint(today, checkpoint_path)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh movies changed on TMDB since the last sync")
+    parser.add_argument('--since', type=date.fromisoformat, help="start date (YYYY-MM-DD), overrides the checkpoint")
+    parser.add_argument('--include-new', action='store_true', help="also ingest changed movies not yet in the graph")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--write-workers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    driver = get_driver()
+    try:
+        summary = run_incremental_sync(
+            driver,
+            since=args.since,
+            include_new=args.include_new,
+            checkpoint_path=args.checkpoint,
+            fetch_workers=args.fetch_workers,
+            write_workers=args.write_workers,
+            batch_size=args.batch_size,
+        )
+    finally:
+        driver.close()
+    print_summary(summary)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Streaming TMDB -> Neo4j ingest pipeline
+
+Stages run in their own worker threads and are connected by bounded queues,
+so memory stays flat however many movies are ingested:
+
+    discovery -> fetch (K workers) -> transform -> batched graph write (W workers)
+
+Queue depths, per-stage timings and event counts are exported through
+metrics.py; --metrics-port serves them live, --metrics-file rewrites a
+Prometheus text file while the run is going, and --metrics-json writes an
+end-of-run summary.
+
+Rows whose content was already written, earlier in the run or by a previous
+run, are not sent to Neo4j (see fingerprint.py); the summary reports them as
+skipped_writes. The store is cleared at startup if the graph was wiped or
+restored since (fingerprint.verify_against_graph()); --rewrite-all always
+forgets it first.
+
+--transactional writes each movie with its relationships in one managed,
+retried transaction instead of one auto-commit statement per entity type,
+so a failure never leaves a movie half-written (see graph_writer.py).
+
+Usage:
+    python -m ingest --count 1000 --fetch-workers 8 --write-workers 2
+    python -m ingest --count 100000 --metrics-port 9108 --metrics-json data/ingest_metrics.json
+    python -m ingest --count 10000 --transactional --movies-per-tx 5 --write-workers 8
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from config import NEO4J_BATCH_SIZE
+from logger import log_failed_movie, setup_logger
+from metrics import counter, gauge, histogram, start_http_server, summary as metrics_summary, write_prometheus
+from fingerprint import get_fingerprints, verify_against_graph
+from graph_writer import write_graph_transactional
+from neo4j_client import create_genre_nodes_batch, get_driver, skipped_write_count, write_graph_batch
+from schema import check_schema, ensure_schema
+from tmdb_client import fetch_genres, fetch_movie_credits, fetch_movie_details, fetch_movie_full, iter_popular_movie_ids
+from tmdb_export_ids import iter_export_ids
+from transform import build_movie_graph, dedupe_nodes, empty_graph, merge_graphs
+from work_state import get_store
+
+
+logger = setup_logger(__name__)
+
+_DONE = object()  # end-of-stream marker, one per downstream worker
+
+INGEST_QUEUE_DEPTH = gauge('ingest_queue_depth', "Items waiting in each inter-stage queue", ('queue',))
+INGEST_STAGE_SECONDS = histogram('ingest_stage_seconds', "Work time per item (per batch for write)", ('stage',))
+INGEST_EVENTS = counter('ingest_events_total', "Pipeline events, same names as the run summary", ('event',))
+
+
+def fetch_movie_split(movie_id, max_cast=10):
+    """
+    Fetch a movie with the two-request path (details + credits)
+
+    Returns:
+        dict: Same shape as fetch_movie_full(), or None if either call failed
+    """
+    movie = fetch_movie_details(movie_id)
+    if movie is None:
+        return None
+    movie_credits = fetch_movie_credits(movie_id, max_cast)
+    if movie_credits is None:
+        return None
+    movie.update(movie_credits)
+    return movie
+
+
+class IngestPipeline:
+    """
+    Discovery, fetch, transform and write stages connected by bounded queues
+
+    Args:
+        movie_ids: Iterable of TMDB movie IDs to ingest (consumed lazily)
+        driver: Neo4j driver; each write worker opens its own session
+        fetch_workers (int): Threads calling TMDB
+        transform_workers (int): Threads building graph batches
+        write_workers (int): Threads writing to Neo4j
+        queue_size (int): Capacity of each inter-stage queue
+        batch_size (int): Movies per graph write
+        max_cast (int): Cast members kept per movie
+        fetch (callable): fetch(movie_id, max_cast) -> movie dict or None
+        state (WorkStateStore): Where per-movie progress is recorded, so an
+            interrupted run can be resumed (None records only failures, in
+            the default store via log_failed_movie)
+        bootstrap_schema (bool): Run ensure_schema() before ingesting
+        verify_plans (bool): Also run check_schema() and abort on label scans
+        metrics_interval (float): Seconds between queue-depth samples
+        metrics_file (str): Rewrite this Prometheus text file at every sample
+        transactional (bool): Write through graph_writer, one managed
+            transaction per movies_per_tx movies
+        movies_per_tx (int): Movies per transaction when transactional
+    """
+
+    def __init__(self, movie_ids, driver, fetch_workers=4, transform_workers=1, write_workers=2,
+                 queue_size=1000, batch_size=50, max_cast=10, fetch=fetch_movie_full,
+                 chunk_size=NEO4J_BATCH_SIZE, flush_interval=2.0, state=None,
+                 bootstrap_schema=True, verify_plans=False, metrics_interval=1.0, metrics_file=None,
+                 transactional=False, movies_per_tx=1):
+        self.movie_ids = movie_ids
+        self.driver = driver
+        self.workers = {
+            'fetch': fetch_workers,
+            'transform': transform_workers,
+            'write': write_workers,
+        }
+        self.batch_size = batch_size
+        self.max_cast = max_cast
+        self.fetch = fetch
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.state = state
+        self.bootstrap_schema = bootstrap_schema
+        self.verify_plans = verify_plans
+        self.metrics_interval = metrics_interval
+        self.metrics_file = metrics_file
+        self.transactional = transactional
+        self.movies_per_tx = movies_per_tx
+        self.id_queue = queue.Queue(maxsize=queue_size)
+        self.movie_queue = queue.Queue(maxsize=queue_size)
+        self.graph_queue = queue.Queue(maxsize=queue_size)
+        self.genre_names = {}
+        self.stats = {
+            'discovered': 0,
+            'fetched': 0,
+            'fetch_failed': 0,
+            'transformed': 0,
+            'transform_failed': 0,
+            'written': 0,
+            'write_failed': 0,
+            'write_batches': 0,
+        }
+        self._remaining = dict(self.workers)
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+        INGEST_EVENTS.inc(amount, event=key)
+
+    def _sample_queues(self):
+        for name, q in (('ids', self.id_queue), ('movies', self.movie_queue), ('graphs', self.graph_queue)):
+            INGEST_QUEUE_DEPTH.set(q.qsize(), queue=name)
+        if self.metrics_file:
+            write_prometheus(self.metrics_file)
+
+    def _sampler(self, stop):
+        while not stop.wait(self.metrics_interval):
+            self._sample_queues()
+
+    def _finish(self, stage, outbox, downstream):
+        """Mark one worker of a stage done; the last one closes the next queue"""
+        with self._lock:
+            self._remaining[stage] -= 1
+            last = self._remaining[stage] == 0
+        if last and outbox is not None:
+            for _ in range(self.workers[downstream]):
+                outbox.put(_DONE)
+
+    def _fail(self, movie_id, error_message):
+        if self.state is not None:
+            self.state.mark_failed(movie_id, error_message)
+        else:
+            log_failed_movie(movie_id, error_message)
+
+    def _discover(self):
+        try:
+            for movie_id in self.movie_ids:
+                if self.state is not None:
+                    self.state.mark_pending([movie_id])
+                self.id_queue.put(movie_id)
+                self._count('discovered')
+        except Exception as e:
+            logger.error("Movie ID discovery stopped early: %s", e)
+        finally:
+            for _ in range(self.workers['fetch']):
+                self.id_queue.put(_DONE)
+
+    def _fetch_worker(self):
+        while True:
+            movie_id = self.id_queue.get()
+            if movie_id is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                movie = self.fetch(movie_id, self.max_cast)
+            except Exception as e:
+                logger.error("Unexpected error fetching movie %s: %s", movie_id, e)
+                movie = None
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage='fetch')
+            if movie is None:
+                self._count('fetch_failed')
+                self._fail(movie_id, "fetch failed")
+                continue
+            self._count('fetched')
+            if self.state is not None:
+                self.state.mark_fetched([movie_id])
+            self.movie_queue.put(movie)
+        self._finish('fetch', self.movie_queue, 'transform')
+
+    def _transform_worker(self):
+        while True:
+            movie = self.movie_queue.get()
+            if movie is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                graph = build_movie_graph(movie, self.genre_names)
+                INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage='transform')
+            except Exception as e:
+                logger.error("Failed to transform movie %s: %s", movie.get('tmdb_id'), e)
+                self._count('transform_failed')
+                self._fail(movie.get('tmdb_id'), f"transform failed: {e}")
+                continue
+            self._count('transformed')
+            self.graph_queue.put(graph)
+        self._finish('transform', self.graph_queue, 'write')
+
+    def _write_worker(self):
+        with self.driver.session() as session:
+            batch = empty_graph()
+            pending = 0
+            done = False
+            while not done:
+                try:
+                    graph = self.graph_queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    graph = None
+                if graph is _DONE:
+                    done = True
+                elif graph is not None:
+                    merge_graphs(batch, graph)
+                    pending += 1
+                # Flush on a full batch, at end of stream, or when the queue
+                # has gone idle so a slow fetch stage doesn't stall writes
+                if pending and (pending >= self.batch_size or done or graph is None):
+                    try:
+                        self._write_batch(session, batch)
+                    except Exception as e:
+                        # Keep draining graph_queue, or the transform stage blocks on a full queue
+                        logger.error("Failed to write a batch of %s movies: %s", pending, e)
+                        for movie in batch['movies']:
+                            self._count('write_failed')
+                            self._fail(movie['tmdb_id'], f"graph write failed: {e}")
+                    batch = empty_graph()
+                    pending = 0
+        self._finish('write', None, None)
+
+    def _write_batch(self, session, batch):
+        start = time.perf_counter()
+        if self.transactional:
+            results = write_graph_transactional(session, dedupe_nodes(batch), self.movies_per_tx, self.chunk_size)
+        else:
+            results = write_graph_batch(session, dedupe_nodes(batch), self.chunk_size)
+        INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage='write')
+        self._count('write_batches')
+        written = []
+        for movie, ok in zip(batch['movies'], results['movies']):
+            if ok:
+                written.append(movie['tmdb_id'])
+            else:
+                self._count('write_failed')
+                self._fail(movie['tmdb_id'], "graph write failed")
+        self._count('written', len(written))
+        if self.state is not None and written:
+            self.state.mark_written(written)
+
+    def run(self):
+        """
+        Run every stage to completion
+
+        Returns:
+            dict: Stage counters, skipped writes, elapsed seconds and movies/second
+        """
+        start = time.monotonic()
+        skipped_before = skipped_write_count()
+        if self.bootstrap_schema:
+            ensure_schema(self.driver)
+        if self.verify_plans:
+            check_schema(self.driver)
+        if get_fingerprints() is not None:
+            verify_against_graph(self.driver, get_fingerprints())
+        self.genre_names = fetch_genres()
+        with self.driver.session() as session:
+            create_genre_nodes_batch(session, [{'name': name} for name in self.genre_names.values()])
+
+        threads = [threading.Thread(target=self._discover, name='discover')]
+        for stage, target in (('fetch', self._fetch_worker),
+                              ('transform', self._transform_worker),
+                              ('write', self._write_worker)):
+            for i in range(self.workers[stage]):
+                threads.append(threading.Thread(target=target, name=f'{stage}-{i}'))
+        stop_sampler = threading.Event()
+        sampler = threading.Thread(target=self._sampler, args=(stop_sampler,), name='metrics', daemon=True)
+        sampler.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stop_sampler.set()
+        sampler.join()
+        self._sample_queues()
+
+        elapsed = time.monotonic() - start
+        summary = dict(self.stats)
+        summary['skipped_writes'] = skipped_write_count() - skipped_before
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['movies_per_second'] = round(self.stats['written'] / elapsed, 3) if elapsed else 0.0
+        return summary
+
+
+def print_summary(summary):
+    print("\n=== Ingest summary ===")
+    for key, value in summary.items():
+        print(f"{key:>20}: {value}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest TMDB movies into Neo4j")
+    parser.add_argument('--count', type=int,
+                        help="number of movies to ingest (default: 100 popular movies, or every ID in --id-file)")
+    parser.add_argument('--id-file', help="read IDs from a TMDB daily export (.json.gz) instead of /movie/popular")
+    parser.add_argument('--min-popularity', type=float, default=0.0, help="popularity floor for --id-file")
+    parser.add_argument('--include-adult', action='store_true', help="keep adult titles from --id-file")
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--transform-workers', type=int, default=1)
+    parser.add_argument('--write-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=1000, help="capacity of each inter-stage queue")
+    parser.add_argument('--batch-size', type=int, default=50, help="movies per graph write")
+    parser.add_argument('--max-cast', type=int, default=10)
+    parser.add_argument('--split-fetch', action='store_true',
+                        help="fetch details and credits with two requests instead of append_to_response")
+    parser.add_argument('--check-schema', action='store_true',
+                        help="EXPLAIN every write query at startup and abort if any uses a label scan")
+    parser.add_argument('--resume', action='store_true',
+                        help="ingest movies a previous run discovered but never wrote, instead of discovering new ones")
+    parser.add_argument('--rewrite-all', action='store_true',
+                        help="forget stored fingerprints and write every row, even if unchanged")
+    parser.add_argument('--transactional', action='store_true',
+                        help="write each movie and its relationships in one managed, retried transaction")
+    parser.add_argument('--movies-per-tx', type=int, default=1, help="movies per transaction with --transactional")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port during the run")
+    parser.add_argument('--metrics-file', help="keep a Prometheus text file of the metrics up to date")
+    parser.add_argument('--metrics-json', help="write an end-of-run JSON summary of the run and its metrics")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    state = get_store()
+    if args.resume:
+        movie_ids = state.unfinished_ids()
+        logger.info("Resuming %s unfinished movies", len(movie_ids))
+    elif args.id_file:
+        movie_ids = iter_export_ids(args.id_file, args.min_popularity, args.include_adult, limit=args.count)
+    else:
+        movie_ids = iter_popular_movie_ids(args.count if args.count is not None else 100)
+    if args.rewrite_all and get_fingerprints() is not None:
+        get_fingerprints().clear()
+    server = start_http_server(args.metrics_port) if args.metrics_port else None
+    driver = get_driver()
+    try:
+        pipeline = IngestPipeline(
+            movie_ids,
+            driver,
+            fetch_workers=args.fetch_workers,
+            transform_workers=args.transform_workers,
+            write_workers=args.write_workers,
+            queue_size=args.queue_size,
+            batch_size=args.batch_size,
+            max_cast=args.max_cast,
+            fetch=fetch_movie_split if args.split_fetch else fetch_movie_full,
+            state=state,
+            verify_plans=args.check_schema,
+            metrics_file=args.metrics_file,
+            transactional=args.transactional,
+            movies_per_tx=args.movies_per_tx,
+        )
+        summary = pipeline.run()
+    finally:
+        driver.close()
+        if server is not None:
+            server.shutdown()
+    print_summary(summary)
+    if args.metrics_json:
+        os.makedirs(os.path.dirname(args.metrics_json) or '.', exist_ok=True)
+        with open(args.metrics_json, 'w') as f:
+            json.dump({'summary': summary, 'metrics': metrics_summary()}, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,125 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import threading
+import time
+from config import LOG_ASYNC, LOG_FORMAT, LOG_LEVEL, LOG_ROLLUP_INTERVAL, LOG_ROLLUP_SAMPLE
 
-def setup_logger(name='Flexgraph-Movie'):
+# Pass as extra= on repetitive per-entity lines so they can be rolled up
+ROLLUP = {'rollup': True}
+
+# Attributes every LogRecord has; anything else came from extra= and goes into JSON output
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, thread, message, plus any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'rollup':
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
     """
-    Set up logger with console and file handlers
+    QueueHandler that leaves formatting to the listener thread
 
-    Args:
-        name: Logger name (use __name__ from calling module)
-    
-    Returns:
-        logging.logger: Configured logger
+    The stdlib version formats every record before enqueueing it, which is
+    the work we want off the calling thread. Only tracebacks are rendered
+    here, since the exception objects may not outlive the call.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    if logger.handlers:
-        return logger
-    formatter=logging.Formatter(
-        '[%(asctime)s] %(levelname)s - %(message)s',datefmt='%Y-%m-%d %H:%M:%S'
-        )
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RollupFilter(logging.Filter):
+    """
+    Sample and aggregate records logged with extra=ROLLUP
+
+    Within each interval the first `sample` records per (logger, message
+    template) pass through; the rest are counted and reported as one
+    "rolled up" line per template when the interval ends. Other records are
+    never touched.
+    """
+
+    def __init__(self, interval, sample=1):
+        super().__init__()
+        self.interval = interval
+        self.sample = sample
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log-rollup', daemon=True)
+        self._thread.start()
+
+    def filter(self, record):
+        if not getattr(record, 'rollup', False):
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen, suppressed = self._counts.get(key, (0, 0))
+            if seen < self.sample:
+                self._counts[key] = (seen + 1, suppressed)
+                return True
+            self._counts[key] = (seen, suppressed + 1)
+            return False
+
+    def flush(self):
+        """Emit one rollup line per template with suppressed records, then start a new interval"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        for (name, template), (seen, suppressed) in counts.items():
+            if suppressed:
+                logging.getLogger(name).info(
+                    "Rolled up %d more '%s' lines in the last %.0fs", suppressed, template, self.interval,
+                    extra={'rollup_count': suppressed + seen, 'rollup_template': template},
+                )
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+_level = getattr(logging, LOG_LEVEL.upper(), logging.DEBUG)
+_shared_lock = threading.Lock()
+_queue_handler = None
+_rollup_filter = None
+
+
+def _formatter():
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def _build_handlers():
+    formatter = _formatter()
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(max(logging.INFO, _level))
     console_handler.setFormatter(formatter)
     os.makedirs('logs', exist_ok=True)  # Create logs folder if it doesn't exist
     file_handler = RotatingFileHandler(
@@ -28,22 +127,76 @@ def setup_logger(name='Flexgraph-Movie'):
         maxBytes=5*1024*1024,   #5MB
         backupCount=3 #keep 3 old log files
     )
-    file_handler.setLevel(logging.DEBUG)
+    file_handler.setLevel(_level)
     file_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    
+    return [console_handler, file_handler]
+
+
+def _shared_queue_handler():
+    """One queue and listener thread for the whole process, flushed at exit"""
+    global _queue_handler
+    with _shared_lock:
+        if _queue_handler is None:
+            records = queue.SimpleQueue()
+            listener = QueueListener(records, *_build_handlers(), respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            _queue_handler = _LazyQueueHandler(records)
+        return _queue_handler
+
+
+def _shared_rollup_filter():
+    global _rollup_filter
+    with _shared_lock:
+        if _rollup_filter is None:
+            _rollup_filter = RollupFilter(LOG_ROLLUP_INTERVAL, LOG_ROLLUP_SAMPLE)
+            # atexit runs in reverse order: this flush happens before the queue listener stops
+            atexit.register(_rollup_filter.close)
+        return _rollup_filter
+
+
+def setup_logger(name='Flexgraph-Movie'):
+    """
+    Set up logger with console and file handlers
+
+    By default records are formatted as text and written synchronously.
+    LOG_FORMAT=json switches to JSON lines, LOG_ASYNC=1 moves formatting
+    and I/O to a background QueueListener, and LOG_ROLLUP_INTERVAL > 0
+    samples lines logged with extra=ROLLUP and reports the rest as periodic
+    rollup lines. Use %-style arguments (logger.info("x %s", y)) so
+    messages are only formatted when a handler actually emits them.
+
+    Args:
+        name: Logger name (use __name__ from calling module)
+
+    Returns:
+        logging.logger: Configured logger
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(_level)
+    if logger.handlers:
+        return logger
+    if LOG_ASYNC:
+        logger.addHandler(_shared_queue_handler())
+    else:
+        for handler in _build_handlers():
+            logger.addHandler(handler)
+    if LOG_ROLLUP_INTERVAL > 0:
+        logger.addFilter(_shared_rollup_filter())
+
     return logger
 
 def log_failed_movie(movie_id, error_message):
     """
-    Log a failed movie ID to file for retry later
-    
+    Record a failed movie ID in the work-state store for retry later
+
+    Repeated failures of the same movie update one row (attempt count and
+    last error) instead of appending lines. See retry_worker.py.
+
     Args:
         movie_id: TMDB movie ID that failed
         error_message: Why it failed
 
     """
-    os.makedirs('data', exist_ok=True)
-    with open('data/failed_movies.txt', 'a') as f:
-        f.write(f"{movie_id}|{error_message}\n")
+    from work_state import get_store  # imported here: work_state itself uses setup_logger
+    get_store().mark_failed(movie_id, error_message)
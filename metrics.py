@@ -0,0 +1,286 @@
+"""
+In-process metrics: counters, gauges and latency histograms
+
+A small, dependency-free subset of the Prometheus data model. Metrics are
+registered once at import time by the modules they instrument (tmdb_http,
+async_tmdb_client, neo4j_client, ingest) and updated from any thread.
+
+Export options:
+    render_prometheus()       - text exposition format
+    write_prometheus(path)    - same, written atomically (node_exporter textfile collector)
+    start_http_server(port)   - serve /metrics from a daemon thread
+    summary()                 - JSON-friendly dict for an end-of-run report
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Seconds; covers a cached lookup through a slow, retried TMDB call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. requests or rows written"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in sorted(self._values.items())]
+
+    def snapshot(self):
+        with self._lock:
+            return {','.join(key) or '': value for key, value in sorted(self._values.items())}
+
+
+class Gauge(_Metric):
+    """Point-in-time value, e.g. queue depth"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    samples = Counter.samples
+    snapshot = Counter.snapshot
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket latency histogram with count and sum
+
+    Percentiles in summary() are estimated by linear interpolation inside
+    the bucket that contains them.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    out.append((self.name + '_bucket', key, ('le', _format_value(bound)), cumulative))
+                out.append((self.name + '_count', key, None, count))
+                out.append((self.name + '_sum', key, None, total))
+        return out
+
+    def _quantile(self, counts, count, q):
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return lower
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                ','.join(key) or '': {
+                    'count': count,
+                    'sum': round(total, 6),
+                    'mean': round(total / count, 6) if count else 0.0,
+                    'p50': round(self._quantile(counts, count, 0.50), 6),
+                    'p95': round(self._quantile(counts, count, 0.95), 6),
+                    'p99': round(self._quantile(counts, count, 0.99), 6),
+                }
+                for key, (counts, count, total) in sorted(self._values.items())
+            }
+
+
+class Registry:
+    """Named collection of metrics; get-or-create so re-imports are harmless"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+    def clear(self):
+        """Reset every value (metrics stay registered)"""
+        for metric in self.metrics():
+            metric.clear()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def render_prometheus(registry=REGISTRY):
+    """
+    Returns:
+        str: All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in registry.metrics():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, extra, value in metric.samples():
+            lines.append(f"{name}{_format_labels(metric.labelnames, key, [extra] if extra else None)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path, registry=REGISTRY):
+    """Write render_prometheus() to path atomically (temp file + rename)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus(registry))
+    os.replace(tmp_path, path)
+
+
+def summary(registry=REGISTRY):
+    """
+    Returns:
+        dict: metric name -> {label values joined by ',': value}; histograms
+        report count, sum, mean and estimated p50/p95/p99 in seconds
+    """
+    return {metric.name: metric.snapshot() for metric in registry.metrics()}
+
+
+def start_http_server(port, host='0.0.0.0', registry=REGISTRY):
+    """
+    Serve GET /metrics from a daemon thread
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() to stop it
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            payload = render_prometheus(registry).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -1,14 +1,226 @@
+import functools
+import json
+import time
+from collections import Counter
 from neo4j import GraphDatabase
-from config import NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
-from logger import setup_logger
+from config import NEO4J_BATCH_SIZE, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+from fingerprint import content_hash, get_fingerprints
+from logger import ROLLUP, setup_logger
+from metrics import counter, histogram
 
 
 logger = setup_logger(__name__)
 
-def get_driver():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER,NEO4J_PASSWORD))
+# query label is the entity or relationship type, e.g. 'Movie' or 'ACTED_IN'
+NEO4J_WRITE_SECONDS = histogram('neo4j_write_seconds', "Latency of one write statement", ('query',))
+NEO4J_WRITE_ROWS = counter('neo4j_write_rows_total', "Rows written", ('query',))
+NEO4J_WRITE_ERRORS = counter('neo4j_write_errors_total', "Rows rejected by validation or lost to a failed statement",
+                             ('query',))
+# reason is 'seen' (written earlier this run) or 'unchanged' (matches the fingerprint store)
+NEO4J_WRITE_SKIPPED = counter('neo4j_write_skipped_total', "Rows not sent because their content was already written",
+                              ('query', 'reason'))
+
+# Callbacks run after every successful write; see register_write_listener()
+_write_listeners = []
+
+
+def register_write_listener(callback):
+    """
+    Call callback(touched) after each successful write from this module
+
+    touched is a set of (kind, key) tuples naming what changed: ('movie',
+    tmdb_id) for a Movie node or any relationship of that movie, and
+    ('person', tmdb_id), ('genre', name) or ('studio', id) for the other
+    endpoint of a relationship. A Movie node written by write_graph_batch()
+    also reports the genres and people its batch links it to, since a new
+    rating can reorder results the movie isn't in yet. Name-only updates of
+    Person, Genre and Studio nodes are not reported. Listeners run in the writing thread and only see
+    writes made by this process; writers in other modules (graph_writer)
+    report through notify_write().
+
+    Args:
+        callback (callable): Function taking the set of touched entities
+    """
+    _write_listeners.append(callback)
+
+
+def unregister_write_listener(callback):
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+
+def notify_write(touched):
+    """Pass a set of touched (kind, key) tuples to every write listener"""
+    for callback in list(_write_listeners):
+        try:
+            callback(touched)
+        except Exception as e:
+            logger.error("Write listener %r failed: %s", callback, e)
+
+
+def _notify_rows(rows, results, touched_by_row):
+    """Notify listeners about the rows of a batch that were written"""
+    if not _write_listeners:
+        return
+    touched = set()
+    for row, ok in zip(rows, results):
+        if ok and row is not _SKIPPED:
+            touched.update(touched_by_row(row))
+    if touched:
+        notify_write(touched)
+
+
+# Returned by a single creator, or put in place of a batch row, when the write is skipped
+_SKIPPED = object()
+
+
+def already_written(label, items):
+    """
+    Check (key, hash) pairs against the fingerprints and count the skips
+
+    Returns:
+        list: One bool per item, True if the write can be skipped
+    """
+    fingerprints = get_fingerprints()
+    if fingerprints is None:
+        return [False] * len(items)
+    reasons = fingerprints.unchanged(label, items)
+    for reason, count in Counter(reason for reason in reasons if reason).items():
+        NEO4J_WRITE_SKIPPED.inc(count, query=label, reason=reason)
+    return [reason is not None for reason in reasons]
+
+
+def remember_written(label, items):
+    """Record (key, hash) pairs of rows that were just written"""
+    fingerprints = get_fingerprints()
+    if fingerprints is not None:
+        fingerprints.record(label, items)
+
+
+def _skip_written(label, rows, key_field, hashed_property=False):
+    """
+    Replace batch rows whose exact content was already written with _SKIPPED
+
+    Args:
+        label (str): Node label, the fingerprint kind
+        rows (list): Row dicts (None for invalid rows), modified in place
+        key_field (str): Row field identifying the node
+        hashed_property (bool): Also add the hash to each row as content_hash
+
+    Returns:
+        list: (index, key, hash) of the rows still to be written
+    """
+    if not hashed_property and get_fingerprints() is None:
+        return []
+    pending = []
+    for i, row in enumerate(rows):
+        if row is not None:
+            fingerprint = content_hash(row)
+            if hashed_property:
+                row['content_hash'] = fingerprint
+            pending.append((i, row[key_field], fingerprint))
+    skip = already_written(label, [(key, fingerprint) for _, key, fingerprint in pending])
+    for (i, _, _), done in zip(pending, skip):
+        if done:
+            rows[i] = _SKIPPED
+    return [entry for entry, done in zip(pending, skip) if not done]
+
+
+def skipped_write_count():
+    """
+    Returns:
+        int: Rows skipped by fingerprinting since start (or the last metrics reset)
+    """
+    return sum(NEO4J_WRITE_SKIPPED.snapshot().values())
+
+
+def _instrumented(query_label):
+    """
+    Record latency and row/error counts of a single-entity creator returning
+    True/False (or _SKIPPED, reported to the caller as True)
+
+    The creators consume() their result, so the latency covers the server
+    executing the statement and a failing statement counts as an error.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            ok = func(*args, **kwargs)
+            if ok is _SKIPPED:
+                return True
+            NEO4J_WRITE_SECONDS.observe(time.perf_counter() - start, query=query_label)
+            if ok:
+                NEO4J_WRITE_ROWS.inc(query=query_label)
+            else:
+                NEO4J_WRITE_ERRORS.inc(query=query_label)
+            return ok
+        return wrapper
+    return decorator
+
+
+def get_driver(uri=None):
+    driver = GraphDatabase.driver(uri or NEO4J_URI, auth=(NEO4J_USER,NEO4J_PASSWORD))
     return driver
 
+
+# Single-entity write queries, module-level so schema.check_schema() can EXPLAIN them
+MOVIE_QUERY = """
+MERGE (m:Movie {tmdb_id: $tmdb_id})
+SET m.title = $title,
+    m.rating = $rating,
+    m.release_year = $release_year,
+    m.budget = $budget,
+    m.revenue = $revenue,
+    m.overview = $overview,
+    m.poster_url=$poster_url,
+    m.content_hash = $content_hash
+"""
+
+PERSON_QUERY = """
+MERGE (p:Person{tmdb_id: $tmdb_id})
+SET p.name = $name,
+    p.profile_url = $profile_url,
+    p.content_hash = $content_hash
+"""
+
+GENRE_QUERY = """
+MERGE (g:Genre{name: $name})
+"""
+
+STUDIO_QUERY = """
+MERGE (s:Studio{id: $id})
+SET s.name = $name
+"""
+
+ACTED_IN_QUERY = """
+MATCH (p:Person {tmdb_id: $person_id})
+MATCH (m:Movie {tmdb_id: $movie_id})
+MERGE (p)-[r:ACTED_IN]->(m)
+SET r.character = $character, r.order = $order
+"""
+
+DIRECTED_QUERY = """
+MATCH (p:Person {tmdb_id: $person_id})
+MATCH (m:Movie {tmdb_id: $movie_id})
+MERGE (p)-[r:DIRECTED]->(m)
+"""
+
+IN_GENRE_QUERY = """
+MATCH (m:Movie {tmdb_id: $movie_id})
+MATCH (g:Genre {name: $genre_name})
+MERGE (m)-[r:IN_GENRE]->(g)
+SET r.is_primary = $is_primary
+"""
+
+PRODUCED_BY_QUERY = """
+MATCH (m:Movie {tmdb_id: $movie_id})
+MATCH (s:Studio {id: $studio_id})
+MERGE (m)-[r:PRODUCED_BY]->(s)
+"""
+
+
+@_instrumented('Movie')
 def create_movie_node(session, movie_data):
     """
     Create or update a Movie node in Neo4j
@@ -23,7 +235,7 @@ def create_movie_node(session, movie_data):
         bool: True if successful, False if error occurred
     """
     try:
-        logger.debug(f"Creating movie node from data: {movie_data.get('title')}")
+        logger.debug("Creating movie node from data: %s", movie_data.get('title'))
         tmdb_id = movie_data.get('tmdb_id')
         if not tmdb_id:
             logger.error("Cannot create movie node: missing tmdb_id")
@@ -45,25 +257,22 @@ def create_movie_node(session, movie_data):
             'overview':overview,
             'poster_url':poster_url
          }   
-        query="""
-        MERGE (m:Movie {tmdb_id: $tmdb_id})
-        SET m.title = $title,
-            m.rating = $rating,
-            m.release_year = $release_year,
-            m.budget = $budget,
-            m.revenue = $revenue,
-            m.overview = $overview,
-            m.poster_url=$poster_url
-        """
-        session.run(query, parameters)
-
-        logger.info(f"Successfully created movie node for '{title}' (ID: {tmdb_id})")
+        fingerprint = content_hash(parameters)
+        if already_written('Movie', [(tmdb_id, fingerprint)])[0]:
+            return _SKIPPED
+        parameters['content_hash'] = fingerprint
+        session.run(MOVIE_QUERY, parameters).consume()
+        remember_written('Movie', [(tmdb_id, fingerprint)])
+        notify_write({('movie', tmdb_id)})
+
+        logger.info("Successfully created movie node for '%s' (ID: %s)", title, tmdb_id, extra=ROLLUP)
 
         return True
     except Exception as e:
-        logger.error(f"Failed to create movie node: {e}")
+        logger.error("Failed to create movie node: %s", e)
         return False
 
+@_instrumented('Person')
 def create_person_node(session, person_data):
     """
     Create or update a Person node in Neo4j
@@ -76,7 +285,7 @@ def create_person_node(session, person_data):
         bool: True if successful, False if error occurred
     """
     try:
-        logger.debug(f"Creating person node from data: {person_data.get('name')}")
+        logger.debug("Creating person node from data: %s", person_data.get('name'))
         tmdb_id = person_data.get('tmdb_id')
         if not tmdb_id:
             logger.error("Cannot create movie node: missing tmdb_id")
@@ -88,19 +297,20 @@ def create_person_node(session, person_data):
             'name': name,
             'profile_url' : profile_url
         }
-        query = """
-        MERGE (p:Person{tmdb_id: $tmdb_id})
-        SET p.name = $name,
-            p.profile_url = $profile_url
-        """
-        session.run(query,parameters)
-        logger.info(f"Successfully created person node for '{name}' (ID: {tmdb_id})")
+        fingerprint = content_hash(parameters)
+        if already_written('Person', [(tmdb_id, fingerprint)])[0]:
+            return _SKIPPED
+        parameters['content_hash'] = fingerprint
+        session.run(PERSON_QUERY, parameters).consume()
+        remember_written('Person', [(tmdb_id, fingerprint)])
+        logger.info("Successfully created person node for '%s' (ID: %s)", name, tmdb_id, extra=ROLLUP)
 
         return True
     except Exception as e:
-        logger.error(f"Failed to create Person node: {e}")
+        logger.error("Failed to create Person node: %s", e)
         return False
     
+@_instrumented('Genre')
 def create_genre_node(session, genre_data):
     """
     Create or update a Genre node in Neo4j
@@ -113,7 +323,7 @@ def create_genre_node(session, genre_data):
         bool: True if successful, False if error occurred
     """
     try:
-        logger.debug(f"Creating person node from data: {genre_data.get('name')}")
+        logger.debug("Creating genre node from data: %s", genre_data.get('name'))
         name = genre_data.get('name')
         if not name:
             logger.error("Cannot create Genre node: missing name")
@@ -121,17 +331,19 @@ def create_genre_node(session, genre_data):
         parameters = {
             'name': name
         }
-        query = """
-        MERGE (g:Genre{name: $name})
-        """
-        session.run(query,parameters)
-        logger.info(f"Successfully created Genre node for '{name}' (ID: {id})")
+        fingerprint = content_hash(parameters)
+        if already_written('Genre', [(name, fingerprint)])[0]:
+            return _SKIPPED
+        session.run(GENRE_QUERY, parameters).consume()
+        remember_written('Genre', [(name, fingerprint)])
+        logger.info("Successfully created Genre node for '%s'", name, extra=ROLLUP)
 
         return True
     except Exception as e:
-        logger.error(f"Failed to create Genre node: {e}")
+        logger.error("Failed to create Genre node: %s", e)
         return False
 
+@_instrumented('Studio')
 def create_studio_node(session, studio_data):
     """
     Create or update a Studio node in Neo4j
@@ -144,7 +356,7 @@ def create_studio_node(session, studio_data):
         bool: True if successful, False if error occurred
     """
     try:
-        logger.debug(f"Creating Studio node from data: {studio_data.get('name')}")
+        logger.debug("Creating Studio node from data: %s", studio_data.get('name'))
         id = studio_data.get('id')
         if not id:
             logger.error("Cannot create Studio node: No Id")
@@ -154,17 +366,18 @@ def create_studio_node(session, studio_data):
             'id':id,
             'name':name
         }
-        query = """
-        MERGE (s:Studio{id: $id})
-        SET s.name = $name
-        """
-        session.run(query,parameters)
-        logger.info(f"Successfully created studio node '{name}' (ID: {id})")
+        fingerprint = content_hash(parameters)
+        if already_written('Studio', [(id, fingerprint)])[0]:
+            return _SKIPPED
+        session.run(STUDIO_QUERY, parameters).consume()
+        remember_written('Studio', [(id, fingerprint)])
+        logger.info("Successfully created studio node '%s' (ID: %s)", name, id, extra=ROLLUP)
 
         return True
     except Exception as e:
-        logger.error(f"Failed to create Studio node: {e}")
+        logger.error("Failed to create Studio node: %s", e)
         return False
+@_instrumented('ACTED_IN')
 def create_acted_in_relationship(session, person_tmdb_id, movie_tmdb_id, character, order):
     """
     Create ACTED_IN relationship between Person and Movie nodes
@@ -181,7 +394,7 @@ def create_acted_in_relationship(session, person_tmdb_id, movie_tmdb_id, charact
     """
     
     try:
-        logger.debug(f"Creating ACTED_IN relationship: {person_tmdb_id} -> {movie_tmdb_id} on character {character}")
+        logger.debug("Creating ACTED_IN relationship: %s -> %s on character %s", person_tmdb_id, movie_tmdb_id, character)
         if not movie_tmdb_id:
             logger.error("Cannot find movie node: No Id")
             return False
@@ -194,20 +407,16 @@ def create_acted_in_relationship(session, person_tmdb_id, movie_tmdb_id, charact
             'character' : character,
             'order' : order
         }
-        query = """
-        MATCH (p:Person {tmdb_id: $person_id})
-        MATCH (m:Movie {tmdb_id: $movie_id})
-        MERGE (p)-[r:ACTED_IN]->(m)
-        SET r.character = $character, r.order = $order
-        """
-        session.run(query, parameters)
-        logger.info(f"Created ACTED_IN: Person {person_tmdb_id} -> Movie {movie_tmdb_id}")
+        session.run(ACTED_IN_QUERY, parameters).consume()
+        notify_write({('movie', movie_tmdb_id), ('person', person_tmdb_id)})
+        logger.info("Created ACTED_IN: Person %s -> Movie %s", person_tmdb_id, movie_tmdb_id, extra=ROLLUP)
 
         return True
     
     except Exception as e:
-        logger.error(f"Failed to create ACTED_IN Relationship: {e}")
+        logger.error("Failed to create ACTED_IN Relationship: %s", e)
         return False
+@_instrumented('DIRECTED')
 def create_directed_relationship(session, person_tmdb_id, movie_tmdb_id):
     """
     Create Directed relationship between Person and Movie nodes
@@ -223,7 +432,7 @@ def create_directed_relationship(session, person_tmdb_id, movie_tmdb_id):
     """
     
     try:
-        logger.debug(f"Creating Directed relationship: {person_tmdb_id} -> {movie_tmdb_id}")
+        logger.debug("Creating Directed relationship: %s -> %s", person_tmdb_id, movie_tmdb_id)
         if not movie_tmdb_id:
             logger.error("Cannot find movie node: No Id")
             return False
@@ -234,20 +443,17 @@ def create_directed_relationship(session, person_tmdb_id, movie_tmdb_id):
             'person_id' : person_tmdb_id,
             'movie_id' : movie_tmdb_id,
         }
-        query = """
-        MATCH (p:Person {tmdb_id: $person_id})
-        MATCH (m:Movie {tmdb_id: $movie_id})
-        MERGE (p)-[r:DIRECTED]->(m)
-        """
-        session.run(query, parameters)
-        logger.info(f"Created Directed: Person {person_tmdb_id} -> Movie {movie_tmdb_id}")
+        session.run(DIRECTED_QUERY, parameters).consume()
+        notify_write({('movie', movie_tmdb_id), ('person', person_tmdb_id)})
+        logger.info("Created Directed: Person %s -> Movie %s", person_tmdb_id, movie_tmdb_id, extra=ROLLUP)
 
         return True
     
     except Exception as e:
-        logger.error(f"Failed to create Directed Relationship: {e}")
+        logger.error("Failed to create Directed Relationship: %s", e)
         return False
     
+@_instrumented('IN_GENRE')
 def create_in_genre_relationship(session, movie_tmdb_id, genre_name, is_primary=False):
     """
     Create IN_GENRE relationship between Movie and Genre nodes
@@ -262,7 +468,7 @@ def create_in_genre_relationship(session, movie_tmdb_id, genre_name, is_primary=
         bool: True if successful, False if error occurred
     """
     try:
-        logger.debug(f"Creating IN_Genre relationship: {genre_name} -> {movie_tmdb_id}")
+        logger.debug("Creating IN_Genre relationship: %s -> %s", genre_name, movie_tmdb_id)
         if not movie_tmdb_id:
             logger.error("Cannot find movie node: No Id")
             return False
@@ -274,21 +480,17 @@ def create_in_genre_relationship(session, movie_tmdb_id, genre_name, is_primary=
             'movie_id' : movie_tmdb_id,
             'is_primary': is_primary
         }
-        query = """
-        MATCH (m:Movie {tmdb_id: $movie_id})
-        MATCH (g:Genre {name: $genre_name})
-        MERGE (m)-[r:IN_GENRE]->(g)
-        SET r.is_primary = $is_primary
-        """
-        session.run(query, parameters)
-        logger.info(f"Created IN_GENRE: Movie {movie_tmdb_id} -> Genre {genre_name}")
+        session.run(IN_GENRE_QUERY, parameters).consume()
+        notify_write({('movie', movie_tmdb_id), ('genre', genre_name)})
+        logger.info("Created IN_GENRE: Movie %s -> Genre %s", movie_tmdb_id, genre_name, extra=ROLLUP)
 
         return True
     
     except Exception as e:
-        logger.error(f"Failed to create IN_GENRE Relationship: {e}")
+        logger.error("Failed to create IN_GENRE Relationship: %s", e)
         return False
 
+@_instrumented('PRODUCED_BY')
 def create_produced_by_relationship(session, studio_id, movie_tmdb_id):
     """
     Create PRODUCED_BY relationship between Movie and Studio nodes
@@ -303,7 +505,7 @@ def create_produced_by_relationship(session, studio_id, movie_tmdb_id):
     """
     
     try:
-        logger.debug(f"Creating PRODUCED_BY relationship: {studio_id} -> {movie_tmdb_id}")
+        logger.debug("Creating PRODUCED_BY relationship: %s -> %s", studio_id, movie_tmdb_id)
         if not movie_tmdb_id:
             logger.error("Cannot find movie node: No Id")
             return False
@@ -314,21 +516,622 @@ def create_produced_by_relationship(session, studio_id, movie_tmdb_id):
             'studio_id' : studio_id,
             'movie_id' : movie_tmdb_id,
         }
-        query = """
-        MATCH (m:Movie {tmdb_id: $movie_id})
-        MATCH (s:Studio {id: $studio_id})
-        MERGE (m)-[r:PRODUCED_BY]->(s)
-        """
-        session.run(query, parameters)
-        logger.info(f"Created PRODUCED_BY: Studio {studio_id} -> Movie {movie_tmdb_id}")
+        session.run(PRODUCED_BY_QUERY, parameters).consume()
+        notify_write({('movie', movie_tmdb_id), ('studio', studio_id)})
+        logger.info("Created PRODUCED_BY: Studio %s -> Movie %s", studio_id, movie_tmdb_id, extra=ROLLUP)
 
         return True
     
     except Exception as e:
-        logger.error(f"Failed to create Produced_By Relationship: {e}")
+        logger.error("Failed to create Produced_By Relationship: %s", e)
         return False
 
 
+# ---------------------------------------------------------------------------
+# Batched writers
+#
+# Each batch function validates its rows the same way as the single-entity
+# creator above, then writes the valid rows with one UNWIND statement per
+# chunk. The return value is a list of booleans in input order, so callers
+# keep the same True/False-per-entity semantics as the single creators.
+# ---------------------------------------------------------------------------
+
+MOVIE_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (m:Movie {tmdb_id: row.tmdb_id})
+SET m.title = row.title,
+    m.rating = row.rating,
+    m.release_year = row.release_year,
+    m.budget = row.budget,
+    m.revenue = row.revenue,
+    m.overview = row.overview,
+    m.poster_url = row.poster_url,
+    m.content_hash = row.content_hash
+"""
+
+PERSON_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (p:Person {tmdb_id: row.tmdb_id})
+SET p.name = row.name,
+    p.profile_url = row.profile_url,
+    p.content_hash = row.content_hash
+"""
+
+GENRE_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (g:Genre {name: row.name})
+"""
+
+STUDIO_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (s:Studio {id: row.id})
+SET s.name = row.name
+"""
+
+ACTED_IN_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (p:Person {tmdb_id: row.person_id})
+MATCH (m:Movie {tmdb_id: row.movie_id})
+MERGE (p)-[r:ACTED_IN]->(m)
+SET r.character = row.character, r.order = row.order
+"""
+
+DIRECTED_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (p:Person {tmdb_id: row.person_id})
+MATCH (m:Movie {tmdb_id: row.movie_id})
+MERGE (p)-[r:DIRECTED]->(m)
+"""
+
+IN_GENRE_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (m:Movie {tmdb_id: row.movie_id})
+MATCH (g:Genre {name: row.genre_name})
+MERGE (m)-[r:IN_GENRE]->(g)
+SET r.is_primary = row.is_primary
+"""
+
+PRODUCED_BY_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (m:Movie {tmdb_id: row.movie_id})
+MATCH (s:Studio {id: row.studio_id})
+MERGE (m)-[r:PRODUCED_BY]->(s)
+"""
+
+
+def _run_batch(session, query, rows, label, chunk_size):
+    """
+    Run an UNWIND query over rows, one statement per chunk
+
+    Args:
+        session: Active Neo4j session
+        query (str): Cypher query reading its input from $rows
+        rows (list): Parameter dicts, None for rows that failed validation,
+            or _SKIPPED for rows already written (reported as True)
+        label (str): Entity name used in log messages
+        chunk_size (int): Maximum number of rows sent per statement
+
+    Returns:
+        list: One bool per input row, True if the row was written
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    results = [row is not None for row in rows]
+    indexed = [(i, row) for i, row in enumerate(rows) if row is not None and row is not _SKIPPED]
+    invalid = sum(row is None for row in rows)
+    if invalid:
+        NEO4J_WRITE_ERRORS.inc(invalid, query=label)
+    for start in range(0, len(indexed), chunk_size):
+        chunk = indexed[start:start + chunk_size]
+        started = time.perf_counter()
+        try:
+            session.run(query, {'rows': [row for _, row in chunk]}).consume()
+            logger.info("Wrote %d %s rows in one batch", len(chunk), label, extra=ROLLUP)
+            NEO4J_WRITE_ROWS.inc(len(chunk), query=label)
+        except Exception as e:
+            logger.error("Failed to write batch of %d %s rows: %s", len(chunk), label, e)
+            NEO4J_WRITE_ERRORS.inc(len(chunk), query=label)
+            for i, _ in chunk:
+                results[i] = False
+        NEO4J_WRITE_SECONDS.observe(time.perf_counter() - started, query=label)
+    return results
+
+
+def movie_row(movie_data):
+    """
+    Validated $rows entry for MOVIE_BATCH_QUERY (without content_hash)
+
+    Returns:
+        dict: Row, or None (logged) if the movie has no tmdb_id
+    """
+    tmdb_id = movie_data.get('tmdb_id')
+    if not tmdb_id:
+        logger.error("Cannot create movie node: missing tmdb_id")
+        return None
+    return {
+        'tmdb_id': tmdb_id,
+        'title': movie_data.get('title'),
+        'rating': movie_data.get('rating'),
+        'release_year': movie_data.get('release_year'),
+        'budget': movie_data.get('budget') or 0,
+        'revenue': movie_data.get('revenue') or 0,
+        'overview': movie_data.get('overview'),
+        'poster_url': movie_data.get('poster_url')
+    }
+
+
+def person_row(person_data):
+    """Validated $rows entry for PERSON_BATCH_QUERY, or None (logged)"""
+    tmdb_id = person_data.get('tmdb_id')
+    if not tmdb_id:
+        logger.error("Cannot create person node: missing tmdb_id")
+        return None
+    return {
+        'tmdb_id': tmdb_id,
+        'name': person_data.get('name'),
+        'profile_url': person_data.get('profile_url')
+    }
+
+
+def genre_row(genre_data):
+    """Validated $rows entry for GENRE_BATCH_QUERY, or None (logged)"""
+    name = genre_data.get('name')
+    if not name:
+        logger.error("Cannot create Genre node: missing name")
+        return None
+    return {'name': name}
+
+
+def studio_row(studio_data):
+    """Validated $rows entry for STUDIO_BATCH_QUERY, or None (logged)"""
+    id = studio_data.get('id')
+    if not id:
+        logger.error("Cannot create Studio node: No Id")
+        return None
+    return {'id': id, 'name': studio_data.get('name')}
+
+
+def create_movie_nodes_batch(session, movies, chunk_size=NEO4J_BATCH_SIZE, related=None):
+    """
+    Create or update many Movie nodes with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        movies (list): Movie dicts as accepted by create_movie_node()
+        chunk_size (int): Maximum rows per statement
+        related (dict): tmdb_id -> extra touched entities reported to the
+            write listeners with each written movie (see related_entities())
+
+    Returns:
+        list: One bool per movie, True if written
+    """
+    rows = [movie_row(movie_data) for movie_data in movies]
+    pending = _skip_written('Movie', rows, 'tmdb_id', hashed_property=True)
+    results = _run_batch(session, MOVIE_BATCH_QUERY, rows, 'Movie', chunk_size)
+    remember_written('Movie', [(key, fingerprint) for i, key, fingerprint in pending if results[i]])
+    related = related or {}
+    _notify_rows(rows, results, lambda row: [('movie', row['tmdb_id']), *related.get(row['tmdb_id'], ())])
+    return results
+
+
+def create_person_nodes_batch(session, people, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create or update many Person nodes with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        people (list): Person dicts with keys: tmdb_id, name, profile_url
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per person, True if written
+    """
+    rows = [person_row(person_data) for person_data in people]
+    pending = _skip_written('Person', rows, 'tmdb_id', hashed_property=True)
+    results = _run_batch(session, PERSON_BATCH_QUERY, rows, 'Person', chunk_size)
+    remember_written('Person', [(key, fingerprint) for i, key, fingerprint in pending if results[i]])
+    return results
+
+
+def create_genre_nodes_batch(session, genres, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many Genre nodes with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        genres (list): Genre dicts with key: name
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per genre, True if written
+    """
+    rows = [genre_row(genre_data) for genre_data in genres]
+    pending = _skip_written('Genre', rows, 'name')
+    results = _run_batch(session, GENRE_BATCH_QUERY, rows, 'Genre', chunk_size)
+    remember_written('Genre', [(key, fingerprint) for i, key, fingerprint in pending if results[i]])
+    return results
+
+
+def create_studio_nodes_batch(session, studios, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create or update many Studio nodes with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        studios (list): Studio dicts with keys: id, name
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per studio, True if written
+    """
+    rows = [studio_row(studio_data) for studio_data in studios]
+    pending = _skip_written('Studio', rows, 'id')
+    results = _run_batch(session, STUDIO_BATCH_QUERY, rows, 'Studio', chunk_size)
+    remember_written('Studio', [(key, fingerprint) for i, key, fingerprint in pending if results[i]])
+    return results
+
+
+def create_acted_in_relationships_batch(session, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many ACTED_IN relationships with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        edges (list): Tuples of (person_tmdb_id, movie_tmdb_id, character, order)
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    rows = []
+    for person_tmdb_id, movie_tmdb_id, character, order in edges:
+        if not movie_tmdb_id or not person_tmdb_id:
+            logger.error("Cannot create ACTED_IN: missing Id (%s -> %s)", person_tmdb_id, movie_tmdb_id)
+            rows.append(None)
+            continue
+        rows.append({
+            'person_id': person_tmdb_id,
+            'movie_id': movie_tmdb_id,
+            'character': character,
+            'order': order
+        })
+    results = _run_batch(session, ACTED_IN_BATCH_QUERY, rows, 'ACTED_IN', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id']), ('person', row['person_id'])])
+    return results
+
+
+def create_directed_relationships_batch(session, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many DIRECTED relationships with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        edges (list): Tuples of (person_tmdb_id, movie_tmdb_id)
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    rows = []
+    for person_tmdb_id, movie_tmdb_id in edges:
+        if not movie_tmdb_id or not person_tmdb_id:
+            logger.error("Cannot create DIRECTED: missing Id (%s -> %s)", person_tmdb_id, movie_tmdb_id)
+            rows.append(None)
+            continue
+        rows.append({'person_id': person_tmdb_id, 'movie_id': movie_tmdb_id})
+    results = _run_batch(session, DIRECTED_BATCH_QUERY, rows, 'DIRECTED', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id']), ('person', row['person_id'])])
+    return results
+
+
+def create_in_genre_relationships_batch(session, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many IN_GENRE relationships with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        edges (list): Tuples of (movie_tmdb_id, genre_name, is_primary)
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    rows = []
+    for movie_tmdb_id, genre_name, is_primary in edges:
+        if not movie_tmdb_id or not genre_name:
+            logger.error("Cannot create IN_GENRE: missing Id (%s -> %s)", movie_tmdb_id, genre_name)
+            rows.append(None)
+            continue
+        rows.append({
+            'movie_id': movie_tmdb_id,
+            'genre_name': genre_name,
+            'is_primary': is_primary
+        })
+    results = _run_batch(session, IN_GENRE_BATCH_QUERY, rows, 'IN_GENRE', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id']), ('genre', row['genre_name'])])
+    return results
+
+
+def create_produced_by_relationships_batch(session, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many PRODUCED_BY relationships with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        edges (list): Tuples of (studio_id, movie_tmdb_id), same order as
+            create_produced_by_relationship()
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    rows = []
+    for studio_id, movie_tmdb_id in edges:
+        if not movie_tmdb_id or not studio_id:
+            logger.error("Cannot create PRODUCED_BY: missing Id (%s -> %s)", studio_id, movie_tmdb_id)
+            rows.append(None)
+            continue
+        rows.append({'studio_id': studio_id, 'movie_id': movie_tmdb_id})
+    results = _run_batch(session, PRODUCED_BY_BATCH_QUERY, rows, 'PRODUCED_BY', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id']), ('studio', row['studio_id'])])
+    return results
+
+
+SIMILAR_TO_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Movie {tmdb_id: row.movie_id})
+MATCH (b:Movie {tmdb_id: row.other_id})
+MERGE (a)-[r:SIMILAR_TO]->(b)
+SET r.score = row.score
+"""
+
+CLEAR_SIMILAR_TO_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Movie {tmdb_id: row.movie_id})-[r:SIMILAR_TO]->()
+DELETE r
+"""
+
+
+def create_similar_to_relationships_batch(session, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Create many SIMILAR_TO relationships with one UNWIND per chunk
+
+    Args:
+        session: Active Neo4j session
+        edges (list): Tuples of (movie_tmdb_id, other_movie_tmdb_id, score)
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    rows = []
+    for movie_tmdb_id, other_tmdb_id, score in edges:
+        if not movie_tmdb_id or not other_tmdb_id:
+            logger.error("Cannot create SIMILAR_TO: missing Id (%s -> %s)", movie_tmdb_id, other_tmdb_id)
+            rows.append(None)
+            continue
+        rows.append({'movie_id': movie_tmdb_id, 'other_id': other_tmdb_id, 'score': float(score)})
+    results = _run_batch(session, SIMILAR_TO_BATCH_QUERY, rows, 'SIMILAR_TO', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id'])])
+    return results
+
+
+def clear_similar_to_relationships_batch(session, movie_tmdb_ids, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Delete the outgoing SIMILAR_TO relationships of many movies
+
+    Args:
+        session: Active Neo4j session
+        movie_tmdb_ids (list): TMDB IDs whose neighbour lists are replaced
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per movie, True if cleared
+    """
+    rows = [{'movie_id': movie_tmdb_id} if movie_tmdb_id else None for movie_tmdb_id in movie_tmdb_ids]
+    results = _run_batch(session, CLEAR_SIMILAR_TO_BATCH_QUERY, rows, 'SIMILAR_TO clear', chunk_size)
+    _notify_rows(rows, results, lambda row: [('movie', row['movie_id'])])
+    return results
+
+
+def _replace_similar_to_tx(tx, clear_rows, edge_rows, chunk_size):
+    for query, rows in ((CLEAR_SIMILAR_TO_BATCH_QUERY, clear_rows), (SIMILAR_TO_BATCH_QUERY, edge_rows)):
+        for start in range(0, len(rows), chunk_size):
+            tx.run(query, {'rows': rows[start:start + chunk_size]}).consume()
+
+
+def replace_similar_to_relationships_batch(session, movie_tmdb_ids, edges, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Replace the outgoing SIMILAR_TO relationships of many movies in one transaction
+
+    The clear and the create commit together (session.execute_write, retried
+    on transient errors), so a failure never leaves the movies without
+    neighbours.
+
+    Args:
+        session: Active Neo4j session
+        movie_tmdb_ids (list): TMDB IDs whose neighbour lists are replaced
+        edges (list): Tuples of (movie_tmdb_id, other_movie_tmdb_id, score)
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        list: One bool per edge, True if written
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    clear_rows = [{'movie_id': movie_tmdb_id} for movie_tmdb_id in movie_tmdb_ids if movie_tmdb_id]
+    rows = []
+    for movie_tmdb_id, other_tmdb_id, score in edges:
+        if not movie_tmdb_id or not other_tmdb_id:
+            logger.error("Cannot create SIMILAR_TO: missing Id (%s -> %s)", movie_tmdb_id, other_tmdb_id)
+            rows.append(None)
+            continue
+        rows.append({'movie_id': movie_tmdb_id, 'other_id': other_tmdb_id, 'score': float(score)})
+    edge_rows = [row for row in rows if row is not None]
+    invalid = len(rows) - len(edge_rows)
+    if invalid:
+        NEO4J_WRITE_ERRORS.inc(invalid, query='SIMILAR_TO')
+    started = time.perf_counter()
+    try:
+        session.execute_write(_replace_similar_to_tx, clear_rows, edge_rows, chunk_size)
+        ok = True
+        logger.info("Replaced SIMILAR_TO of %d movies with %d rows in one transaction",
+                    len(clear_rows), len(edge_rows), extra=ROLLUP)
+        NEO4J_WRITE_ROWS.inc(len(edge_rows), query='SIMILAR_TO')
+    except Exception as e:
+        logger.error("Failed to replace SIMILAR_TO of %d movies: %s", len(clear_rows), e)
+        NEO4J_WRITE_ERRORS.inc(len(edge_rows), query='SIMILAR_TO')
+        ok = False
+    NEO4J_WRITE_SECONDS.observe(time.perf_counter() - started, query='SIMILAR_TO replace')
+    _notify_rows(clear_rows, [ok] * len(clear_rows), lambda row: [('movie', row['movie_id'])])
+    return [ok and row is not None for row in rows]
+
+
+# graph batch key -> (relationship label, writer, position of the movie ID in the edge tuple)
+_EDGE_WRITERS = {
+    'acted_in': ('ACTED_IN', create_acted_in_relationships_batch, 1),
+    'directed': ('DIRECTED', create_directed_relationships_batch, 1),
+    'in_genre': ('IN_GENRE', create_in_genre_relationships_batch, 0),
+    'produced_by': ('PRODUCED_BY', create_produced_by_relationships_batch, 1),
+}
+
+# graph batch edge key -> (node batch key, node key field, position of that node's key in the edge tuple)
+_EDGE_ENDPOINTS = {
+    'acted_in': ('people', 'tmdb_id', 0),
+    'directed': ('people', 'tmdb_id', 0),
+    'in_genre': ('genres', 'name', 1),
+    'produced_by': ('studios', 'id', 0),
+}
+
+
+def movie_edge_hashes(graph):
+    """
+    Content hash of each movie's full set of edges in a graph batch
+
+    Returns:
+        dict: movie tmdb_id -> hash (movies without edges are left out)
+    """
+    edges = {}
+    for key, (_, _, movie_index) in _EDGE_WRITERS.items():
+        for edge in graph[key]:
+            edges.setdefault(edge[movie_index], []).append(json.dumps([key, *edge], default=str))
+    return {movie_id: content_hash(sorted(rows)) for movie_id, rows in edges.items()}
+
+
+def skip_unchanged_edges(graph):
+    """
+    Find the movies of a graph batch whose whole edge set was already written
+
+    Their edge rows are counted in neo4j_write_skipped_total.
+
+    Returns:
+        tuple: (list of (movie tmdb_id, edge hash) for every movie with
+        edges, dict of movie tmdb_id -> skip reason for the unchanged ones)
+    """
+    fingerprints = get_fingerprints()
+    if fingerprints is None:
+        return [], {}
+    edge_hashes = list(movie_edge_hashes(graph).items())
+    reasons = fingerprints.unchanged('movie_edges', edge_hashes) if edge_hashes else []
+    skip = {movie_id: reason for (movie_id, _), reason in zip(edge_hashes, reasons) if reason}
+    for key, (label, _, movie_index) in _EDGE_WRITERS.items():
+        skipped = Counter(skip[edge[movie_index]] for edge in graph[key] if edge[movie_index] in skip)
+        for reason, count in skipped.items():
+            NEO4J_WRITE_SKIPPED.inc(count, query=label, reason=reason)
+    return edge_hashes, skip
+
+
+def related_entities(graph):
+    """
+    Map each movie of a graph batch to the genres and people linked to it
+
+    Returns:
+        dict: movie tmdb_id -> set of ('genre', name) and ('person', tmdb_id)
+    """
+    related = {}
+    for movie_id, name, _ in graph['in_genre']:
+        related.setdefault(movie_id, set()).add(('genre', name))
+    for person_id, movie_id, *_ in graph['acted_in']:
+        related.setdefault(movie_id, set()).add(('person', person_id))
+    for person_id, movie_id in graph['directed']:
+        related.setdefault(movie_id, set()).add(('person', person_id))
+    return related
+
+
+def write_graph_batch(session, graph, chunk_size=NEO4J_BATCH_SIZE):
+    """
+    Write a graph batch (see transform.empty_graph()) with the batch writers
+
+    Nodes are written before relationships so the relationship MATCHes find
+    their endpoints. Nodes whose content was already written are skipped by
+    the node writers; likewise every edge of a movie is skipped when that
+    movie's edge set matches its fingerprint (see fingerprint.py).
+
+    Args:
+        session: Active Neo4j session
+        graph (dict): Graph batch with node and edge lists
+        chunk_size (int): Maximum rows per statement
+
+    Returns:
+        dict: Per-row results for each key of the graph batch (skipped rows
+        count as written). A movie is reported failed when any of its
+        relationships, or a node one of them points at, failed to write.
+    """
+    results = {
+        'movies': create_movie_nodes_batch(session, graph['movies'], chunk_size, related_entities(graph)),
+        'people': create_person_nodes_batch(session, graph['people'], chunk_size),
+        'genres': create_genre_nodes_batch(session, graph['genres'], chunk_size),
+        'studios': create_studio_nodes_batch(session, graph['studios'], chunk_size),
+    }
+    edge_hashes, skip = skip_unchanged_edges(graph)
+    failed_movies = set()
+    for key, (label, writer, movie_index) in _EDGE_WRITERS.items():
+        edges = graph[key]
+        keep = [i for i, edge in enumerate(edges) if edge[movie_index] not in skip]
+        key_results = [True] * len(edges)
+        for i, ok in zip(keep, writer(session, [edges[i] for i in keep], chunk_size)):
+            key_results[i] = ok
+            if not ok:
+                failed_movies.add(edges[i][movie_index])
+        results[key] = key_results
+
+    # A relationship to a node that failed to write matches nothing, so its movie failed too
+    failed_movies.update(movie.get('tmdb_id') for movie, ok in zip(graph['movies'], results['movies']) if not ok)
+    for key, (node_key, key_field, node_index) in _EDGE_ENDPOINTS.items():
+        failed_nodes = {node.get(key_field) for node, ok in zip(graph[node_key], results[node_key]) if not ok}
+        if failed_nodes:
+            movie_index = _EDGE_WRITERS[key][2]
+            failed_movies.update(edge[movie_index] for edge in graph[key]
+                                 if edge[node_index] in failed_nodes and edge[movie_index] not in skip)
+    for i, movie in enumerate(graph['movies']):
+        if movie.get('tmdb_id') in failed_movies:
+            results['movies'][i] = False
+
+    remember_written('movie_edges', [(movie_id, fingerprint) for movie_id, fingerprint in edge_hashes
+                                      if movie_id not in skip and movie_id not in failed_movies])
+    return results
+
+
+def get_existing_movie_ids(session, movie_ids):
+    """
+    Return which of the given movie IDs already have a Movie node
+
+    Args:
+        session: Active Neo4j session
+        movie_ids (list): TMDB movie IDs to check
+
+    Returns:
+        set: IDs present in the graph
+    """
+    query = """
+    UNWIND $ids AS id
+    MATCH (m:Movie {tmdb_id: id})
+    RETURN m.tmdb_id AS tmdb_id
+    """
+    result = session.run(query, {'ids': list(movie_ids)})
+    return {record['tmdb_id'] for record in result}
+
+
 if __name__ == "__main__":
     print("\n=== COMPREHENSIVE TEST: Fight Club ===\n")
     
@@ -0,0 +1,281 @@
+"""
+Read-side queries over the movie graph
+
+Every query runs in a managed read transaction (session.execute_read) on a
+READ-mode session, so with a neo4j:// URI the driver routes it to a read
+replica or follower and retries it on transient errors. Query strings are
+fixed and fully parameterized, so the server plans each one once and reuses
+the plan; prepare() plans them all up front.
+
+List queries are generators using keyset pagination: each page is one
+transaction asking for rows after the last key seen (ORDER BY key LIMIT
+page_size), never SKIP, so page N costs the same as page 1 and at most
+page_size rows are held in memory. fetch_size sets how many records the
+driver pulls per network round trip inside a page.
+
+Usage:
+    from neo4j_queries import get_reader
+    get_reader().movie(550)
+    for row in get_reader().movies_by_genre('Drama', min_rating=8, year_from=1990):
+        ...
+
+    python -m neo4j_queries movie 550
+    python -m neo4j_queries genre Drama --min-rating 8 --limit 20
+"""
+import argparse
+import json
+import threading
+from itertools import islice
+from neo4j import READ_ACCESS
+from logger import setup_logger
+from neo4j_client import get_driver
+
+
+logger = setup_logger(__name__)
+
+MOVIE_QUERY = """
+MATCH (m:Movie {tmdb_id: $tmdb_id})
+RETURN m {.tmdb_id, .title, .release_year, .rating, .budget, .revenue, .overview, .poster_url} AS movie,
+       [(m)<-[r:ACTED_IN]-(p:Person) | p {.tmdb_id, .name, .profile_url, character: r.character, order: r.order}]
+           AS cast,
+       [(m)<-[:DIRECTED]-(p:Person) | p {.tmdb_id, .name, .profile_url}] AS directors,
+       [(m)-[r:IN_GENRE]->(g:Genre) | {name: g.name, is_primary: r.is_primary}] AS genres,
+       [(m)-[:PRODUCED_BY]->(s:Studio) | s {.id, .name}] AS studios
+"""
+
+FILMOGRAPHY_QUERY = """
+MATCH (:Person {tmdb_id: $person_id})-[r:ACTED_IN|DIRECTED]->(m:Movie)
+WHERE m.tmdb_id > $after
+WITH m, collect(r) AS credits
+ORDER BY m.tmdb_id
+LIMIT $limit
+RETURN m.tmdb_id AS tmdb_id, m.title AS title, m.release_year AS release_year, m.rating AS rating,
+       [c IN credits WHERE type(c) = 'ACTED_IN' | c.character][0] AS character,
+       any(c IN credits WHERE type(c) = 'DIRECTED') AS directed
+"""
+
+CO_ACTORS_QUERY = """
+MATCH (p:Person {tmdb_id: $person_id})-[:ACTED_IN]->(m:Movie)<-[:ACTED_IN]-(o:Person)
+WHERE o.tmdb_id > $after AND o <> p
+WITH o, count(DISTINCT m) AS shared_movies
+ORDER BY o.tmdb_id
+LIMIT $limit
+RETURN o.tmdb_id AS tmdb_id, o.name AS name, shared_movies
+"""
+
+# A genre covers a large share of the catalog, so walk the Movie key index
+# in order and stop at LIMIT instead of expanding every IN_GENRE per page
+MOVIES_BY_GENRE_QUERY = """
+MATCH (m:Movie)
+WHERE m.tmdb_id > $after
+  AND EXISTS { (m)-[:IN_GENRE]->(:Genre {name: $genre}) }
+  AND ($min_rating IS NULL OR m.rating >= $min_rating)
+  AND ($year_from IS NULL OR m.release_year >= $year_from)
+  AND ($year_to IS NULL OR m.release_year <= $year_to)
+RETURN m.tmdb_id AS tmdb_id, m.title AS title, m.release_year AS release_year, m.rating AS rating
+ORDER BY m.tmdb_id
+LIMIT $limit
+"""
+
+# A studio's movies are few, so start from the studio
+MOVIES_BY_STUDIO_QUERY = """
+MATCH (:Studio {id: $studio_id})<-[:PRODUCED_BY]-(m:Movie)
+WHERE m.tmdb_id > $after
+  AND ($min_rating IS NULL OR m.rating >= $min_rating)
+  AND ($year_from IS NULL OR m.release_year >= $year_from)
+  AND ($year_to IS NULL OR m.release_year <= $year_to)
+RETURN m.tmdb_id AS tmdb_id, m.title AS title, m.release_year AS release_year, m.rating AS rating
+ORDER BY m.tmdb_id
+LIMIT $limit
+"""
+
+# name -> (query, sample parameters) for prepare()
+READ_QUERIES = {
+    'movie': (MOVIE_QUERY, {'tmdb_id': 550}),
+    'filmography': (FILMOGRAPHY_QUERY, {'person_id': 819, 'after': -1, 'limit': 1}),
+    'co_actors': (CO_ACTORS_QUERY, {'person_id': 819, 'after': -1, 'limit': 1}),
+    'movies_by_genre': (MOVIES_BY_GENRE_QUERY, {
+        'genre': 'Drama', 'after': -1, 'limit': 1, 'min_rating': None, 'year_from': None, 'year_to': None,
+    }),
+    'movies_by_studio': (MOVIES_BY_STUDIO_QUERY, {
+        'studio_id': 711, 'after': -1, 'limit': 1, 'min_rating': None, 'year_from': None, 'year_to': None,
+    }),
+}
+
+
+def _fetch(tx, query, parameters):
+    return [record.data() for record in tx.run(query, parameters)]
+
+
+class GraphReader:
+    """
+    Read queries against one driver
+
+    Args:
+        driver: Neo4j driver (use a neo4j:// URI to route reads in a cluster)
+        database (str): Database name, or None for the server default
+        page_size (int): Rows per keyset page, i.e. per read transaction
+        fetch_size (int): Records the driver pulls per round trip
+    """
+
+    def __init__(self, driver, database=None, page_size=500, fetch_size=1000):
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        self.driver = driver
+        self.database = database
+        self.page_size = page_size
+        self.fetch_size = fetch_size
+
+    def _session(self):
+        return self.driver.session(database=self.database, default_access_mode=READ_ACCESS,
+                                   fetch_size=self.fetch_size)
+
+    def _read(self, query, parameters):
+        with self._session() as session:
+            return session.execute_read(_fetch, query, parameters)
+
+    def _pages(self, query, parameters, key='tmdb_id'):
+        """
+        Yield every row of a keyset-paginated query
+
+        The query must filter on `key > $after`, order by it and LIMIT $limit.
+        """
+        after = -1
+        with self._session() as session:
+            while True:
+                rows = session.execute_read(_fetch, query, dict(parameters, after=after, limit=self.page_size))
+                yield from rows
+                if len(rows) < self.page_size:
+                    return
+                after = rows[-1][key]
+
+    def prepare(self):
+        """Have the server plan (and cache) every read query before first use"""
+        with self._session() as session:
+            for name, (query, parameters) in READ_QUERIES.items():
+                session.run("EXPLAIN " + query, parameters).consume()
+        logger.info("Planned %d read queries", len(READ_QUERIES))
+
+    def movie(self, tmdb_id):
+        """
+        A movie with its cast, directors, genres and studios
+
+        Args:
+            tmdb_id (int): TMDB movie ID
+
+        Returns:
+            dict: Movie properties plus 'cast' (by billing order), 'directors',
+            'genres' (name, is_primary) and 'studios' lists, or None if the
+            movie is not in the graph
+        """
+        rows = self._read(MOVIE_QUERY, {'tmdb_id': tmdb_id})
+        if not rows:
+            return None
+        row = rows[0]
+        movie = row['movie']
+        movie['cast'] = sorted(row['cast'], key=lambda credit: (credit['order'] is None, credit['order']))
+        movie['directors'] = row['directors']
+        movie['genres'] = sorted(row['genres'], key=lambda genre: (not genre['is_primary'], genre['name']))
+        movie['studios'] = row['studios']
+        return movie
+
+    def filmography(self, person_id):
+        """
+        Movies a person acted in or directed, by tmdb_id
+
+        Yields:
+            dict: tmdb_id, title, release_year, rating, character (None if
+            they did not act) and directed
+        """
+        return self._pages(FILMOGRAPHY_QUERY, {'person_id': person_id})
+
+    def co_actors(self, person_id):
+        """
+        People who acted in a movie with the given person, by tmdb_id
+
+        Yields:
+            dict: tmdb_id, name and shared_movies
+        """
+        return self._pages(CO_ACTORS_QUERY, {'person_id': person_id})
+
+    def movies_by_genre(self, genre, min_rating=None, year_from=None, year_to=None):
+        """
+        Movies in a genre, by tmdb_id, optionally filtered
+
+        Args:
+            genre (str): Genre name
+            min_rating (float): Lowest rating to include
+            year_from (int): First release year to include
+            year_to (int): Last release year to include
+
+        Yields:
+            dict: tmdb_id, title, release_year and rating
+        """
+        return self._pages(MOVIES_BY_GENRE_QUERY, {
+            'genre': genre, 'min_rating': min_rating, 'year_from': year_from, 'year_to': year_to,
+        })
+
+    def movies_by_studio(self, studio_id, min_rating=None, year_from=None, year_to=None):
+        """Movies produced by a studio, by tmdb_id; filters as movies_by_genre()"""
+        return self._pages(MOVIES_BY_STUDIO_QUERY, {
+            'studio_id': studio_id, 'min_rating': min_rating, 'year_from': year_from, 'year_to': year_to,
+        })
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """
+    Return the process-wide GraphReader, creating it on first use
+
+    Returns:
+        GraphReader: Shared reader
+    """
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = GraphReader(get_driver())
+    return _reader
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Read movies, people and their relationships from the graph")
+    parser.add_argument('query', choices=('movie', 'filmography', 'co_actors', 'genre', 'studio'))
+    parser.add_argument('key', help="tmdb_id, studio id, or a genre name for the genre query")
+    parser.add_argument('--min-rating', type=float)
+    parser.add_argument('--year-from', type=int)
+    parser.add_argument('--year-to', type=int)
+    parser.add_argument('--limit', type=int, help="stop after this many rows")
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--fetch-size', type=int, default=1000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    driver = get_driver()
+    reader = GraphReader(driver, page_size=args.page_size, fetch_size=args.fetch_size)
+    filters = {'min_rating': args.min_rating, 'year_from': args.year_from, 'year_to': args.year_to}
+    try:
+        if args.query == 'movie':
+            print(json.dumps(reader.movie(int(args.key)), indent=2))
+            return
+        if args.query == 'genre':
+            rows = reader.movies_by_genre(args.key, **filters)
+        elif args.query == 'studio':
+            rows = reader.movies_by_studio(int(args.key), **filters)
+        elif args.query == 'filmography':
+            rows = reader.filmography(int(args.key))
+        else:
+            rows = reader.co_actors(int(args.key))
+        for row in islice(rows, args.limit):
+            print(json.dumps(row))
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
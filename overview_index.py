@@ -0,0 +1,355 @@
+"""
+Overview-text similarity: hashed TF-IDF embeddings plus an IVF ANN index
+
+Overviews are tokenised, hashed into a fixed bucket space for document
+frequencies, weighted with sublinear TF-IDF and folded into DIM float32
+dimensions with a sparse signed random projection (a count sketch), then
+L2-normalised. Vectors are stored as a raw float32 file that is opened with
+np.memmap, so a 500k-movie corpus never has to fit in RAM at once.
+
+Queries go through an IVF index: spherical k-means centroids partition the
+vectors into inverted lists, and a query scans only the nprobe closest
+lists. measure_recall() compares it against brute force.
+
+Usage:
+    python -m overview_index build --out data/overview
+    python -m overview_index query --out data/overview --movie 550
+    python -m overview_index recall --out data/overview --queries 1000
+"""
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+import numpy as np
+from logger import setup_logger
+from neo4j_client import get_driver
+
+
+logger = setup_logger(__name__)
+
+DIM = 256
+HASH_BUCKETS = 1 << 20
+SKETCH_WIDTH = 4  # signed output dimensions per hash bucket
+SEED = 1234
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has he her his in into is it its of on or she
+that the their them they this to was were when who will with after before who's
+""".split())
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall((text or '').lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+def _buckets(tokens):
+    """Stable hash of each token into the bucket space (crc32, not hash(), so runs agree)"""
+    return np.fromiter((zlib.crc32(token.encode()) % HASH_BUCKETS for token in tokens), dtype=np.int64,
+                       count=len(tokens))
+
+
+class HashedTfidfVectorizer:
+    """
+    CPU-only text -> fixed-width float32 vector encoder
+
+    fit() needs one pass over the corpus to count document frequencies;
+    transform() is then stateless per document.
+    """
+
+    def __init__(self, dim=DIM, seed=SEED):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.positions = rng.integers(0, dim, size=(HASH_BUCKETS, SKETCH_WIDTH), dtype=np.int32)
+        self.signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=(HASH_BUCKETS, SKETCH_WIDTH))
+        self.idf = np.ones(HASH_BUCKETS, dtype=np.float32)
+
+    def fit(self, texts):
+        """
+        Count document frequencies over an iterable of overview strings
+
+        Returns:
+            HashedTfidfVectorizer: self
+        """
+        df = np.zeros(HASH_BUCKETS, dtype=np.int32)
+        n_docs = 0
+        for text in texts:
+            buckets = np.unique(_buckets(tokenize(text)))
+            df[buckets] += 1
+            n_docs += 1
+        self.idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        logger.info("Fitted IDF over %s overviews", n_docs)
+        return self
+
+    def transform_one(self, text):
+        """
+        Returns:
+            np.ndarray: L2-normalised float32 vector of length dim (zeros for empty text)
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        buckets, counts = np.unique(_buckets(tokenize(text)), return_counts=True)
+        if len(buckets) == 0:
+            return vector
+        weights = (1 + np.log(counts)).astype(np.float32) * self.idf[buckets]
+        np.add.at(vector, self.positions[buckets].ravel(), (self.signs[buckets] * weights[:, None]).ravel())
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def save(self, path):
+        np.save(path, self.idf)
+
+    def load_idf(self, path):
+        self.idf = np.load(path)
+        return self
+
+
+def iter_overviews(driver, fetch_size=10000):
+    """Stream (tmdb_id, overview) pairs for every movie with an overview"""
+    with driver.session(fetch_size=fetch_size) as session:
+        result = session.run(
+            "MATCH (m:Movie) WHERE m.overview IS NOT NULL AND m.overview <> '' "
+            "RETURN m.tmdb_id AS tmdb_id, m.overview AS overview ORDER BY m.tmdb_id"
+        )
+        for record in result:
+            yield record['tmdb_id'], record['overview']
+
+
+def build_vectors(documents, out_dir, dim=DIM):
+    """
+    Encode every overview into out_dir/vectors.f32 (memory-mappable)
+
+    Args:
+        documents (callable): Returns a fresh iterator of (tmdb_id, text);
+            called twice, once for IDF and once for encoding
+        out_dir (str): Output directory
+        dim (int): Vector width
+
+    Returns:
+        tuple: (ids np.ndarray, vectors np.memmap)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    vectorizer = HashedTfidfVectorizer(dim).fit(text for _, text in documents())
+    vectorizer.save(os.path.join(out_dir, 'idf.npy'))
+    ids = []
+    vectors_path = os.path.join(out_dir, 'vectors.f32')
+    with open(vectors_path, 'wb') as f:
+        for tmdb_id, text in documents():
+            f.write(vectorizer.transform_one(text).tobytes())
+            ids.append(tmdb_id)
+    ids = np.asarray(ids, dtype=np.int64)
+    np.save(os.path.join(out_dir, 'ids.npy'), ids)
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'dim': dim, 'count': len(ids)}, f)
+    logger.info("Wrote %s overview vectors to %s", len(ids), vectors_path)
+    return ids, open_vectors(out_dir)
+
+
+def open_vectors(out_dir):
+    """
+    Returns:
+        np.memmap: (count, dim) float32 vectors, read-only
+    """
+    with open(os.path.join(out_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    return np.memmap(os.path.join(out_dir, 'vectors.f32'), dtype=np.float32, mode='r',
+                     shape=(meta['count'], meta['dim']))
+
+
+def _spherical_kmeans(sample, n_lists, iterations=10, seed=SEED):
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty lists from random points so every list stays useful
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over L2-normalised vectors (cosine similarity)
+
+    Vectors are stored grouped by list, so scanning a list is one contiguous
+    slice.
+    """
+
+    def __init__(self, centroids, offsets, ids, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, ids, vectors, n_lists=None, sample_size=100_000, block_size=65536, out_dir=None):
+        """
+        Train centroids on a sample and assign every vector to its closest list
+
+        Args:
+            ids (np.ndarray): tmdb_id per vector row
+            vectors (np.ndarray): (n, dim) float32, possibly a memmap
+            n_lists (int): Number of inverted lists (default ~sqrt(n))
+            sample_size (int): Vectors used to train centroids
+            block_size (int): Rows assigned per matrix product, and copied
+                per step when grouping vectors by list
+            out_dir (str): Write the grouped vectors straight to
+                out_dir/ivf_vectors.f32 (a memmap) instead of holding them
+                in memory
+
+        Returns:
+            IVFIndex
+        """
+        n = len(ids)
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(SEED)
+        sample_rows = np.sort(rng.choice(n, min(n, sample_size), replace=False))
+        centroids = _spherical_kmeans(np.asarray(vectors[sample_rows]), min(n_lists, len(sample_rows)))
+        assignment = np.empty(n, dtype=np.int32)
+        for start in range(0, n, block_size):
+            block = np.asarray(vectors[start:start + block_size])
+            assignment[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=offsets[1:])
+        shape = (n, vectors.shape[1])
+        if out_dir:
+            grouped = np.memmap(os.path.join(out_dir, 'ivf_vectors.f32'), dtype=np.float32, mode='w+', shape=shape)
+        else:
+            grouped = np.empty(shape, dtype=np.float32)
+        for start in range(0, n, block_size):
+            grouped[start:start + block_size] = vectors[order[start:start + block_size]]
+        logger.info("Built IVF index: %s vectors in %s lists", n, len(centroids))
+        return cls(centroids, offsets, np.asarray(ids)[order], grouped)
+
+    def search(self, query, k=10, nprobe=8):
+        """
+        Approximate top-k by cosine similarity
+
+        Args:
+            query (np.ndarray): L2-normalised float32 vector
+            k (int): Results to return
+            nprobe (int): Inverted lists scanned
+
+        Returns:
+            tuple: (tmdb_ids, scores) best first
+        """
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        # Each list is a contiguous slice, so scan it without a gather
+        slices = [slice(self.offsets[i], self.offsets[i + 1]) for i in lists if self.offsets[i + 1] > self.offsets[i]]
+        if not slices:
+            return self.ids[:0], np.zeros(0, dtype=np.float32)
+        scores = np.concatenate([self.vectors[s] @ query for s in slices])
+        rows = np.concatenate([np.arange(s.start, s.stop) for s in slices])
+        top = min(k, len(scores))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return self.ids[rows[best]], scores[best]
+
+    def save(self, out_dir):
+        np.savez(os.path.join(out_dir, 'ivf.npz'), centroids=self.centroids, offsets=self.offsets, ids=self.ids)
+        path = os.path.join(out_dir, 'ivf_vectors.f32')
+        if isinstance(self.vectors, np.memmap) and os.path.abspath(self.vectors.filename) == os.path.abspath(path):
+            self.vectors.flush()  # built with out_dir: already written in place
+        else:
+            self.vectors.tofile(path)
+
+    @classmethod
+    def load(cls, out_dir):
+        with np.load(os.path.join(out_dir, 'ivf.npz')) as archive:
+            centroids, offsets, ids = archive['centroids'], archive['offsets'], archive['ids']
+        vectors = np.memmap(os.path.join(out_dir, 'ivf_vectors.f32'), dtype=np.float32, mode='r',
+                            shape=(len(ids), centroids.shape[1]))
+        return cls(centroids, offsets, ids, vectors)
+
+
+def brute_force_search(vectors, ids, query, k=10):
+    """Exact top-k by cosine similarity, for recall measurement"""
+    scores = np.asarray(vectors) @ query
+    top = min(k, len(scores))
+    best = np.argpartition(-scores, top - 1)[:top]
+    best = best[np.argsort(-scores[best])]
+    return ids[best], scores[best]
+
+
+def measure_recall(index, ids, vectors, queries=1000, k=10, nprobe=8, seed=SEED):
+    """
+    Recall@k of the IVF index against brute force on sampled stored vectors
+
+    Returns:
+        dict: recall, mean and p99 latency (ms) for ANN and brute force
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(ids), min(queries, len(ids)), replace=False)
+    dense = np.asarray(vectors)
+    hits = 0
+    total = 0
+    ann_times, exact_times = [], []
+    for row in rows:
+        query = np.asarray(vectors[row])
+        start = time.perf_counter()
+        ann_ids, _ = index.search(query, k, nprobe)
+        ann_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        exact_ids, _ = brute_force_search(dense, ids, query, k)
+        exact_times.append(time.perf_counter() - start)
+        hits += len(np.intersect1d(ann_ids, exact_ids))
+        total += len(exact_ids)
+    return {
+        'queries': len(rows),
+        'k': k,
+        'nprobe': nprobe,
+        'recall': hits / total if total else 0.0,
+        'ann_ms_mean': 1000 * float(np.mean(ann_times)),
+        'ann_ms_p99': 1000 * float(np.percentile(ann_times, 99)),
+        'exact_ms_mean': 1000 * float(np.mean(exact_times)),
+        'exact_ms_p99': 1000 * float(np.percentile(exact_times, 99)),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Overview-text similarity index")
+    parser.add_argument('command', choices=['build', 'query', 'recall'])
+    parser.add_argument('--out', default='data/overview')
+    parser.add_argument('--lists', type=int, help="IVF lists (default sqrt(n))")
+    parser.add_argument('--movie', type=int, help="tmdb_id to query with")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=1000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'build':
+        driver = get_driver()
+        try:
+            ids, vectors = build_vectors(lambda: iter_overviews(driver), args.out)
+        finally:
+            driver.close()
+        IVFIndex.build(ids, vectors, args.lists, out_dir=args.out).save(args.out)
+        return
+    index = IVFIndex.load(args.out)
+    ids = np.load(os.path.join(args.out, 'ids.npy'))
+    vectors = open_vectors(args.out)
+    if args.command == 'query':
+        row = np.searchsorted(ids, args.movie)
+        if row >= len(ids) or ids[row] != args.movie:
+            print(f"Movie {args.movie} has no overview vector")
+            return
+        for tmdb_id, score in zip(*index.search(np.asarray(vectors[row]), args.k + 1, args.nprobe)):
+            if tmdb_id != args.movie:
+                print(f"{tmdb_id:>10}  {score:.3f}")
+    else:
+        print(json.dumps(measure_recall(index, ids, vectors, args.queries, args.k, args.nprobe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
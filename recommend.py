@@ -0,0 +1,334 @@
+"""
+Recommendation queries with an in-process LRU/TTL result cache
+
+Every result is cached under (query, key, k) together with the graph
+entities it was computed from: the seed movie, the movies returned, and
+for cast/director queries the seed's people; genre entries are tagged
+with the genre name. neo4j_client reports each successful write through
+register_write_listener(), and only entries tagged with a touched entity
+are dropped. A written Movie node is reported together with its genres and
+people, so a rating change reaches the genre, director and cast entries it
+can reorder even when the movie is not in them yet. Writes made by other processes
+are not seen here; the TTL bounds how stale those can get.
+
+Usage:
+    from recommend import recommend_similar, by_same_director, cache_stats
+    recommend_similar(550, k=10)
+    cache_stats()['hit_rate']
+"""
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from config import RECOMMEND_CACHE_ENTRIES, RECOMMEND_CACHE_ROWS, RECOMMEND_CACHE_TTL
+from logger import setup_logger
+from neo4j_client import get_driver, register_write_listener, unregister_write_listener
+
+
+logger = setup_logger(__name__)
+
+SIMILAR_QUERY = """
+MATCH (m:Movie {tmdb_id: $key})-[r:SIMILAR_TO]->(o:Movie)
+RETURN o.tmdb_id AS tmdb_id, o.title AS title, r.score AS score
+ORDER BY score DESC
+LIMIT $k
+"""
+
+DIRECTOR_QUERY = """
+MATCH (m:Movie {tmdb_id: $key})<-[:DIRECTED]-(p:Person)-[:DIRECTED]->(o:Movie)
+WHERE o <> m
+RETURN o.tmdb_id AS tmdb_id, o.title AS title, count(DISTINCT p) AS score
+ORDER BY score DESC, o.rating DESC
+LIMIT $k
+"""
+
+CAST_QUERY = """
+MATCH (m:Movie {tmdb_id: $key})<-[:ACTED_IN]-(p:Person)-[:ACTED_IN]->(o:Movie)
+WHERE o <> m
+RETURN o.tmdb_id AS tmdb_id, o.title AS title, count(DISTINCT p) AS score
+ORDER BY score DESC, o.rating DESC
+LIMIT $k
+"""
+
+GENRE_QUERY = """
+MATCH (g:Genre {name: $key})<-[r:IN_GENRE]-(o:Movie)
+WHERE o.rating IS NOT NULL
+RETURN o.tmdb_id AS tmdb_id, o.title AS title, o.rating AS score
+ORDER BY score DESC
+LIMIT $k
+"""
+
+DIRECTORS_OF_QUERY = "MATCH (:Movie {tmdb_id: $key})<-[:DIRECTED]-(p:Person) RETURN p.tmdb_id AS id"
+CAST_OF_QUERY = "MATCH (:Movie {tmdb_id: $key})<-[:ACTED_IN]-(p:Person) RETURN p.tmdb_id AS id"
+
+# query name -> (result query, seed entity kind, query for the people the result depends on)
+QUERIES = {
+    'similar': (SIMILAR_QUERY, 'movie', None),
+    'director': (DIRECTOR_QUERY, 'movie', DIRECTORS_OF_QUERY),
+    'cast': (CAST_QUERY, 'movie', CAST_OF_QUERY),
+    'genre': (GENRE_QUERY, 'genre', None),
+}
+
+
+class RecommendationCache:
+    """
+    Thread-safe LRU cache with a TTL, bounded by entry count and total rows
+
+    Each entry carries a set of entity tags; invalidate(tags) drops every
+    entry sharing a tag. A fill that raced with an invalidation of one of
+    its tags is discarded rather than cached stale.
+    """
+
+    def __init__(self, max_entries=RECOMMEND_CACHE_ENTRIES, max_rows=RECOMMEND_CACHE_ROWS, ttl=RECOMMEND_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, rows, tags)
+        self._by_tag = {}  # tag -> set of keys
+        self._rows = 0
+        self._version = 0
+        self._recent = deque(maxlen=1024)  # (version, tags) of recent invalidations
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: Cached rows, or None on a miss or expired entry
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def version(self):
+        """Token to pass to put() so fills that raced an invalidation are dropped"""
+        with self._lock:
+            return self._version
+
+    def put(self, key, rows, tags, version):
+        """
+        Store rows computed from the graph as of version()
+
+        Args:
+            key (tuple): Cache key
+            rows (tuple): Result rows
+            tags (set): Entities the result depends on
+            version (int): Value of version() taken before the query ran
+        """
+        with self._lock:
+            if self._version != version:
+                stale = self._version - version > len(self._recent)
+                stale = stale or any(v > version and tags & touched for v, touched in self._recent)
+                if stale:
+                    return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, rows, tags)
+            self._rows += len(rows)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        """
+        Drop every entry that depends on any of the given entities
+
+        Returns:
+            int: Entries removed
+        """
+        tags = frozenset(tags)
+        with self._lock:
+            self._version += 1
+            self._recent.append((self._version, tags))
+            keys = set()
+            for tag in tags:
+                keys |= self._by_tag.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._recent.clear()
+            self._entries.clear()
+            self._by_tag.clear()
+            self._rows = 0
+
+    def _remove(self, key):
+        _, rows, tags = self._entries.pop(key)
+        self._rows -= len(rows)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, expired, evictions, invalidations, hit_rate, entries, rows
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'rows': self._rows,
+            }
+
+
+class Recommender:
+    """
+    Cached recommendation queries against one driver
+
+    Registers a neo4j_client write listener on creation; call close() to
+    remove it.
+    """
+
+    def __init__(self, driver, cache=None):
+        self.driver = driver
+        self.cache = cache or RecommendationCache()
+        register_write_listener(self.cache.invalidate)
+
+    def close(self):
+        unregister_write_listener(self.cache.invalidate)
+
+    def _query(self, name, key, k):
+        cache_key = (name, key, k)
+        rows = self.cache.get(cache_key)
+        if rows is None:
+            version = self.cache.version()
+            rows, tags = self._run(name, key, k)
+            self.cache.put(cache_key, rows, tags, version)
+        return [dict(row) for row in rows]
+
+    def _run(self, name, key, k):
+        query, seed_kind, people_query = QUERIES[name]
+        tags = {(seed_kind, key)}
+        with self.driver.session() as session:
+            if people_query:
+                tags.update(('person', record['id']) for record in session.run(people_query, {'key': key}))
+            rows = tuple(
+                {'tmdb_id': record['tmdb_id'], 'title': record['title'], 'score': record['score']}
+                for record in session.run(query, {'key': key, 'k': k})
+            )
+        tags.update(('movie', row['tmdb_id']) for row in rows)
+        return rows, tags
+
+    def recommend_similar(self, tmdb_id, k=10):
+        """
+        Content-similar movies from precomputed SIMILAR_TO relationships
+
+        Args:
+            tmdb_id (int): Seed movie
+            k (int): Maximum results
+
+        Returns:
+            list: Dicts with tmdb_id, title and score, best first
+        """
+        return self._query('similar', tmdb_id, k)
+
+    def by_same_director(self, tmdb_id, k=10):
+        """Other movies by the seed's directors; score is the number of shared directors"""
+        return self._query('director', tmdb_id, k)
+
+    def by_shared_cast(self, tmdb_id, k=10):
+        """Movies sharing cast with the seed; score is the number of shared actors"""
+        return self._query('cast', tmdb_id, k)
+
+    def by_genre(self, genre_name, k=10):
+        """Top-rated movies in a genre; score is the movie rating"""
+        return self._query('genre', genre_name, k)
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+
+def get_recommender():
+    """
+    Return the process-wide Recommender, creating it on first use
+
+    Returns:
+        Recommender: Shared recommender
+    """
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = Recommender(get_driver())
+    return _recommender
+
+
+def recommend_similar(tmdb_id, k=10):
+    return get_recommender().recommend_similar(tmdb_id, k)
+
+
+def by_same_director(tmdb_id, k=10):
+    return get_recommender().by_same_director(tmdb_id, k)
+
+
+def by_shared_cast(tmdb_id, k=10):
+    return get_recommender().by_shared_cast(tmdb_id, k)
+
+
+def by_genre(genre_name, k=10):
+    return get_recommender().by_genre(genre_name, k)
+
+
+def cache_stats():
+    return get_recommender().cache.stats()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query cached movie recommendations")
+    parser.add_argument('query', choices=sorted(QUERIES))
+    parser.add_argument('key', help="tmdb_id, or a genre name for the genre query")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=1, help="run the query several times to exercise the cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    key = args.key if args.query == 'genre' else int(args.key)
+    recommender = get_recommender()
+    try:
+        for _ in range(args.repeat):
+            rows = recommender._query(args.query, key, args.k)
+        for row in rows:
+            print(f"{row['tmdb_id']:>10}  {row['score']!s:>8}  {row['title']}")
+        print(json.dumps(recommender.cache.stats(), indent=2))
+    finally:
+        recommender.close()
+        recommender.driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Drain failed movies from the work-state store with backoff
+
+Each failed movie is retried once its backoff has elapsed (see
+WorkStateStore.mark_failed) until it succeeds or runs out of attempts.
+
+Usage:
+    python -m retry_worker                  # one pass over due failures
+    python -m retry_worker --follow         # keep going until nothing is retryable
+"""
+import argparse
+import time
+from ingest import IngestPipeline, print_summary
+from logger import setup_logger
+from neo4j_client import get_driver
+from work_state import get_store
+
+
+logger = setup_logger(__name__)
+
+
+def retry_failures(driver, state, max_attempts=5, follow=False, batch_limit=1000, **pipeline_options):
+    """
+    Re-ingest failed movies whose retry time has come
+
+    Args:
+        driver: Neo4j driver
+        state (WorkStateStore): Store holding the failures
+        max_attempts (int): Movies with this many attempts are left alone
+        follow (bool): Sleep until the next scheduled retry and continue
+            until no retryable failures remain
+        batch_limit (int): Maximum movies per pipeline run
+        **pipeline_options: Passed to IngestPipeline
+
+    Returns:
+        dict: Totals of retried, written and still-failing movies
+    """
+    totals = {'retried': 0, 'written': 0, 'failed': 0}
+    while True:
+        movie_ids = state.due_failures(max_attempts, batch_limit)
+        if movie_ids:
+            logger.info("Retrying %s failed movies", len(movie_ids))
+            summary = IngestPipeline(movie_ids, driver, state=state, **pipeline_options).run()
+            totals['retried'] += len(movie_ids)
+            totals['written'] += summary['written']
+            totals['failed'] += summary['fetch_failed'] + summary['transform_failed'] + summary['write_failed']
+            continue
+        next_at = state.next_retry_at(max_attempts)
+        if not follow or next_at is None:
+            break
+        wait = max(0.0, next_at - time.time())
+        logger.info("Next retry due in %.0fs", wait)
+        time.sleep(wait)
+    return totals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Retry failed movies recorded in the work-state store")
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--follow', action='store_true', help="wait for backoffs and keep retrying")
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--write-workers', type=int, default=2)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    state = get_store()
+    driver = get_driver()
+    try:
+        totals = retry_failures(
+            driver, state,
+            max_attempts=args.max_attempts,
+            follow=args.follow,
+            fetch_workers=args.fetch_workers,
+            write_workers=args.write_workers,
+        )
+    finally:
+        driver.close()
+    totals.update(state.counts())
+    print_summary(totals)
+    return totals
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Schema bootstrap for the Movies graph
+
+Creates the uniqueness constraints (and their backing indexes) that every
+MERGE/MATCH in neo4j_client relies on, plus property indexes used by
+filtered reads. Safe to run repeatedly.
+
+Usage:
+    python -m schema            # create constraints and indexes
+    python -m schema --check    # also EXPLAIN every write query
+"""
+import argparse
+from graph_writer import PERSON_EDGES_QUERY
+from logger import setup_logger
+from neo4j_client import (
+    ACTED_IN_BATCH_QUERY,
+    ACTED_IN_QUERY,
+    CLEAR_SIMILAR_TO_BATCH_QUERY,
+    DIRECTED_BATCH_QUERY,
+    DIRECTED_QUERY,
+    GENRE_BATCH_QUERY,
+    GENRE_QUERY,
+    IN_GENRE_BATCH_QUERY,
+    IN_GENRE_QUERY,
+    MOVIE_BATCH_QUERY,
+    MOVIE_QUERY,
+    PERSON_BATCH_QUERY,
+    PERSON_QUERY,
+    PRODUCED_BY_BATCH_QUERY,
+    PRODUCED_BY_QUERY,
+    SIMILAR_TO_BATCH_QUERY,
+    STUDIO_BATCH_QUERY,
+    STUDIO_QUERY,
+    get_driver,
+)
+
+
+logger = setup_logger(__name__)
+
+CONSTRAINTS = {
+    'movie_tmdb_id': "CREATE CONSTRAINT movie_tmdb_id IF NOT EXISTS FOR (m:Movie) REQUIRE m.tmdb_id IS UNIQUE",
+    'person_tmdb_id': "CREATE CONSTRAINT person_tmdb_id IF NOT EXISTS FOR (p:Person) REQUIRE p.tmdb_id IS UNIQUE",
+    'genre_name': "CREATE CONSTRAINT genre_name IF NOT EXISTS FOR (g:Genre) REQUIRE g.name IS UNIQUE",
+    'studio_id': "CREATE CONSTRAINT studio_id IF NOT EXISTS FOR (s:Studio) REQUIRE s.id IS UNIQUE",
+}
+
+INDEXES = {
+    'movie_release_year': "CREATE INDEX movie_release_year IF NOT EXISTS FOR (m:Movie) ON (m.release_year)",
+    'movie_rating': "CREATE INDEX movie_rating IF NOT EXISTS FOR (m:Movie) ON (m.rating)",
+}
+
+# Plan operators that mean a lookup is not using an index
+SCAN_OPERATORS = ('NodeByLabelScan', 'AllNodesScan')
+
+# Write queries checked by check_schema(), with one representative row each
+WRITE_QUERIES = {
+    'movie_nodes': (MOVIE_BATCH_QUERY, {
+        'tmdb_id': 550, 'title': 'Fight Club', 'rating': 8.4, 'release_year': 1999,
+        'budget': 0, 'revenue': 0, 'overview': '', 'poster_url': None,
+    }),
+    'person_nodes': (PERSON_BATCH_QUERY, {'tmdb_id': 819, 'name': 'Edward Norton', 'profile_url': None}),
+    'genre_nodes': (GENRE_BATCH_QUERY, {'name': 'Drama'}),
+    'studio_nodes': (STUDIO_BATCH_QUERY, {'id': 711, 'name': 'Fox 2000 Pictures'}),
+    'acted_in': (ACTED_IN_BATCH_QUERY, {'person_id': 819, 'movie_id': 550, 'character': 'Narrator', 'order': 0}),
+    'directed': (DIRECTED_BATCH_QUERY, {'person_id': 7467, 'movie_id': 550}),
+    'in_genre': (IN_GENRE_BATCH_QUERY, {'movie_id': 550, 'genre_name': 'Drama', 'is_primary': True}),
+    'produced_by': (PRODUCED_BY_BATCH_QUERY, {'studio_id': 711, 'movie_id': 550}),
+    'person_edges': (PERSON_EDGES_QUERY, {
+        'person_id': 819, 'movie_id': 550, 'directed': False, 'roles': [{'character': 'Narrator', 'order': 0}],
+    }),
+    'similar_to': (SIMILAR_TO_BATCH_QUERY, {'movie_id': 550, 'other_id': 807, 'score': 0.5}),
+    'similar_to_clear': (CLEAR_SIMILAR_TO_BATCH_QUERY, {'movie_id': 550}),
+}
+
+# Single-entity creator queries, with their parameters (not a $rows list)
+SINGLE_WRITE_QUERIES = {
+    'movie_node': (MOVIE_QUERY, dict(WRITE_QUERIES['movie_nodes'][1], content_hash='')),
+    'person_node': (PERSON_QUERY, dict(WRITE_QUERIES['person_nodes'][1], content_hash='')),
+    'genre_node': (GENRE_QUERY, WRITE_QUERIES['genre_nodes'][1]),
+    'studio_node': (STUDIO_QUERY, WRITE_QUERIES['studio_nodes'][1]),
+    'acted_in_single': (ACTED_IN_QUERY, WRITE_QUERIES['acted_in'][1]),
+    'directed_single': (DIRECTED_QUERY, WRITE_QUERIES['directed'][1]),
+    'in_genre_single': (IN_GENRE_QUERY, WRITE_QUERIES['in_genre'][1]),
+    'produced_by_single': (PRODUCED_BY_QUERY, WRITE_QUERIES['produced_by'][1]),
+}
+
+
+def ensure_schema(driver, wait_seconds=300):
+    """
+    Create the uniqueness constraints and indexes if they don't exist
+
+    Args:
+        driver: Neo4j driver
+        wait_seconds (int): How long to wait for new indexes to come online
+
+    Returns:
+        list: Names of the constraints and indexes now present
+    """
+    with driver.session() as session:
+        for name, statement in list(CONSTRAINTS.items()) + list(INDEXES.items()):
+            session.run(statement).consume()
+            logger.debug("Ensured %s", name)
+        session.run("CALL db.awaitIndexes($seconds)", {'seconds': wait_seconds}).consume()
+        present = {record['name'] for record in session.run("SHOW INDEXES YIELD name")}
+        present |= {record['name'] for record in session.run("SHOW CONSTRAINTS YIELD name")}
+    missing = [name for name in list(CONSTRAINTS) + list(INDEXES) if name not in present]
+    if missing:
+        raise RuntimeError(f"Schema bootstrap failed, missing: {', '.join(missing)}")
+    logger.info("Schema ready: %s constraints, %s indexes", len(CONSTRAINTS), len(INDEXES))
+    return sorted(present)
+
+
+def _scan_operators(plan):
+    """Yield every label/all-nodes scan operator in an EXPLAIN plan tree"""
+    operator = plan.get('operatorType', '').split('@')[0]
+    if operator in SCAN_OPERATORS:
+        yield operator
+    for child in plan.get('children', []):
+        yield from _scan_operators(child)
+
+
+def check_schema(driver):
+    """
+    EXPLAIN every write query, batch and single-entity, and fail if any
+    plan falls back to a scan
+
+    Args:
+        driver: Neo4j driver
+
+    Returns:
+        dict: query name -> list of scan operators (all empty on success)
+
+    Raises:
+        RuntimeError: If any write query plans a label or all-nodes scan
+    """
+    findings = {}
+    with driver.session() as session:
+        checks = [(name, query, {'rows': [row]}) for name, (query, row) in WRITE_QUERIES.items()]
+        checks += [(name, query, parameters) for name, (query, parameters) in SINGLE_WRITE_QUERIES.items()]
+        for name, query, parameters in checks:
+            summary = session.run("EXPLAIN " + query, parameters).consume()
+            findings[name] = list(_scan_operators(summary.plan or {}))
+    offenders = {name: ops for name, ops in findings.items() if ops}
+    if offenders:
+        details = '; '.join(f"{name}: {', '.join(ops)}" for name, ops in offenders.items())
+        logger.error("Write queries fall back to scans: %s", details)
+        raise RuntimeError(f"Write queries fall back to scans: {details}")
+    logger.info("All %s write queries use index lookups", len(findings))
+    return findings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create the graph schema and verify write query plans")
+    parser.add_argument('--check', action='store_true', help="EXPLAIN each write query and fail on label scans")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    driver = get_driver()
+    try:
+        ensure_schema(driver)
+        if args.check:
+            check_schema(driver)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
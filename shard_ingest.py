@@ -0,0 +1,525 @@
+"""
+Sharded ingest: many worker processes, on one or more machines, draining a
+shared queue of movie IDs
+
+The queue is a SQLite file. Workers lease IDs in small batches, feed them
+to their own IngestPipeline and mark them done once written. Each worker
+heartbeats every few seconds, which both renews its leases and announces it
+as live; leases of a worker that stops heartbeating expire after
+SHARD_LEASE_SECONDS and go back to the queue for someone else. An ID is
+only fetched twice if its worker stalls for longer than the lease.
+
+The TMDB budget (--total-rate, default TMDB_RATE_LIMIT) is split evenly
+between live workers: at every heartbeat each worker sets its client's
+token bucket to total_rate / live_workers, so adding a process or a node
+rebalances everyone within one heartbeat.
+
+For several machines, put the queue on shared storage and pass
+--shared-storage: SQLite's WAL mode needs shared memory, so the queue then
+uses a rollback journal and relies on the file system's locks (which must
+work, e.g. NFSv4 with locking enabled).
+
+Usage:
+    python -m shard_ingest seed --id-file data/discovered_ids.json.gz
+    python -m shard_ingest run --processes 8           # on every node
+    python -m shard_ingest status
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from config import SHARD_LEASE_SECONDS, SHARD_QUEUE_PATH, TMDB_RATE_LIMIT
+from ingest import IngestPipeline
+from logger import setup_logger
+from neo4j_client import get_driver
+from schema import ensure_schema
+from tmdb_client import iter_popular_movie_ids
+from tmdb_export_ids import iter_export_ids
+from tmdb_http import get_client
+
+
+logger = setup_logger(__name__)
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class ShardQueue:
+    """
+    Durable queue of movie IDs with per-worker leases, backed by SQLite
+
+    Each movie is queued, leased (to one worker, until lease_expires), done
+    or failed (out of attempts). Failed attempts are queued again after a
+    backoff. Safe to share between threads; every process opens its own.
+
+    Args:
+        path (str): SQLite file, shared by every worker
+        lease_seconds (float): How long a lease lasts without a heartbeat
+        shared_storage (bool): Use a rollback journal instead of WAL, for
+            files on network storage
+        retry_base (float): Delay before the first retry of a failed movie
+    """
+
+    def __init__(self, path=SHARD_QUEUE_PATH, lease_seconds=SHARD_LEASE_SECONDS, shared_storage=False,
+                 retry_base=30.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_base = retry_base
+        self._lock = threading.Lock()
+        # Autocommit, so lease() can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=" + ("DELETE" if shared_storage else "WAL"))
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shard_queue (
+                movie_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # lease_expires doubles as "not before" for queued retries
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shard_queue_status ON shard_queue (status, lease_expires)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shard_queue_worker ON shard_queue (worker, status)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shard_workers (
+                worker TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )
+        """)
+
+    def enqueue(self, movie_ids, chunk_size=10000):
+        """
+        Add movies to the queue; movies already queued keep their state
+
+        Args:
+            movie_ids: Iterable of TMDB movie IDs (consumed lazily)
+            chunk_size (int): IDs inserted per transaction
+
+        Returns:
+            int: Movies newly queued
+        """
+        added = 0
+        chunk = []
+        for movie_id in movie_ids:
+            chunk.append(movie_id)
+            if len(chunk) >= chunk_size:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+    def _insert(self, movie_ids):
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO shard_queue (movie_id, status, updated_at) VALUES (?, ?, ?)",
+                    [(movie_id, QUEUED, now) for movie_id in movie_ids],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._conn.total_changes - before
+
+    def lease(self, worker, limit):
+        """
+        Take up to limit movies, reclaiming expired leases first
+
+        Args:
+            worker (str): Worker ID the lease is recorded under
+            limit (int): Maximum movies to lease
+
+        Returns:
+            list: Leased movie IDs: fresh ones lowest first, then due retries
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                reclaimed = self._conn.execute(
+                    "UPDATE shard_queue SET status = ?, worker = NULL, lease_expires = 0, updated_at = ? "
+                    "WHERE status = ? AND lease_expires < ?",
+                    (QUEUED, now, LEASED, now),
+                ).rowcount
+                movie_ids = [row[0] for row in self._conn.execute(
+                    "SELECT movie_id FROM shard_queue WHERE status = ? AND lease_expires <= ? "
+                    "ORDER BY lease_expires, movie_id LIMIT ?",  # index order, no sort
+                    (QUEUED, now, limit),
+                )]
+                self._conn.executemany(
+                    "UPDATE shard_queue SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE movie_id = ?",
+                    [(LEASED, worker, now + self.lease_seconds, now, movie_id) for movie_id in movie_ids],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if reclaimed:
+            logger.warning("Reclaimed %d movies from expired leases", reclaimed)
+        return movie_ids
+
+    def complete(self, worker, movie_ids):
+        """Mark movies leased by worker as done"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE shard_queue SET status = ?, lease_expires = 0, last_error = NULL, updated_at = ? "
+                "WHERE movie_id = ? AND worker = ? AND status = ?",
+                [(DONE, now, movie_id, worker, LEASED) for movie_id in movie_ids],
+            )
+
+    def fail(self, worker, movie_id, error_message, max_attempts):
+        """
+        Give a failed movie back: queued again after a backoff, or failed
+        for good once it has been attempted max_attempts times
+
+        Args:
+            worker (str): Worker that held the lease
+            movie_id: TMDB movie ID that failed
+            error_message (str): Why it failed
+            max_attempts (int): Attempts before the movie is given up on
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM shard_queue WHERE movie_id = ? AND worker = ? AND status = ?",
+                (movie_id, worker, LEASED),
+            ).fetchone()
+            if row is None:  # lease lost to another worker meanwhile
+                return
+            attempts = row[0]
+            status = FAILED if attempts >= max_attempts else QUEUED
+            self._conn.execute(
+                "UPDATE shard_queue SET status = ?, worker = NULL, lease_expires = ?, last_error = ?, updated_at = ? "
+                "WHERE movie_id = ?",
+                (status, now + self.retry_base * (2 ** (attempts - 1)), str(error_message), now, movie_id),
+            )
+
+    def heartbeat(self, worker):
+        """
+        Renew worker's leases and record it as live
+
+        Returns:
+            int: Workers that heartbeated within the lease period, this one included
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO shard_workers (worker, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                    (worker, socket.gethostname(), os.getpid(), now, now),
+                )
+                self._conn.execute(
+                    "UPDATE shard_queue SET lease_expires = ? WHERE worker = ? AND status = ?",
+                    (now + self.lease_seconds, worker, LEASED),
+                )
+                live = self._conn.execute(
+                    "SELECT COUNT(*) FROM shard_workers WHERE heartbeat_at >= ?", (now - self.lease_seconds,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return live
+
+    def deregister(self, worker):
+        """Remove a worker that is exiting, so the others take over its rate share"""
+        with self._lock:
+            self._conn.execute("DELETE FROM shard_workers WHERE worker = ?", (worker,))
+
+    def outstanding(self):
+        """
+        Returns:
+            int: Movies queued or leased, i.e. not yet done or failed for good
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM shard_queue WHERE status IN (?, ?)", (QUEUED, LEASED)
+            ).fetchone()[0]
+
+    def counts(self):
+        """
+        Returns:
+            dict: status -> number of movies
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM shard_queue GROUP BY status").fetchall()
+        return dict(rows)
+
+    def workers(self):
+        """
+        Returns:
+            list: dicts with worker, host, pid, seconds since heartbeat and movies leased
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT w.worker, w.host, w.pid, w.heartbeat_at,
+                       (SELECT COUNT(*) FROM shard_queue q WHERE q.worker = w.worker AND q.status = ?)
+                FROM shard_workers w ORDER BY w.worker
+            """, (LEASED,)).fetchall()
+        return [{'worker': worker, 'host': host, 'pid': pid, 'heartbeat_age': round(now - heartbeat_at, 1),
+                 'leased': leased}
+                for worker, host, pid, heartbeat_at, leased in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _LeaseState:
+    """
+    IngestPipeline state adapter that reports outcomes to the shard queue
+
+    Written movies are completed; failed ones are handed back for retry.
+    """
+
+    def __init__(self, shard_queue, worker, max_attempts):
+        self.queue = shard_queue
+        self.worker = worker
+        self.max_attempts = max_attempts
+
+    def mark_pending(self, movie_ids):
+        pass
+
+    def mark_fetched(self, movie_ids):
+        pass
+
+    def mark_written(self, movie_ids):
+        self.queue.complete(self.worker, movie_ids)
+
+    def mark_failed(self, movie_id, error_message):
+        self.queue.fail(self.worker, movie_id, error_message, self.max_attempts)
+
+
+def _leased_ids(shard_queue, worker, lease_batch, poll_interval):
+    """
+    Yield leased movie IDs until the queue is drained
+
+    While other workers still hold leases, keep polling: if one of them dies
+    its movies come back once their leases expire.
+    """
+    while True:
+        movie_ids = shard_queue.lease(worker, lease_batch)
+        if movie_ids:
+            yield from movie_ids
+        elif shard_queue.outstanding():
+            time.sleep(poll_interval)
+        else:
+            return
+
+
+def _heartbeat(shard_queue, worker, total_rate, expected_workers, interval, stop):
+    """
+    Renew leases and rebalance this worker's share of the TMDB budget until stop is set
+
+    Until expected_workers are live the share assumes they are, so workers
+    that register first don't each start at (nearly) the whole budget.
+    """
+    share = None
+    while True:
+        try:
+            live = shard_queue.heartbeat(worker)
+            if live >= expected_workers:
+                expected_workers = 0
+            rate = total_rate / max(1, live, expected_workers)
+            if rate != share:
+                get_client().bucket.set_rate(rate)
+                logger.info("%d live workers: TMDB rate share is now %.2f requests/s", live, rate)
+                share = rate
+        except sqlite3.Error as e:
+            logger.error("Heartbeat failed: %s", e)
+        if stop.wait(interval):
+            return
+
+
+def run_worker(queue_path, total_rate, expected_workers=1, lease_seconds=SHARD_LEASE_SECONDS, shared_storage=False,
+               lease_batch=50, max_attempts=5, heartbeat_interval=None, poll_interval=5.0, **pipeline_options):
+    """
+    Drain the shard queue through one IngestPipeline (one worker process)
+
+    Args:
+        queue_path (str): Shard queue SQLite file
+        total_rate (float): TMDB requests/second shared by all live workers
+        expected_workers (int): Workers being started alongside this one;
+            the rate share starts at total_rate / expected_workers
+        lease_seconds (float): Lease length; leases are renewed every
+            heartbeat_interval (default: a fifth of it)
+        shared_storage (bool): The queue lives on network storage
+        lease_batch (int): Movies leased at a time
+        max_attempts (int): Attempts per movie before it is marked failed
+        poll_interval (float): Seconds between lease attempts while only
+            other workers hold movies
+        **pipeline_options: Passed to IngestPipeline; queue_size defaults
+            to lease_batch so a worker holds few more leases than it is
+            working on
+
+    Returns:
+        dict: IngestPipeline summary plus the worker ID
+    """
+    pipeline_options.setdefault('queue_size', lease_batch)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    shard_queue = ShardQueue(queue_path, lease_seconds, shared_storage)
+    get_client().bucket.set_rate(total_rate / max(1, expected_workers))
+    stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, name='heartbeat', daemon=True,
+        args=(shard_queue, worker, total_rate, expected_workers, heartbeat_interval or lease_seconds / 5, stop),
+    )
+    heartbeat.start()
+    driver = get_driver()
+    try:
+        logger.info("Shard worker %s started", worker)
+        pipeline = IngestPipeline(
+            _leased_ids(shard_queue, worker, lease_batch, poll_interval),
+            driver,
+            state=_LeaseState(shard_queue, worker, max_attempts),
+            bootstrap_schema=False,
+            **pipeline_options,
+        )
+        summary = pipeline.run()
+    finally:
+        stop.set()
+        heartbeat.join()
+        shard_queue.deregister(worker)
+        shard_queue.close()
+        driver.close()
+    summary['worker'] = worker
+    logger.info("Shard worker %s finished: %d written", worker, summary['written'])
+    return summary
+
+
+def run_shards(queue_path, processes, total_rate=TMDB_RATE_LIMIT, **worker_options):
+    """
+    Run worker processes on this machine until the queue is drained
+
+    Other machines may run their own run_shards() against the same queue;
+    the rate budget is then split across all of them.
+
+    Args:
+        queue_path (str): Shard queue SQLite file
+        processes (int): Worker processes to start
+        total_rate (float): TMDB requests/second for all workers on all machines
+        **worker_options: Passed to run_worker
+
+    Returns:
+        dict: Summed pipeline counters, per-worker summaries and movies/second
+    """
+    start = time.monotonic()
+    # spawn: a forked child would inherit the logger's and metrics' threads mid-flight
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(run_worker, queue_path, total_rate, expected_workers=processes, **worker_options)
+            for _ in range(processes)
+        ]
+        summaries = [future.result() for future in futures]
+    elapsed = time.monotonic() - start
+    totals = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if isinstance(value, int) and key != 'elapsed_seconds':
+                totals[key] = totals.get(key, 0) + value
+    totals['elapsed_seconds'] = round(elapsed, 3)
+    totals['movies_per_second'] = round(totals.get('written', 0) / elapsed, 2) if elapsed else 0.0
+    totals['workers'] = summaries
+    return totals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded multi-process, multi-node ingest through a shared queue")
+    parser.add_argument('command', choices=('seed', 'run', 'status'))
+    parser.add_argument('--queue', default=SHARD_QUEUE_PATH, help="shard queue SQLite file")
+    parser.add_argument('--shared-storage', action='store_true',
+                        help="the queue is on network storage used by several machines (disables WAL)")
+    parser.add_argument('--lease-seconds', type=float, default=SHARD_LEASE_SECONDS)
+    # seed
+    parser.add_argument('--count', type=int,
+                        help="movies to queue (default: 100 popular movies, or every ID in --id-file)")
+    parser.add_argument('--id-file', help="queue IDs from a TMDB daily export or discovery.py output (.json.gz)")
+    parser.add_argument('--min-popularity', type=float, default=0.0)
+    parser.add_argument('--include-adult', action='store_true')
+    # run
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--total-rate', type=float, default=TMDB_RATE_LIMIT,
+                        help="TMDB requests/second shared by every worker on every machine")
+    parser.add_argument('--lease-batch', type=int, default=50, help="movies leased at a time per worker")
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--fetch-workers', type=int, default=4, help="fetch threads per process")
+    parser.add_argument('--write-workers', type=int, default=2, help="write threads per process")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--transactional', action='store_true', help="see ingest --transactional")
+    parser.add_argument('--skip-schema', action='store_true', help="don't run ensure_schema() before starting")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'seed':
+        if args.id_file:
+            movie_ids = iter_export_ids(args.id_file, args.min_popularity, args.include_adult, limit=args.count)
+        else:
+            movie_ids = iter_popular_movie_ids(args.count if args.count is not None else 100)
+        shard_queue = ShardQueue(args.queue, args.lease_seconds, args.shared_storage)
+        try:
+            added = shard_queue.enqueue(movie_ids)
+            logger.info("Queued %d new movies", added)
+            print(json.dumps(shard_queue.counts(), indent=2))
+        finally:
+            shard_queue.close()
+    elif args.command == 'status':
+        shard_queue = ShardQueue(args.queue, args.lease_seconds, args.shared_storage)
+        try:
+            print(json.dumps({'movies': shard_queue.counts(), 'workers': shard_queue.workers()}, indent=2))
+        finally:
+            shard_queue.close()
+    else:
+        if not args.skip_schema:
+            driver = get_driver()
+            try:
+                ensure_schema(driver)
+            finally:
+                driver.close()
+        totals = run_shards(
+            args.queue,
+            args.processes,
+            total_rate=args.total_rate,
+            lease_seconds=args.lease_seconds,
+            shared_storage=args.shared_storage,
+            lease_batch=args.lease_batch,
+            max_attempts=args.max_attempts,
+            fetch_workers=args.fetch_workers,
+            write_workers=args.write_workers,
+            batch_size=args.batch_size,
+            transactional=args.transactional,
+        )
+        print(json.dumps(totals, indent=2))
+        return totals
+
+
+if __name__ == "__main__":
+    main()
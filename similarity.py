@@ -0,0 +1,309 @@
+"""
+Content-based "movies like X" from genres, cast, directors and studios
+
+Builds a sparse movie x feature matrix from a GraphProjection, applies
+BM25-style IDF weighting, L2-normalises the rows and computes cosine top-k
+neighbours for every movie with blocked sparse matrix products. Features in
+more than MAX_DF of the movies (genres, the largest studios) would make
+those products nearly dense, so candidates come from the rarer features
+only and the common ones are added back when scoring them. The result
+can be written back to Neo4j as (:Movie)-[:SIMILAR_TO {score}]->(:Movie) so
+serving a recommendation is a single indexed hop.
+
+Usage:
+    python -m similarity --projection data/projection.npz --k 20 --write
+"""
+import argparse
+import time
+import numpy as np
+import scipy.sparse as sp
+from graph_projection import GraphProjection, load_projection
+from logger import setup_logger
+from neo4j_client import get_driver, replace_similar_to_relationships_batch
+
+
+logger = setup_logger(__name__)
+
+# Relative weight of each feature group before IDF
+FEATURE_WEIGHTS = {
+    'genre_primary': 1.0,
+    'genre_secondary': 0.5,
+    'cast': 1.0,
+    'director': 1.5,
+    'studio': 0.75,
+}
+
+# Features in more than this fraction of movies (and at least MIN_DF_CAP
+# movies) are left out of the candidate products
+MAX_DF = 0.01
+MIN_DF_CAP = 1000
+# Upper bound on the entries of one block product (~16 bytes each)
+MAX_BLOCK_PAIRS = 5_000_000
+# Candidate pairs rescored with the common features at once
+RESCORE_CHUNK = 1_000_000
+
+
+def _cast_weight(order):
+    """Lead roles count more than the end of the billing list"""
+    return 1.0 / np.sqrt(1.0 + np.maximum(order, 0))
+
+
+def build_feature_matrix(projection, weights=None):
+    """
+    Build the weighted movie x feature matrix
+
+    Columns are laid out as [genres | cast | directors | studios]; cast and
+    director columns are separate so directing and acting in a film are
+    different signals.
+
+    Args:
+        projection (GraphProjection): Loaded graph projection
+        weights (dict): Overrides for FEATURE_WEIGHTS
+
+    Returns:
+        scipy.sparse.csr_matrix: n_movies x n_features, float32, rows
+        L2-normalised after IDF weighting
+    """
+    w = dict(FEATURE_WEIGHTS)
+    if weights:
+        w.update(weights)
+    n_movies = projection.node_count('Movie')
+    n_genres = projection.node_count('Genre')
+    n_people = projection.node_count('Person')
+    n_studios = projection.node_count('Studio')
+
+    blocks = []
+    # IN_GENRE and PRODUCED_BY run Movie -> entity, so the forward CSR is already movie-major
+    genres = projection.forward['IN_GENRE']
+    genre_values = np.where(genres.data > 0, w['genre_primary'], w['genre_secondary']).astype(np.float32)
+    blocks.append(sp.csr_matrix((genre_values, genres.indices, genres.indptr), shape=(n_movies, n_genres)))
+
+    # ACTED_IN and DIRECTED run Person -> Movie, so use the reverse CSR
+    cast = projection.reverse['ACTED_IN']
+    cast_values = (w['cast'] * _cast_weight(cast.data)).astype(np.float32)
+    blocks.append(sp.csr_matrix((cast_values, cast.indices, cast.indptr), shape=(n_movies, n_people)))
+
+    directed = projection.reverse['DIRECTED']
+    director_values = np.full(len(directed.indices), w['director'], dtype=np.float32)
+    blocks.append(sp.csr_matrix((director_values, directed.indices, directed.indptr), shape=(n_movies, n_people)))
+
+    studios = projection.forward['PRODUCED_BY']
+    studio_values = np.full(len(studios.indices), w['studio'], dtype=np.float32)
+    blocks.append(sp.csr_matrix((studio_values, studios.indices, studios.indptr), shape=(n_movies, n_studios)))
+
+    matrix = sp.hstack(blocks, format='csr', dtype=np.float32)
+    matrix.sum_duplicates()
+
+    # BM25-style IDF: rare features (a character actor) outweigh common ones (Drama)
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1]).astype(np.float32)
+    idf = np.log1p((n_movies - df + 0.5) / (df + 0.5)).astype(np.float32)
+    matrix = matrix @ sp.diags(idf, format='csr', dtype=np.float32)
+
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1.astype(np.float32)
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0 / norms, format='csr', dtype=np.float32) @ matrix
+
+
+def _block_top_k(scores, row_offset, k):
+    """
+    Top-k columns per row of a sparse score block, excluding the diagonal
+
+    Returns:
+        tuple: (neighbors, values) arrays of shape (block_rows, k); missing
+        entries are -1 / 0
+    """
+    scores = scores.tocsr()
+    n_rows = scores.shape[0]
+    rows = np.repeat(np.arange(n_rows), np.diff(scores.indptr))
+    cols = scores.indices
+    data = scores.data
+    keep = cols != rows + row_offset
+    rows, cols, data = rows[keep], cols[keep], data[keep]
+
+    order = np.lexsort((-data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    rank = np.arange(len(rows)) - starts[rows]
+    top = rank < k
+
+    neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+    values = np.zeros((n_rows, k), dtype=np.float32)
+    neighbors[rows[top], rank[top]] = cols[top]
+    values[rows[top], rank[top]] = data[top]
+    return neighbors, values
+
+
+class SimilarityIndex:
+    """
+    Precomputed top-k cosine neighbours per movie
+
+    Attributes:
+        movie_ids (np.ndarray): tmdb_id per dense movie ID
+        neighbors (np.ndarray): (n_movies, k) int32 dense IDs, -1 padded
+        scores (np.ndarray): (n_movies, k) float32 cosine scores
+    """
+
+    def __init__(self, movie_ids, neighbors, scores):
+        self.movie_ids = movie_ids
+        self.neighbors = neighbors
+        self.scores = scores
+
+    def similar(self, tmdb_id, k=None):
+        """
+        Returns:
+            list: (tmdb_id, score) pairs, best first; empty for unknown movies
+        """
+        pos = np.searchsorted(self.movie_ids, tmdb_id)
+        if pos >= len(self.movie_ids) or self.movie_ids[pos] != tmdb_id:
+            return []
+        row = self.neighbors[pos][:k]
+        valid = row >= 0
+        return list(zip(self.movie_ids[row[valid]].tolist(), self.scores[pos][:k][valid].tolist()))
+
+    def edges(self, min_score=0.0, start=0, stop=None):
+        """
+        Yield (movie_tmdb_id, other_tmdb_id, score) tuples for rows start:stop
+
+        The tuples match replace_similar_to_relationships_batch().
+        """
+        stop = len(self.movie_ids) if stop is None else min(stop, len(self.movie_ids))
+        for i in range(start, stop):
+            movie_id = int(self.movie_ids[i])
+            for j, score in zip(self.neighbors[i].tolist(), self.scores[i].tolist()):
+                if j >= 0 and score > min_score:
+                    yield movie_id, int(self.movie_ids[j]), score
+
+    def save(self, path):
+        np.savez(path, movie_ids=self.movie_ids, neighbors=self.neighbors, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as archive:
+            return cls(archive['movie_ids'], archive['neighbors'], archive['scores'])
+
+
+def _block_bounds(pair_counts, block_size, max_pairs):
+    """Yield (start, stop) row ranges of at most block_size rows and about max_pairs product entries"""
+    n = len(pair_counts)
+    cumulative = np.cumsum(pair_counts)
+    start = 0
+    while start < n:
+        base = cumulative[start - 1] if start else 0
+        stop = int(np.searchsorted(cumulative, base + max_pairs, side='right'))
+        stop = min(max(stop, start + 1), start + block_size, n)
+        yield start, stop
+        start = stop
+
+
+def compute_top_k(features, k=20, block_size=256, max_df=MAX_DF, max_pairs=MAX_BLOCK_PAIRS):
+    """
+    Cosine top-k neighbours for every row of a row-normalised matrix
+
+    Features present in more than max_df of the rows are split off: the
+    candidate product rare[block] @ rare.T uses the others only, and each
+    candidate's score then adds its dot product over the common features,
+    so candidate scores are exact. Blocks are cut so the product has at
+    most about max_pairs entries (each row's bound is the summed document
+    frequency of its rare features), which keeps peak memory independent
+    of n_movies. Pairs sharing only common features are not candidates,
+    and a movie with no rare features gets no neighbours.
+
+    Args:
+        features (scipy.sparse.csr_matrix): L2-normalised rows
+        k (int): Neighbours per movie
+        block_size (int): Maximum rows per sparse product
+        max_df (float): Document-frequency fraction above which a feature
+            is common (never below MIN_DF_CAP rows)
+        max_pairs (int): Target entries per block product
+
+    Returns:
+        tuple: (neighbors, scores) arrays of shape (n_rows, k)
+    """
+    n = features.shape[0]
+    df = np.bincount(features.indices, minlength=features.shape[1])
+    common = df > max(max_df * n, MIN_DF_CAP)
+    rare = features[:, np.flatnonzero(~common)].tocsr()
+    common_dense = features[:, np.flatnonzero(common)].toarray()
+    rare_t = rare.T.tocsr()
+    pair_counts = sp.csr_matrix((np.ones_like(rare.data), rare.indices, rare.indptr), shape=rare.shape) @ \
+        df[~common].astype(np.float64)
+    logger.info("Scoring %s common features (document frequency above %.0f) on candidates only",
+                int(common.sum()), max(max_df * n, MIN_DF_CAP))
+
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    start_time = time.monotonic()
+    for start, stop in _block_bounds(pair_counts, block_size, max_pairs):
+        candidates = (rare[start:stop] @ rare_t).tocoo()
+        data = candidates.data
+        if common_dense.shape[1]:
+            for i in range(0, len(data), RESCORE_CHUNK):
+                rows = candidates.row[i:i + RESCORE_CHUNK] + start
+                cols = candidates.col[i:i + RESCORE_CHUNK]
+                data[i:i + RESCORE_CHUNK] += np.einsum('ij,ij->i', common_dense[rows], common_dense[cols])
+        block_neighbors, block_scores = _block_top_k(candidates, start, k)
+        neighbors[start:stop] = block_neighbors
+        scores[start:stop] = block_scores
+    logger.info("Computed top-%s neighbours for %s movies in %.1fs", k, n, time.monotonic() - start_time)
+    return neighbors, scores
+
+
+def build_similarity_index(projection, k=20, block_size=256, weights=None, max_df=MAX_DF):
+    """
+    Returns:
+        SimilarityIndex: Top-k content neighbours for every movie in the projection
+    """
+    features = build_feature_matrix(projection, weights)
+    neighbors, scores = compute_top_k(features, k, block_size, max_df)
+    return SimilarityIndex(projection.keys['Movie'], neighbors, scores)
+
+
+def write_similar_to(driver, index, min_score=0.0, movies_per_batch=1000):
+    """
+    Replace every movie's SIMILAR_TO relationships with the index contents
+
+    Each batch of movies is cleared and rewritten in one transaction, so
+    readers never see a movie without neighbours.
+
+    Returns:
+        int: Relationships written
+    """
+    written = 0
+    movie_ids = index.movie_ids.tolist()
+    with driver.session() as session:
+        for start in range(0, len(movie_ids), movies_per_batch):
+            stop = start + movies_per_batch
+            edges = list(index.edges(min_score, start, stop))
+            written += sum(replace_similar_to_relationships_batch(session, movie_ids[start:stop], edges))
+    logger.info("Wrote %s SIMILAR_TO relationships", written)
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute content-based movie similarity")
+    parser.add_argument('--projection', help="load a saved projection (.npz) instead of reading Neo4j")
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--max-df', type=float, default=MAX_DF,
+                        help="features in more than this fraction of movies only rescore candidates")
+    parser.add_argument('--min-score', type=float, default=0.05)
+    parser.add_argument('--out', default='data/similarity.npz')
+    parser.add_argument('--write', action='store_true', help="write SIMILAR_TO relationships to Neo4j")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    driver = get_driver()
+    try:
+        projection = GraphProjection.load(args.projection) if args.projection else load_projection(driver)
+        index = build_similarity_index(projection, args.k, args.block_size, max_df=args.max_df)
+        index.save(args.out)
+        if args.write:
+            write_similar_to(driver, index, args.min_score)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
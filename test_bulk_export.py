@@ -0,0 +1,27 @@
+#test_bulk_export.py
+# Run with: python -m pytest test_bulk_export.py
+import csv
+import glob
+import os
+from bulk_export import BulkCsvExporter, import_command
+
+
+def test_multiline_overview_survives_the_csv(tmp_path):
+    out_dir = str(tmp_path)
+    overview = "First line of the plot.\r\nSecond line,\nwith a comma."
+    movie = {
+        'tmdb_id': 550, 'title': 'Fight Club', 'release_year': 1999, 'rating': 8.4,
+        'budget': 63000000, 'revenue': 100853753, 'overview': overview, 'poster_url': None,
+        'genres': [], 'studios': [], 'cast': [], 'directors': [],
+    }
+    with BulkCsvExporter(out_dir, {}) as exporter:
+        exporter.add_movie(movie)
+    [part] = glob.glob(os.path.join(out_dir, 'movies_part*.csv'))
+    with open(part, newline='') as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 1
+    assert rows[0][7] == overview
+
+
+def test_import_command_reads_multiline_fields(tmp_path):
+    assert '--multiline-fields=true' in import_command(str(tmp_path)).split()
@@ -1,5 +1,5 @@
 #test_logger.py
-from logger import setup_logger, log_failed_movie
+from logger import ROLLUP, setup_logger, log_failed_movie
 
 logger = setup_logger(__name__)
 
@@ -14,4 +14,5 @@ log_failed_movie(12345, "API rate limit exceeded")
 log_failed_movie(67890, "Network timeout")
 
 logger.info("Check logs/ folder for ingest.log")
-logger.info("Check data/ folder for failed_movies.txt")
\ No newline at end of file
+logger.info("Check data/work_state.sqlite for the failed movies")
+logger.info("Fetched movie %s (sampled when LOG_ROLLUP_INTERVAL > 0)", 550, extra=ROLLUP)
@@ -0,0 +1,87 @@
+#test_write_graph_batch.py
+# Run with: python -m pytest test_write_graph_batch.py
+from fingerprint import Fingerprints, set_fingerprints
+from neo4j_client import (
+    ACTED_IN_BATCH_QUERY,
+    PERSON_BATCH_QUERY,
+    register_write_listener,
+    unregister_write_listener,
+    write_graph_batch,
+)
+from transform import build_movie_graph, empty_graph, merge_graphs
+
+
+class _Result:
+    def consume(self):
+        return None
+
+
+class FailingSession:
+    """Session stand-in whose statements fail when fail(query, rows) is true"""
+
+    def __init__(self, fail):
+        self.fail = fail
+
+    def run(self, query, parameters=None):
+        if self.fail(query, (parameters or {}).get('rows', [])):
+            raise RuntimeError("statement failed")
+        return _Result()
+
+
+def _movie(tmdb_id, person_id):
+    return {
+        'tmdb_id': tmdb_id,
+        'title': f"Movie {tmdb_id}",
+        'genres': [18],
+        'studios': [],
+        'cast': [{'tmdb_id': person_id, 'name': f"Actor {person_id}", 'character': 'Lead', 'order': 0}],
+        'directors': [],
+    }
+
+
+def _batch(*movies):
+    graph = empty_graph()
+    for movie in movies:
+        merge_graphs(graph, build_movie_graph(movie, {18: 'Drama'}))
+    return graph
+
+
+def setup_function():
+    set_fingerprints(None)
+
+
+def test_failed_edge_chunk_fails_its_movie():
+    graph = _batch(_movie(1, 101), _movie(2, 102))
+    session = FailingSession(lambda query, rows: query == ACTED_IN_BATCH_QUERY and rows[0]['movie_id'] == 1)
+    results = write_graph_batch(session, graph, chunk_size=1)
+    assert results['acted_in'] == [False, True]
+    assert results['movies'] == [False, True]
+
+
+def test_failed_endpoint_node_fails_its_movie():
+    graph = _batch(_movie(1, 101))
+    results = write_graph_batch(FailingSession(lambda query, rows: query == PERSON_BATCH_QUERY), graph)
+    assert results['people'] == [False]
+    assert results['movies'] == [False]
+
+
+def test_movies_with_every_edge_written_succeed():
+    graph = _batch(_movie(1, 101), _movie(2, 102))
+    results = write_graph_batch(FailingSession(lambda query, rows: False), graph)
+    assert results['movies'] == [True, True]
+
+
+def test_rating_change_reports_genres_and_people():
+    set_fingerprints(Fingerprints())
+    session = FailingSession(lambda query, rows: False)
+    write_graph_batch(session, _batch(_movie(1, 101)))
+    changed = _movie(1, 101)
+    changed['rating'] = 9.5
+    touched = []
+    register_write_listener(touched.append)
+    try:
+        results = write_graph_batch(session, _batch(changed))
+    finally:
+        unregister_write_listener(touched.append)
+    assert results['acted_in'] == [True]
+    assert touched == [{('movie', 1), ('genre', 'Drama'), ('person', 101)}]
@@ -0,0 +1,253 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from config import TMDB_CACHE_MAX_MB, TMDB_CACHE_PATH
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+DAY = 24 * 60 * 60
+
+# Time-to-live per endpoint template, in seconds. 0 disables caching.
+DEFAULT_TTLS = {
+    "/genre/movie/list": 30 * DAY,
+    "/movie/{id}": 7 * DAY,
+    "/movie/{id}/credits": 7 * DAY,
+    "/movie/popular": 1 * DAY,
+    "/discover/movie": 1 * DAY,
+    "/movie/changes": 0,
+}
+DEFAULT_TTL = 1 * DAY
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+# Cache hits update accessed_at in batches, at most this many or this often
+ACCESS_FLUSH_ENTRIES = 500
+ACCESS_FLUSH_SECONDS = 30.0
+
+
+def endpoint_template(path):
+    """
+    Collapse numeric path segments so '/movie/550/credits' -> '/movie/{id}/credits'
+    """
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+def cache_key(path, params=None):
+    """
+    Build a stable cache key from an endpoint path and its query parameters
+
+    The API key is left out so rotating it doesn't invalidate the cache.
+    """
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key")
+    return path + "?" + "&".join(f"{k}={v}" for k, v in items)
+
+
+class TMDBCache:
+    """
+    SQLite-backed cache of raw TMDB response bodies
+
+    Entries expire per endpoint (see DEFAULT_TTLS). When the stored bodies
+    exceed max_bytes the least recently used entries are evicted. Safe to
+    share between threads, and between processes sharing the file: hits
+    record their access time in batches instead of taking the write lock
+    on every read, and the total size is kept in the file (cache_size) and
+    updated in the same transaction as each write.
+    """
+
+    def __init__(self, path=TMDB_CACHE_PATH, max_bytes=TMDB_CACHE_MAX_MB * 1024 * 1024, ttls=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._accessed = {}  # key -> access time not yet written
+        self._accessed_flushed = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("INSERT OR IGNORE INTO cache_size SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+        self._conn.commit()
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, path, params=None, allow_stale=False):
+        """
+        Look up a cached response
+
+        Args:
+            path (str): Endpoint path, e.g. '/movie/550'
+            params (dict): Query parameters of the request
+            allow_stale (bool): Return entries past their TTL too (counted
+                as stale hits); for offline clients, which can't refresh them
+
+        Returns:
+            bytes: Raw response body, or None on a miss or (unless
+            allow_stale) an expired entry
+        """
+        endpoint = endpoint_template(path)
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return None
+        key = cache_key(path, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > ttl:
+                if not allow_stale:
+                    self.expired += 1
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            self._accessed[key] = now
+            if (len(self._accessed) >= ACCESS_FLUSH_ENTRIES
+                    or time.monotonic() - self._accessed_flushed >= ACCESS_FLUSH_SECONDS):
+                self._flush_accessed()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def _flush_accessed(self):
+        """Write the batched access times (caller holds the lock and commits)"""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+        self._accessed_flushed = time.monotonic()
+
+    def get_json(self, path, params=None, allow_stale=False):
+        """Like get(), but decodes the body; returns None on a miss"""
+        body = self.get(path, params, allow_stale)
+        if body is None:
+            return None
+        return json.loads(body)
+
+    def put(self, path, params, body):
+        """
+        Store a raw response body, evicting LRU entries if over the size cap
+
+        Args:
+            path (str): Endpoint path
+            params (dict): Query parameters of the request
+            body (bytes): Raw response body
+        """
+        endpoint = endpoint_template(path)
+        if self.ttl_for(endpoint) <= 0:
+            return
+        key = cache_key(path, params)
+        now = time.time()
+        with self._lock:
+            # Take the write lock up front so no other process changes the total under us
+            self._conn.execute("BEGIN IMMEDIATE")
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body), now, now),
+            )
+            total = self._add_bytes(len(body) - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(total)
+            self._conn.commit()
+
+    def _add_bytes(self, delta):
+        """Adjust the shared size total in the open transaction; returns the new total"""
+        self._conn.execute("UPDATE cache_size SET total = total + ? WHERE id = 0", (delta,))
+        return self._conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def _evict(self, total):
+        """Drop least recently used entries until the cache is 90% of max_bytes"""
+        target = int(self.max_bytes * 0.9)
+        self._flush_accessed()
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        victims = []
+        freed = 0
+        for key, size in rows:
+            if total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._add_bytes(-freed)
+        self.evictions += len(victims)
+        logger.info("Evicted %s cached TMDB responses", len(victims))
+
+    def invalidate(self, path):
+        """
+        Remove every cached response for a path, whatever its parameters
+
+        Args:
+            path (str): Endpoint path, e.g. '/movie/550'
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses WHERE key >= ? AND key < ?", (path + "?", path + "@")
+            ).fetchall()
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in rows])
+            self._add_bytes(-sum(size for _, size in rows))
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits (including stale_hits), misses, expired, stale_hits,
+            evictions, hit_rate, entries, bytes
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self._conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'stale_hits': self.stale_hits,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'bytes': total,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            self._conn.close()
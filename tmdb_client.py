@@ -1,7 +1,16 @@
-import requests
 import math
-from config import TMDB_API_KEY
-from logger import setup_logger
+from datetime import timedelta
+from functools import partial
+from logger import ROLLUP, setup_logger
+from tmdb_http import get_client
+from tmdb_records import (
+    credits_from_tmdb,
+    decode_credits,
+    decode_genres,
+    decode_movie,
+    genres_from_tmdb,
+    movie_from_tmdb,
+)
 
 
 logger = setup_logger(__name__)
@@ -13,18 +22,12 @@ def fetch_genres():
     """
     logger.info("Fetching genre list from TMDB")
 
-    url = "https://api.themoviedb.org/3/genre/movie/list"
-    params = {"api_key": TMDB_API_KEY}
-    response = requests.get(url,params=params) 
-    if response.status_code != 200:
-        logger.error(f"Failed to fetch generes. Status Code: {response.status_code}")
+    genres = get_client().get_json("/genre/movie/list", decode=decode_genres)
+    if genres is None:
+        logger.error("Failed to fetch genres")
         return {}
-    result = response.json()
-    genres_list = result["genres"]
-    genre_dict = {}
-    for genre in genres_list:
-        genre_dict[genre['id']] = genre['name']
-    logger.info(f"Successfully fetched {len(genre_dict)} genres")
+    genre_dict = parse_genres(genres)
+    logger.info("Successfully fetched %d genres", len(genre_dict))
 
     return genre_dict
 
@@ -38,24 +41,42 @@ def fetch_popular_movies(count = 20):
     Returns:
         list: List of movie IDs (integers)
     """
-    logger.info(f"Fetching {count} popular movie IDs")
+    logger.info("Fetching %d popular movie IDs", count)
+    movie_ids = list(iter_popular_movie_ids(count))
+    logger.info("Successfully fetched %d movie IDs", len(movie_ids))
+
+    return movie_ids
+
+
+def iter_popular_movie_ids(count=20):
+    """
+    Yield up to N popular movie IDs, fetching one page at a time
+
+    Unlike fetch_popular_movies() this never holds more than one page in
+    memory, so it can feed a streaming ingest.
+
+    Args:
+        count: Maximum number of movie IDs to yield
+
+    Yields:
+        int: Movie IDs in popularity order
+    """
     pages_needed = math.ceil(count / 20)
-    movie_ids=[]
+    if pages_needed > 500:
+        logger.warning("TMDB serves at most 500 popular pages; returning 10000 of the %d IDs requested "
+                       "(use discovery.py or a daily ID export for more)", count)
+        pages_needed = 500
+    yielded = 0
     for pages in range(1, pages_needed+1):
-        url = "https://api.themoviedb.org/3/movie/popular"
-        params = {"api_key": TMDB_API_KEY, "page": pages}
-        response = requests.get(url,params=params) 
-        if response.status_code != 200:
-            logger.error(f"Failed to fetch popular movies page {pages}. Status code: {response.status_code}")
+        data = get_client().get_json("/movie/popular", {"page": pages})
+        if data is None:
+            logger.error("Failed to fetch popular movies page %d", pages)
             continue  # Skip this page, try next one
-        data=response.json()
-        movie_list = data['results']
-        for movie in movie_list:
-            movie_ids.append(movie['id'])
-    movie_ids = movie_ids[:count]
-    logger.info(f"Successfully fetched {len(movie_ids)} movie IDs")
-
-    return movie_ids
+        for movie_id in parse_movie_id_page(data):
+            if yielded >= count:
+                return
+            yield movie_id
+            yielded += 1
 
 
 def fetch_movie_details(movie_id):
@@ -66,7 +87,8 @@ def fetch_movie_details(movie_id):
         movie_id: TMDB movie ID
     
     Returns:
-        dict: Movie data formatted for Neo4j insertion, or None if failed
+        Movie: Record formatted for Neo4j insertion (reads like the dict
+        below, see tmdb_records), or None if failed
         
         Example return:
         {
@@ -82,52 +104,12 @@ def fetch_movie_details(movie_id):
             'studios': [{'id': 6125, 'name': 'Walt Disney Animation Studios'}]
         }
     """
-    logger.info(f"Fetching details for movie ID {movie_id}")
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-    params = {"api_key": TMDB_API_KEY}
-    movie = {}
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-            logger.error(f"Failed to fetch popular movies page {movie_id}. Status code: {response.status_code}")
-            return None
-    data=response.json()
-    if data.get('release_date'):
-        release_year = int(data['release_date'].split('-')[0])
-    else:
-        release_year=None
-    movie['tmdb_id'] = data.get('id')
-    budget = data.get('budget')
-    if budget == 0:
-        budget = None
-    movie['budget']=budget
-    revenue = data.get('revenue')
-    if revenue == 0:
-        revenue = None
-    movie['revenue']= revenue
-    movie['title'] = data.get('title')
-    movie['rating'] = data.get('vote_average')
-    poster_path = data.get('poster_path')
-    if poster_path:
-        poster_path="https://image.tmdb.org/t/p/w500"+poster_path
-        movie['poster_url'] = poster_path 
-    else:
-        movie['poster_url'] = None
-    movie['overview']=data.get('overview')
-    movie['release_year'] = release_year
-    studios=[]
-    for company in data.get('production_companies', []):
-        studio = {
-        'id': company['id'],
-        'name': company['name']
-    }
-        studios.append(studio)
-    movie['studios']=studios
-    genre_ids = []
-    for genre in data.get('genres', []):
-        genre_ids.append(genre['id'])
-
-    movie['genres'] = genre_ids
-    logger.info(f"Successfully fetched details for '{movie['title']}'")
+    logger.info("Fetching details for movie ID %s", movie_id, extra=ROLLUP)
+    movie = get_client().get_json(f"/movie/{movie_id}", decode=decode_movie)
+    if movie is None:
+        logger.error("Failed to fetch details for movie %s", movie_id)
+        return None
+    logger.info("Successfully fetched details for '%s'", movie['title'], extra=ROLLUP)
     return movie
 
 def fetch_movie_credits(movie_id, max_cast=10):
@@ -139,7 +121,8 @@ def fetch_movie_credits(movie_id, max_cast=10):
         max_cast: Maximum number of cast members to return (default 10)
     
     Returns:
-        dict with 'cast' and 'directors' lists, or None if failed
+        dict with 'cast' (CastCredit records) and 'directors' (Person
+        records) lists, or None if failed
         
         Example return:
         {
@@ -162,46 +145,159 @@ def fetch_movie_credits(movie_id, max_cast=10):
             ]
         }
     """
-    logger.info(f"Fetching credits for movie ID {movie_id}")
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/credits"
-    params = {"api_key": TMDB_API_KEY}
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-            logger.error(f"Failed to fetch movies{movie_id}. Status code: {response.status_code}")
-            return None
-    data=response.json()
-    movie_credits={}
-    cast = []
-    for actor in data['cast'][:max_cast]:
-        profile_path = actor.get('profile_path')
-        if profile_path:
-            profile_url = f"https://image.tmdb.org/t/p/w500{profile_path}"
-        else:
-            profile_url = None
-    
-        cast.append({
-        'tmdb_id': actor['id'],
-        'name': actor['name'],
-        'profile_url': profile_url,
-        'character': actor.get('character', 'Unknown'),  # Some have no character
-        'order': actor.get('order', 999)  # Some missing order
-        })
-    directors = []
-    for person in data.get('crew', []):
-        if person.get('job') == 'Director':
-            profile_path = person.get('profile_path')
-            if profile_path:  # ← Add this
-                profile_url = f"https://image.tmdb.org/t/p/w500{profile_path}"
-            else:
-                profile_url = None
-            
-            directors.append({
-                'tmdb_id': person['id'],
-                'name': person['name'],
-                'profile_url': profile_url
-            })
-            if not directors:
-                logger.warning(f"No director found for movie {movie_id}")
-    movie_credits['cast']=cast
-    movie_credits['directors']=directors
-    return movie_credits
\ No newline at end of file
+    logger.info("Fetching credits for movie ID %s", movie_id, extra=ROLLUP)
+    decoded = get_client().get_json(f"/movie/{movie_id}/credits", decode=partial(decode_credits, max_cast=max_cast))
+    if decoded is None:
+        logger.error("Failed to fetch credits for movie %s", movie_id)
+        return None
+    cast, directors = decoded
+    warn_if_no_director(directors, movie_id)
+    return {'cast': cast, 'directors': directors}
+
+
+def fetch_movie_full(movie_id, max_cast=10):
+    """
+    Fetch details and credits for a movie in a single request
+
+    Uses append_to_response=credits so TMDB returns both payloads in one
+    response instead of two separate calls.
+
+    Args:
+        movie_id: TMDB movie ID
+        max_cast: Maximum number of cast members to return (default 10)
+
+    Returns:
+        Movie: fetch_movie_details() record plus 'cast' and 'directors' in
+        the fetch_movie_credits() format, or None if failed
+    """
+    logger.info("Fetching details and credits for movie ID %s", movie_id, extra=ROLLUP)
+    movie = get_client().get_json(f"/movie/{movie_id}", {"append_to_response": "credits"},
+                                  decode=partial(decode_movie, max_cast=max_cast))
+    if movie is None:
+        logger.error("Failed to fetch movie %s", movie_id)
+        return None
+    warn_if_no_director(movie.get('directors', []), movie_id)
+    logger.info("Successfully fetched details and credits for '%s'", movie['title'], extra=ROLLUP)
+    return movie
+
+
+def iter_changed_movie_ids(start_date, end_date):
+    """
+    Yield IDs of movies changed on TMDB between two dates
+
+    Walks every page of /movie/changes. TMDB only accepts windows of up to
+    14 days, so longer ranges are split into consecutive windows.
+
+    Args:
+        start_date (datetime.date): First day to include
+        end_date (datetime.date): Last day to include
+
+    Yields:
+        int: Changed movie IDs (may repeat across windows)
+    """
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=13))
+        page = 1
+        total_pages = 1
+        while page <= total_pages:
+            params = {
+                "start_date": window_start.isoformat(),
+                "end_date": window_end.isoformat(),
+                "page": page,
+            }
+            data = get_client().get_json("/movie/changes", params)
+            if data is None:
+                raise RuntimeError(f"Failed to fetch movie changes {window_start} - {window_end} page {page}")
+            total_pages = data.get('total_pages', 1)
+            for change in data.get('results', []):
+                if change.get('id'):
+                    yield change['id']
+            page += 1
+        window_start = window_end + timedelta(days=1)
+
+
+def parse_genres(data):
+    """
+    Convert a /genre/movie/list response into a genre map
+
+    Args:
+        data: Genre records from tmdb_records.decode_genres(), or the
+            decoded TMDB response dict
+
+    Returns:
+        dict: genre_id -> genre_name
+    """
+    genres = genres_from_tmdb(data) if isinstance(data, dict) else data
+    genre_dict = {}
+    for genre in genres:
+        genre_dict[genre.id] = genre.name
+    return genre_dict
+
+
+def parse_movie_id_page(data):
+    """
+    Extract movie IDs from one page of a TMDB movie list response
+
+    Args:
+        data (dict): Decoded TMDB response (e.g. /movie/popular)
+
+    Returns:
+        list: Movie IDs on the page
+    """
+    return [movie['id'] for movie in data['results']]
+
+
+def parse_movie_details(data):
+    """
+    Convert a decoded /movie/{id} response into the record returned by
+    fetch_movie_details()
+
+    Args:
+        data (dict): Decoded TMDB response
+
+    Returns:
+        Movie: Movie data formatted for Neo4j insertion
+    """
+    return movie_from_tmdb(data)
+
+
+def parse_movie_credits(data, movie_id, max_cast=10):
+    """
+    Convert a decoded /movie/{id}/credits response into the dict returned by
+    fetch_movie_credits()
+
+    Args:
+        data (dict): Decoded TMDB response
+        movie_id: TMDB movie ID (used for log messages)
+        max_cast: Maximum number of cast members to keep
+
+    Returns:
+        dict with 'cast' and 'directors' lists
+    """
+    cast, directors = credits_from_tmdb(data, max_cast)
+    warn_if_no_director(directors, movie_id)
+    return {'cast': cast, 'directors': directors}
+
+
+def parse_movie_full(data, max_cast=10):
+    """
+    Convert a decoded /movie/{id}?append_to_response=credits response into
+    the record returned by fetch_movie_full()
+
+    Args:
+        data (dict): Decoded TMDB response
+        max_cast: Maximum number of cast members to keep
+
+    Returns:
+        Movie: Movie details plus 'cast' and 'directors'
+    """
+    movie = parse_movie_details(data)
+    movie.update(parse_movie_credits(data.get('credits', {'cast': []}), data.get('id'), max_cast))
+    return movie
+
+
+def warn_if_no_director(directors, movie_id):
+    """Log a warning when a movie has no credited director"""
+    if not directors:
+        logger.warning("No director found for movie %s", movie_id)
@@ -0,0 +1,52 @@
+import gzip
+import json
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+def iter_export_ids(path, min_popularity=0.0, include_adult=False, include_video=False, limit=None):
+    """
+    Stream movie IDs from a TMDB daily ID export file
+
+    The export (e.g. movie_ids_05_15_2026.json.gz from
+    http://files.tmdb.org/p/exports/) holds one JSON object per line:
+
+        {"adult": false, "id": 550, "original_title": "Fight Club", "popularity": 61.4, "video": false}
+
+    Lines are decoded one at a time, so memory use does not depend on the
+    file size, and discovery costs no API calls.
+
+    Args:
+        path (str): Local path to the .json.gz (or uncompressed .json) export
+        min_popularity (float): Skip movies below this popularity
+        include_adult (bool): Keep movies flagged adult
+        include_video (bool): Keep entries flagged video (not theatrical films)
+        limit (int): Stop after this many IDs (None for all)
+
+    Yields:
+        int: Movie IDs in file order
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    yielded = 0
+    skipped = 0
+    bad_lines = 0
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if limit is not None and yielded >= limit:
+                break
+            try:
+                entry = json.loads(line)
+                movie_id = entry['id']
+            except (ValueError, KeyError, TypeError):
+                bad_lines += 1
+                continue
+            if (entry.get('popularity') or 0) < min_popularity \
+                    or (entry.get('adult') and not include_adult) \
+                    or (entry.get('video') and not include_video):
+                skipped += 1
+                continue
+            yield movie_id
+            yielded += 1
+    logger.info("Read %s IDs from %s (%s filtered out, %s unreadable lines)", yielded, path, skipped, bad_lines)
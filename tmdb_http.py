@@ -0,0 +1,277 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    TMDB_API_KEY,
+    TMDB_BASE_URL,
+    TMDB_CACHE_ENABLED,
+    TMDB_MAX_RETRIES,
+    TMDB_OFFLINE,
+    TMDB_POOL_SIZE,
+    TMDB_RATE_BURST,
+    TMDB_RATE_LIMIT,
+    TMDB_TIMEOUT,
+)
+from logger import setup_logger
+from metrics import counter, histogram
+from tmdb_cache import TMDBCache, endpoint_template
+
+
+logger = setup_logger(__name__)
+
+# Statuses worth retrying; anything else non-200 (404, 401, ...) fails at once
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# What a decode callable raises on a malformed or truncated body
+DECODE_ERRORS = (ValueError, KeyError, TypeError)
+
+# Shared with async_tmdb_client; endpoint labels are templates like '/movie/{id}'
+TMDB_RESPONSES = counter('tmdb_responses_total', "TMDB HTTP attempts by endpoint and status (or 'error')",
+                         ('endpoint', 'status'))
+TMDB_REQUEST_SECONDS = histogram('tmdb_request_seconds', "Latency of a single TMDB HTTP attempt", ('endpoint',))
+TMDB_RATE_WAIT_SECONDS = histogram('tmdb_rate_limit_wait_seconds', "Time spent waiting on the token bucket",
+                                   ('endpoint',))
+TMDB_FETCH_SECONDS = histogram('tmdb_fetch_seconds', "get_json() latency including waits and retries",
+                               ('endpoint', 'outcome'))
+TMDB_FETCH_ERRORS = counter('tmdb_fetch_errors_total', "get_json() calls that returned None", ('endpoint', 'reason'))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to stay under TMDB's request budget
+
+    Callers reserve a token and sleep for the returned delay, so threads
+    (and coroutines, via reserve()) queue up fairly instead of bursting.
+    """
+
+    def __init__(self, rate=TMDB_RATE_LIMIT, capacity=TMDB_RATE_BURST):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take one token and return how long the caller must wait before using it
+
+        Returns:
+            float: Seconds to sleep (0 if a token was available)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """Block until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given time, e.g. after a 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def set_rate(self, rate):
+        """Change the refill rate, keeping the tokens already accumulated"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self.rate = rate
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header
+
+    Args:
+        value (str): Header value, either delta-seconds or an HTTP date
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing/invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+    """
+    Delay before retry number `attempt` (0-based)
+
+    Honours Retry-After when the server sent one, otherwise uses exponential
+    backoff with full jitter so concurrent workers don't retry in lockstep.
+
+    Returns:
+        float: Seconds to sleep
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TMDBHttpClient:
+    """
+    Connection-pooled, rate-limited TMDB HTTP client with retries
+
+    One instance is shared by every fetch function in tmdb_client (see
+    get_client()). Safe to use from multiple threads. When a TMDBCache is
+    attached, cached responses are served without touching the network;
+    in offline mode expired entries are served too (nothing could refresh
+    them) and a cache miss returns None instead of fetching.
+    """
+
+    def __init__(self, rate=TMDB_RATE_LIMIT, burst=TMDB_RATE_BURST, timeout=TMDB_TIMEOUT,
+                 max_retries=TMDB_MAX_RETRIES, pool_size=TMDB_POOL_SIZE, base_url=TMDB_BASE_URL,
+                 cache=None, offline=TMDB_OFFLINE):
+        self.base_url = base_url
+        self.cache = cache
+        self.offline = offline
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_json(self, path, params=None, decode=json.loads):
+        """
+        GET a TMDB endpoint and decode the JSON body
+
+        Retries 429/5xx responses, network errors and bodies that fail to
+        decode with backoff; a 429 also pauses the shared token bucket so
+        other threads back off too. Only bodies that decode are cached.
+        Latency, rate-limit waits and statuses are recorded in the tmdb_*
+        metrics, labelled by endpoint template.
+
+        Args:
+            path (str): Endpoint path, e.g. '/movie/550'
+            params (dict): Extra query parameters (api_key is added)
+            decode (callable): Turns the raw body into the result, e.g.
+                tmdb_records.decode_movie (default: json.loads)
+
+        Returns:
+            dict: Decoded response, or None if the request failed
+        """
+        endpoint = endpoint_template(path)
+        start = time.perf_counter()
+        data, outcome = self._get_json(path, params, endpoint, decode)
+        TMDB_FETCH_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, outcome=outcome)
+        return data
+
+    def _get_json(self, path, params, endpoint, decode):
+        """get_json() body; returns (data, outcome) where outcome labels the fetch histogram"""
+        if self.cache is not None:
+            body = self.cache.get(path, params, allow_stale=self.offline)
+            if body is not None:
+                try:
+                    return decode(body), 'cache'
+                except DECODE_ERRORS as e:
+                    # Stored before bodies were checked; refetching overwrites it
+                    logger.warning("Ignoring undecodable cached response for %s: %s", path, e)
+        if self.offline:
+            logger.debug("Offline mode: no cached response for %s", path)
+            TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason='offline_miss')
+            return None, 'failed'
+        query = {"api_key": TMDB_API_KEY}
+        if params:
+            query.update(params)
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            wait = self.bucket.reserve()
+            TMDB_RATE_WAIT_SECONDS.observe(wait, endpoint=endpoint)
+            if wait > 0:
+                time.sleep(wait)
+            retry_after = None
+            sent = time.perf_counter()
+            try:
+                response = self.session.get(url, params=query, timeout=self.timeout)
+            except requests.RequestException as e:
+                TMDB_RESPONSES.inc(endpoint=endpoint, status='error')
+                logger.warning("Request to %s failed (attempt %d): %s", path, attempt + 1, e)
+            else:
+                TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, endpoint=endpoint)
+                TMDB_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+                if response.status_code == 200:
+                    try:
+                        data = decode(response.content)
+                    except DECODE_ERRORS as e:
+                        logger.warning("Undecodable response from %s (attempt %d): %s", path, attempt + 1, e)
+                    else:
+                        if self.cache is not None:
+                            self.cache.put(path, params, response.content)
+                        return data, 'ok'
+                elif response.status_code not in RETRY_STATUSES:
+                    logger.error("Failed to fetch %s. Status code: %s", path, response.status_code)
+                    TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason=f"status_{response.status_code}")
+                    return None, 'failed'
+                else:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if response.status_code == 429:
+                        self.bucket.pause(retry_after if retry_after is not None else 1.0)
+                    logger.warning("Got %s from %s (attempt %d)", response.status_code, path, attempt + 1)
+            if attempt < self.max_retries:
+                time.sleep(backoff_delay(attempt, retry_after))
+        logger.error("Giving up on %s after %d attempts", path, self.max_retries + 1)
+        TMDB_FETCH_ERRORS.inc(endpoint=endpoint, reason='retries_exhausted')
+        return None, 'failed'
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide TMDBHttpClient, creating it on first use
+
+    Returns:
+        TMDBHttpClient: Shared client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDBHttpClient(cache=TMDBCache() if TMDB_CACHE_ENABLED else None)
+    return _client
+
+
+def set_client(client):
+    """
+    Replace the process-wide TMDBHttpClient, e.g. with one aimed at fake_tmdb
+
+    Args:
+        client (TMDBHttpClient): Client every fetch function should use
+
+    Returns:
+        TMDBHttpClient: The previous shared client (None if none was created)
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
@@ -0,0 +1,355 @@
+"""
+Compact records for the TMDB fields the graph keeps
+
+Movie, Person, CastCredit, Studio and Genre use __slots__ instead of a
+per-instance dict, and behave as read-only mappings with the same keys as
+the dicts tmdb_client used to return (movie['title'], movie.get('cast', []),
+dict(movie), ...). movie.update(credits) and item assignment work for the
+declared fields, so existing callers need no changes. Use to_dict() for a
+plain (JSON-serializable) copy.
+
+decode_movie(), decode_credits() and decode_genres() go straight from the
+response body to records. When msgspec is installed only the kept fields are decoded: cast
+entries past max_cast stay undecoded byte slices, and each crew entry is
+probed for its job alone, so only directors are materialized. Without
+msgspec the body is decoded with the json module and then converted. Both
+paths return the same records; ratings are always floats (TMDB sends 7 as
+well as 7.5).
+
+Optional dependency: msgspec (pip install msgspec). Nothing else in the
+project needs it; without it decoding is slower but the results match.
+"""
+import json
+from collections.abc import Mapping
+from typing import List, Optional
+from logger import setup_logger
+
+try:
+    import msgspec
+except ImportError:  # optional: pip install msgspec
+    msgspec = None
+
+
+logger = setup_logger(__name__)
+
+IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+FAST_DECODE = msgspec is not None
+
+
+def image_url(path):
+    """TMDB image path -> full w500 URL, or None"""
+    return IMAGE_BASE_URL + path if path else None
+
+
+def _rating(vote_average):
+    """vote_average as a float (msgspec already coerces it), or None"""
+    return float(vote_average) if vote_average is not None else None
+
+
+class _Record(Mapping):
+    """Base for slotted records that read like the dicts they replace"""
+
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:  # optional field never set (e.g. Movie.cast)
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (name for name in self._fields if hasattr(self, name))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def update(self, other=(), **kwargs):
+        """dict.update() restricted to the record's fields"""
+        for key, value in dict(other, **kwargs).items():
+            self[key] = value
+
+    def to_dict(self):
+        """Plain dict copy, with nested records and lists of records converted too"""
+        return {key: _plain(value) for key, value in self.items()}
+
+    def __repr__(self):
+        fields = ', '.join(f"{key}={value!r}" for key, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+def _plain(value):
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+class Genre(_Record):
+    __slots__ = _fields = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class Studio(_Record):
+    __slots__ = _fields = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class Person(_Record):
+    """A director (or any credited person): keys tmdb_id, name, profile_url"""
+
+    __slots__ = _fields = ('tmdb_id', 'name', 'profile_url')
+
+    def __init__(self, tmdb_id, name, profile_url=None):
+        self.tmdb_id = tmdb_id
+        self.name = name
+        self.profile_url = profile_url
+
+
+class CastCredit(Person):
+    """A Person plus the character and billing order for one movie"""
+
+    __slots__ = ('character', 'order')
+    _fields = Person._fields + __slots__
+
+    def __init__(self, tmdb_id, name, profile_url=None, character='Unknown', order=999):
+        super().__init__(tmdb_id, name, profile_url)
+        self.character = character
+        self.order = order
+
+
+class Movie(_Record):
+    """
+    Movie details, plus cast and directors once credits are attached
+
+    genres holds genre IDs (see fetch_genres() for names). 'cast' and
+    'directors' are absent from the mapping until set, matching the
+    details-only dict of fetch_movie_details().
+    """
+
+    __slots__ = _fields = (
+        'tmdb_id', 'title', 'release_year', 'rating', 'budget', 'revenue',
+        'overview', 'poster_url', 'genres', 'studios', 'cast', 'directors',
+    )
+
+    def __init__(self, tmdb_id, title=None, release_year=None, rating=None, budget=None, revenue=None,
+                 overview=None, poster_url=None, genres=None, studios=None, cast=None, directors=None):
+        self.tmdb_id = tmdb_id
+        self.title = title
+        self.release_year = release_year
+        self.rating = rating
+        self.budget = budget
+        self.revenue = revenue
+        self.overview = overview
+        self.poster_url = poster_url
+        self.genres = genres if genres is not None else []
+        self.studios = studios if studios is not None else []
+        if cast is not None:
+            self.cast = cast
+        if directors is not None:
+            self.directors = directors
+
+
+def _release_year(release_date):
+    return int(release_date.split('-')[0]) if release_date else None
+
+
+def movie_from_tmdb(data):
+    """
+    Build a Movie from a decoded /movie/{id} response
+
+    Zero budget and revenue mean "unknown" on TMDB and become None. Credits
+    are not read here (see credits_from_tmdb()).
+    """
+    return Movie(
+        tmdb_id=data.get('id'),
+        title=data.get('title'),
+        release_year=_release_year(data.get('release_date')),
+        rating=_rating(data.get('vote_average')),
+        budget=data.get('budget') or None,
+        revenue=data.get('revenue') or None,
+        overview=data.get('overview'),
+        poster_url=image_url(data.get('poster_path')),
+        genres=[genre['id'] for genre in data.get('genres', [])],
+        studios=[Studio(company['id'], company['name']) for company in data.get('production_companies', [])],
+    )
+
+
+def genres_from_tmdb(data):
+    """
+    Build Genre records from a decoded /genre/movie/list response
+
+    Returns:
+        list: Genre records in response order
+    """
+    return [Genre(genre['id'], genre['name']) for genre in data['genres']]
+
+
+def credits_from_tmdb(data, max_cast=10):
+    """
+    Keep the first max_cast cast members and every director of a decoded
+    /movie/{id}/credits response
+
+    Returns:
+        tuple: (list of CastCredit, list of Person)
+    """
+    cast = [
+        CastCredit(actor['id'], actor['name'], image_url(actor.get('profile_path')),
+                   actor.get('character', 'Unknown'), actor.get('order', 999))
+        for actor in data.get('cast', [])[:max_cast]
+    ]
+    directors = [
+        Person(person['id'], person['name'], image_url(person.get('profile_path')))
+        for person in data.get('crew', []) if person.get('job') == 'Director'
+    ]
+    return cast, directors
+
+
+if msgspec is not None:
+    # Wire formats: only the fields we keep are declared, everything else is skipped by the decoder
+
+    class _NamedWire(msgspec.Struct):
+        id: int
+        name: Optional[str] = None
+
+    class _CastWire(msgspec.Struct):
+        id: int
+        name: Optional[str] = None
+        profile_path: Optional[str] = None
+        character: Optional[str] = 'Unknown'
+        order: Optional[int] = 999
+
+    class _CrewWire(msgspec.Struct):
+        id: int
+        name: Optional[str] = None
+        profile_path: Optional[str] = None
+        job: Optional[str] = None
+
+    class _JobWire(msgspec.Struct):
+        job: Optional[str] = None
+
+    class _CreditsWire(msgspec.Struct):
+        cast: List[msgspec.Raw] = []
+        crew: List[msgspec.Raw] = []
+
+    class _MovieWire(msgspec.Struct):
+        id: int
+        title: Optional[str] = None
+        release_date: Optional[str] = None
+        vote_average: Optional[float] = None
+        budget: Optional[int] = None
+        revenue: Optional[int] = None
+        overview: Optional[str] = None
+        poster_path: Optional[str] = None
+        genres: List[_NamedWire] = []
+        production_companies: List[_NamedWire] = []
+        credits: Optional[_CreditsWire] = None
+
+    class _GenreListWire(msgspec.Struct):
+        genres: List[_NamedWire]
+
+    _movie_decoder = msgspec.json.Decoder(_MovieWire)
+    _credits_decoder = msgspec.json.Decoder(_CreditsWire)
+    _cast_decoder = msgspec.json.Decoder(_CastWire)
+    _crew_decoder = msgspec.json.Decoder(_CrewWire)
+    _job_decoder = msgspec.json.Decoder(_JobWire)
+    _genre_list_decoder = msgspec.json.Decoder(_GenreListWire)
+
+
+def _fast_credits(wire, max_cast):
+    cast = []
+    for raw in wire.cast[:max_cast]:
+        actor = _cast_decoder.decode(raw)
+        cast.append(CastCredit(actor.id, actor.name, image_url(actor.profile_path), actor.character, actor.order))
+    directors = []
+    for raw in wire.crew:
+        if _job_decoder.decode(raw).job == 'Director':
+            person = _crew_decoder.decode(raw)
+            directors.append(Person(person.id, person.name, image_url(person.profile_path)))
+    return cast, directors
+
+
+def _fast_movie(body, max_cast):
+    wire = _movie_decoder.decode(body)
+    movie = Movie(
+        tmdb_id=wire.id,
+        title=wire.title,
+        release_year=_release_year(wire.release_date),
+        rating=_rating(wire.vote_average),
+        budget=wire.budget or None,
+        revenue=wire.revenue or None,
+        overview=wire.overview,
+        poster_url=image_url(wire.poster_path),
+        genres=[genre.id for genre in wire.genres],
+        studios=[Studio(company.id, company.name) for company in wire.production_companies],
+    )
+    if wire.credits is not None:
+        movie.cast, movie.directors = _fast_credits(wire.credits, max_cast)
+    return movie
+
+
+def decode_movie(body, max_cast=10):
+    """
+    Decode a /movie/{id} body (optionally with append_to_response=credits)
+
+    Args:
+        body (bytes): Raw JSON response
+        max_cast (int): Cast members to keep when credits are included
+
+    Returns:
+        Movie: With cast and directors set only if the body had credits
+    """
+    if msgspec is not None:
+        try:
+            return _fast_movie(body, max_cast)
+        except (msgspec.DecodeError, msgspec.ValidationError) as e:
+            logger.debug("Fast decode failed, using json: %s", e)
+    data = json.loads(body)
+    movie = movie_from_tmdb(data)
+    if 'credits' in data:
+        movie.cast, movie.directors = credits_from_tmdb(data['credits'], max_cast)
+    return movie
+
+
+def decode_credits(body, max_cast=10):
+    """
+    Decode a /movie/{id}/credits body
+
+    Returns:
+        tuple: (list of CastCredit, list of Person directors)
+    """
+    if msgspec is not None:
+        try:
+            return _fast_credits(_credits_decoder.decode(body), max_cast)
+        except (msgspec.DecodeError, msgspec.ValidationError) as e:
+            logger.debug("Fast decode failed, using json: %s", e)
+    return credits_from_tmdb(json.loads(body), max_cast)
+
+
+def decode_genres(body):
+    """
+    Decode a /genre/movie/list body
+
+    Returns:
+        list: Genre records in response order
+    """
+    if msgspec is not None:
+        try:
+            return [Genre(genre.id, genre.name) for genre in _genre_list_decoder.decode(body).genres]
+        except (msgspec.DecodeError, msgspec.ValidationError) as e:
+            logger.debug("Fast decode failed, using json: %s", e)
+    return genres_from_tmdb(json.loads(body))
@@ -0,0 +1,124 @@
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+GRAPH_KEYS = (
+    'movies', 'people', 'genres', 'studios',
+    'acted_in', 'directed', 'in_genre', 'produced_by',
+)
+
+
+def empty_graph():
+    """
+    Return an empty graph batch
+
+    A graph batch holds node dicts and edge tuples in the shapes accepted by
+    the neo4j_client *_batch writers:
+
+        movies       - movie dicts (create_movie_nodes_batch)
+        people       - person dicts (create_person_nodes_batch)
+        genres       - {'name': ...} dicts (create_genre_nodes_batch)
+        studios      - {'id', 'name'} dicts (create_studio_nodes_batch)
+        acted_in     - (person_tmdb_id, movie_tmdb_id, character, order)
+        directed     - (person_tmdb_id, movie_tmdb_id)
+        in_genre     - (movie_tmdb_id, genre_name, is_primary)
+        produced_by  - (studio_id, movie_tmdb_id)
+    """
+    return {key: [] for key in GRAPH_KEYS}
+
+
+def build_movie_graph(movie, genre_names):
+    """
+    Transform one fetched movie into a graph batch
+
+    Args:
+        movie (dict): Output of fetch_movie_full(), or fetch_movie_details()
+            merged with fetch_movie_credits()
+        genre_names (dict): genre_id -> genre_name from fetch_genres()
+
+    Returns:
+        dict: Graph batch (see empty_graph()) for this movie
+    """
+    graph = empty_graph()
+    movie_id = movie['tmdb_id']
+    graph['movies'].append({
+        'tmdb_id': movie_id,
+        'title': movie.get('title'),
+        'release_year': movie.get('release_year'),
+        'rating': movie.get('rating'),
+        'budget': movie.get('budget'),
+        'revenue': movie.get('revenue'),
+        'overview': movie.get('overview'),
+        'poster_url': movie.get('poster_url'),
+    })
+
+    # TMDB lists genres in relevance order, so the first one is the primary genre
+    for position, genre_id in enumerate(movie.get('genres', [])):
+        name = genre_names.get(genre_id)
+        if not name:
+            logger.warning("Unknown genre id %s on movie %s", genre_id, movie_id)
+            continue
+        graph['genres'].append({'name': name})
+        graph['in_genre'].append((movie_id, name, position == 0))
+
+    for studio in movie.get('studios', []):
+        graph['studios'].append({'id': studio['id'], 'name': studio['name']})
+        graph['produced_by'].append((studio['id'], movie_id))
+
+    for actor in movie.get('cast', []):
+        graph['people'].append({
+            'tmdb_id': actor['tmdb_id'],
+            'name': actor['name'],
+            'profile_url': actor.get('profile_url'),
+        })
+        graph['acted_in'].append((actor['tmdb_id'], movie_id, actor.get('character'), actor.get('order')))
+
+    for director in movie.get('directors', []):
+        graph['people'].append({
+            'tmdb_id': director['tmdb_id'],
+            'name': director['name'],
+            'profile_url': director.get('profile_url'),
+        })
+        graph['directed'].append((director['tmdb_id'], movie_id))
+
+    return graph
+
+
+def merge_graphs(target, graph):
+    """
+    Append one graph batch onto another
+
+    Args:
+        target (dict): Graph batch to extend in place
+        graph (dict): Graph batch to add
+
+    Returns:
+        dict: target
+    """
+    for key in GRAPH_KEYS:
+        target[key].extend(graph[key])
+    return target
+
+
+def dedupe_nodes(graph):
+    """
+    Drop repeated Person, Genre and Studio rows from a graph batch in place
+
+    The same actor or genre usually appears in many movies of a batch; one
+    row per node is enough for the MERGE. The last row seen wins.
+
+    Returns:
+        dict: graph
+    """
+    graph['people'] = _dedupe(graph['people'], 'tmdb_id')
+    graph['genres'] = _dedupe(graph['genres'], 'name')
+    graph['studios'] = _dedupe(graph['studios'], 'id')
+    return graph
+
+
+def _dedupe(rows, key):
+    seen = {}
+    for row in rows:
+        seen[row[key]] = row
+    return list(seen.values())
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+import time
+from logger import setup_logger
+
+
+logger = setup_logger(__name__)
+
+WORK_STATE_PATH = 'data/work_state.sqlite'
+
+PENDING = 'pending'
+FETCHED = 'fetched'
+WRITTEN = 'written'
+FAILED = 'failed'
+
+
+class WorkStateStore:
+    """
+    Durable per-movie ingest status backed by SQLite
+
+    Each movie moves through pending -> fetched -> written, or to failed with
+    an attempt count, the last error and the earliest time it may be retried.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=WORK_STATE_PATH, retry_base=60.0, retry_cap=6 * 60 * 60):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS movies (
+                movie_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS movies_status ON movies (status, next_attempt_at)")
+        self._conn.commit()
+
+    def _set_status(self, movie_ids, status):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO movies (movie_id, status, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(movie_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                [(movie_id, status, now) for movie_id in movie_ids],
+            )
+            self._conn.commit()
+
+    def mark_pending(self, movie_ids):
+        """
+        Record newly discovered movies; movies already tracked keep their status
+
+        Args:
+            movie_ids (list): TMDB movie IDs
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO movies (movie_id, status, updated_at) VALUES (?, ?, ?)",
+                [(movie_id, PENDING, now) for movie_id in movie_ids],
+            )
+            self._conn.commit()
+
+    def mark_fetched(self, movie_ids):
+        self._set_status(movie_ids, FETCHED)
+
+    def mark_written(self, movie_ids):
+        """Record successful graph writes and clear any previous error"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO movies (movie_id, status, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(movie_id) DO UPDATE SET status = excluded.status, "
+                "last_error = NULL, updated_at = excluded.updated_at",
+                [(movie_id, WRITTEN, now) for movie_id in movie_ids],
+            )
+            self._conn.commit()
+
+    def mark_failed(self, movie_id, error_message):
+        """
+        Record a failure, bump the attempt count and schedule the next retry
+
+        The retry delay doubles with each attempt, starting at retry_base
+        seconds and capped at retry_cap.
+
+        Args:
+            movie_id: TMDB movie ID that failed
+            error_message (str): Why it failed
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM movies WHERE movie_id = ?", (movie_id,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = min(self.retry_cap, self.retry_base * (2 ** (attempts - 1)))
+            self._conn.execute(
+                "INSERT INTO movies (movie_id, status, attempts, last_error, next_attempt_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(movie_id) DO UPDATE SET status = excluded.status, attempts = excluded.attempts, "
+                "last_error = excluded.last_error, next_attempt_at = excluded.next_attempt_at, "
+                "updated_at = excluded.updated_at",
+                (movie_id, FAILED, attempts, str(error_message), now + delay, now),
+            )
+            self._conn.commit()
+
+    def unfinished_ids(self):
+        """
+        Movies discovered but never written, for resuming a crashed ingest
+
+        Returns:
+            list: Movie IDs with status pending or fetched
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT movie_id FROM movies WHERE status IN (?, ?) ORDER BY movie_id", (PENDING, FETCHED)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def due_failures(self, max_attempts, limit=1000):
+        """
+        Failed movies whose backoff has elapsed and that have attempts left
+
+        Returns:
+            list: Movie IDs ready to retry
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT movie_id FROM movies WHERE status = ? AND attempts < ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (FAILED, max_attempts, time.time(), limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def next_retry_at(self, max_attempts):
+        """
+        Returns:
+            float: Earliest scheduled retry time, or None if nothing is retryable
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM movies WHERE status = ? AND attempts < ?",
+                (FAILED, max_attempts),
+            ).fetchone()
+        return row[0]
+
+    def counts(self):
+        """
+        Returns:
+            dict: status -> number of movies
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM movies GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the process-wide WorkStateStore, creating it on first use
+
+    Returns:
+        WorkStateStore: Shared store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = WorkStateStore()
+    return _store